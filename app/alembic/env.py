@@ -8,18 +8,24 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
 
 from db.models import *
-from config.config import DATABASE_URL
+from config.config import DATABASE_SHARD_URLS, MIGRATION_LOCK_TIMEOUT_MS
 from db.db import Base
 
 config = context.config
 
-if config.config_file_name is not None:
+# when migrations run in-process from the app, logging is already configured
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
-config.set_main_option("sqlalchemy.url", DATABASE_URL)
 target_metadata = Base.metadata
 
 
+def shard_urls() -> list[str]:
+    """A single URL given by the caller, otherwise every shard database."""
+    url = config.attributes.get("sqlalchemy_url")
+    return [url] if url else DATABASE_SHARD_URLS
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -32,20 +38,30 @@ def run_migrations_offline() -> None:
     script output.
 
     """
-    url = config.get_main_option("sqlalchemy.url")
-    context.configure(
-        url=url,
-        target_metadata=target_metadata,
-        literal_binds=True,
-        dialect_opts={"paramstyle": "named"},
-    )
+    for url in shard_urls():
+        context.configure(
+            url=url,
+            target_metadata=target_metadata,
+            literal_binds=True,
+            dialect_opts={"paramstyle": "named"},
+        )
 
-    with context.begin_transaction():
-        context.run_migrations()
+        with context.begin_transaction():
+            context.run_migrations()
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    if connection.dialect.name == "postgresql" and MIGRATION_LOCK_TIMEOUT_MS > 0:
+        # a migration waiting for a table lock blocks every query queued behind it
+        connection.exec_driver_sql(f"SET lock_timeout = {MIGRATION_LOCK_TIMEOUT_MS}")
+        connection.commit()
+    # one transaction per migration, so one with an autocommit block
+    # (db.online_migrations) doesn't leave the earlier ones uncommitted
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
@@ -57,16 +73,18 @@ async def run_async_migrations() -> None:
 
     """
 
-    connectable = async_engine_from_config(
-        config.get_section(config.config_ini_section, {}),
-        prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
-    )
+    for url in shard_urls():
+        config.set_main_option("sqlalchemy.url", url)
+        connectable = async_engine_from_config(
+            config.get_section(config.config_ini_section, {}),
+            prefix="sqlalchemy.",
+            poolclass=pool.NullPool,
+        )
 
-    async with connectable.connect() as connection:
-        await connection.run_sync(do_run_migrations)
+        async with connectable.connect() as connection:
+            await connection.run_sync(do_run_migrations)
 
-    await connectable.dispose()
+        await connectable.dispose()
 
 
 def run_migrations_online() -> None:
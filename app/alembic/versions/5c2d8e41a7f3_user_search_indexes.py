@@ -0,0 +1,39 @@
+"""user search indexes
+
+Revision ID: 5c2d8e41a7f3
+Revises: 79898b119991
+Create Date: 2026-10-19 10:12:05.731942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.online_migrations import create_index_concurrently, drop_index_concurrently, is_postgres
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2d8e41a7f3'
+down_revision: Union[str, None] = '79898b119991'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not is_postgres():
+        create_index_concurrently('ix_users_username_lower', 'users', [sa.text('lower(username)')])
+        return
+    # prefix search: byte-ordered ranges over the lowercased name
+    create_index_concurrently('ix_users_username_lower', 'users', [sa.text('lower(username) COLLATE "C"')])
+    # infix search: LIKE '%...%' through trigrams
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    create_index_concurrently(
+        'ix_users_username_trgm', 'users', [sa.text('lower(username) gin_trgm_ops')], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    if is_postgres():
+        drop_index_concurrently('ix_users_username_trgm', 'users')
+    drop_index_concurrently('ix_users_username_lower', 'users')
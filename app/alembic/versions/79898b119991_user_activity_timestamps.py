@@ -0,0 +1,29 @@
+"""user activity timestamps
+
+Revision ID: 79898b119991
+Revises: ecc0453cba12
+Create Date: 2026-10-19 08:33:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '79898b119991'
+down_revision: Union[str, None] = 'ecc0453cba12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable without a default: a metadata-only change, no table rewrite
+    op.add_column('users', sa.Column('last_login_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'last_seen_at')
+    op.drop_column('users', 'last_login_at')
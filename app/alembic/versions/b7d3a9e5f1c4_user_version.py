@@ -0,0 +1,27 @@
+"""user version
+
+Revision ID: b7d3a9e5f1c4
+Revises: 9e4b1f6c2a0d
+Create Date: 2026-10-19 12:41:09.583126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3a9e5f1c4'
+down_revision: Union[str, None] = '9e4b1f6c2a0d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a constant server default is stored in the catalog on Postgres 11+, no table rewrite
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'version')
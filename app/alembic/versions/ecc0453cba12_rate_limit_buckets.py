@@ -0,0 +1,32 @@
+"""rate limit buckets
+
+Revision ID: ecc0453cba12
+Revises: 301e99b084fb
+Create Date: 2026-10-19 08:30:12.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecc0453cba12'
+down_revision: Union[str, None] = '301e99b084fb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('tat', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_rate_limit_buckets_tat'), 'rate_limit_buckets', ['tat'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_rate_limit_buckets_tat'), table_name='rate_limit_buckets')
+    op.drop_table('rate_limit_buckets')
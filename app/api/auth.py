@@ -2,21 +2,25 @@ from typing import Annotated
 from fastapi import Security, HTTPException, status, Depends
 from fastapi.security.api_key import APIKeyHeader
 from datetime import datetime, timedelta, UTC
-from jose import jwt, JWTError
 
 from services.user_service import UserService
 
-from .dependencies import get_user_service
+from .dependencies import get_user_service, user_activity
 from domain.domain_user import DomainUser
 from domain.exceptions import RepositoryException
-from config.config import SECRET
+from config.config import JWT_CACHE_SIZE, SECRET
+from monitoring.metrics import metrics
+from util.jwt_codec import HS256Codec, InvalidTokenError, TokenExpiredError
 
 
 api_key_header = APIKeyHeader(name="TOKEN", auto_error=False)
-ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 356 * 99
 
 
+jwt_codec = HS256Codec(SECRET, cache_size=JWT_CACHE_SIZE)
+metrics.register("jwt", jwt_codec.snapshot)
+
+
 def create_jwt_token(
     data: dict,
     expires_delta: timedelta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
@@ -25,8 +29,7 @@ def create_jwt_token(
     to_encode = data.copy()
     expire = datetime.now(UTC) + (expires_delta)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET, algorithm=ALGORITHM)
-    return encoded_jwt
+    return jwt_codec.encode(to_encode)
 
 
 def verify_jwt_token(token: str) -> tuple[str, str]:
@@ -43,21 +46,20 @@ def verify_jwt_token(token: str) -> tuple[str, str]:
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
-        payload = jwt.decode(token, SECRET, algorithms=[ALGORITHM])
-        username: str | None = payload.get("username")
-        password: str | None = payload.get("password")
-        if username is None or password is None:
-            raise credentials_exception
-
-        expiration = payload.get("exp")
-        if expiration is not None and datetime.fromtimestamp(
-            expiration, UTC
-        ) < datetime.now(UTC):
-            raise HTTPException(status_code=401, detail="Token is expired")
-        return username, password
-    except (JWTError, AttributeError):
+        payload = jwt_codec.decode(token)
+    except TokenExpiredError:
+        raise HTTPException(status_code=401, detail="Token is expired")
+    except InvalidTokenError:
+        raise credentials_exception
+
+    username: str | None = payload.get("username")
+    password: str | None = payload.get("password")
+    if username is None or password is None:
         raise credentials_exception
+    return username, password
 
 
 # authentication
@@ -68,7 +70,10 @@ async def check_token(
     """Check token in the Headers and return a user or raise 401 exception"""
     try:
         username, password = verify_jwt_token(JWT_token)
-        return await service.verify_password(username, password)
+        # the lookup every authenticated request makes, batched across requests
+        user = await service.verify_password(username, password, batch=True)
+        user_activity.record(user.id, last_seen_at=datetime.now(UTC))
+        return user
     except RepositoryException:
         raise HTTPException(401)
 
@@ -0,0 +1,33 @@
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response
+
+
+def strong_etag(*parts: Any) -> str:
+    """Strong ETag from the values a representation is built from (a row version or its fields)."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """`If-None-Match` check; it uses weak comparison, so `W/` prefixes are ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def not_modified_or_none(request: Request, response: Response, etag: str, cache_control: str) -> Response | None:
+    """
+    Sets the validator headers and returns a 304 response if the client's copy is current.
+
+    Call it before building the response body, so a match skips serialization entirely.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.method in ("GET", "HEAD") and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -1,23 +1,91 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Annotated
 from domain.domain_user import DomainUser
 from db.models.user import UserORM
-from db.db import get_db
+from db.db import get_db, sessionmanager
+from db.sharding import ShardedSession
 from services.user_service import UserService
+from services.idempotency import IIdempotencyStore, InMemoryIdempotencyStore
+from services.rate_limiter import IRateLimitBackend, InMemoryRateLimitBackend, RateLimiter, RateLimitRule
 from repositories.user_repo import UserSQLAlchemyRepo
+from repositories.rate_limit_repo import SQLRateLimitBackend
+from repositories.idempotency_repo import SQLIdempotencyStore
+from repositories.batch_loader import BatchLoader
+from repositories.write_behind import WriteBehindBuffer
+from monitoring.metrics import metrics
 from util.crypto_hash import CryptoHash
+from config.config import (
+    ACTIVITY_FLUSH_SIZE,
+    ACTIVITY_MAX_KEYS,
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_MAX_KEYS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_IP_PER_MINUTE,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_USERNAME_BURST,
+    RATE_LIMIT_USERNAME_PER_MINUTE,
+    READ_BATCH_WINDOW,
+    READ_BATCHING,
+)
+
+
+# lookups by username that opt in (the one of every authenticated request) are batched
+# across requests; batches are not split by shard, so batching is off for a sharded `users` table
+user_loader: BatchLoader[DomainUser, UserORM] | None = None
+if READ_BATCHING and sessionmanager.shard_count == 1:
+    user_loader = BatchLoader(sessionmanager, DomainUser, UserORM, key="username", window=READ_BATCH_WINDOW)
+    metrics.register("user_loader", user_loader.snapshot)
+
+
+# last login / last seen timestamps are buffered and written in batches
+user_activity: WriteBehindBuffer[UserORM] = WriteBehindBuffer(
+    sessionmanager, UserORM, flush_size=ACTIVITY_FLUSH_SIZE, max_keys=ACTIVITY_MAX_KEYS, sharded=True
+)
+metrics.register("user_activity", user_activity.snapshot)
 
 
 def user_sqlalchemy_repository_factory(
-    db: Annotated[AsyncSession, Depends(get_db)]
+    db: Annotated[AsyncSession | ShardedSession, Depends(get_db)]
 ) -> UserSQLAlchemyRepo:
-    return UserSQLAlchemyRepo(db, UserORM, DomainUser)
+    return UserSQLAlchemyRepo(db, DomainUser, UserORM, loader=user_loader)
 
 
-def get_user_service(repo_factory = Depends(user_sqlalchemy_repository_factory)) -> UserService:
-    repository = repo_factory()
+def get_user_service(repository = Depends(user_sqlalchemy_repository_factory)) -> UserService:
     return UserService(
         repository = repository,
         crypto_hash = CryptoHash()
     )
+
+
+rate_limit_backend: IRateLimitBackend = (
+    SQLRateLimitBackend(sessionmanager)
+    if RATE_LIMIT_BACKEND == "db"
+    else InMemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+)
+rate_limiter = RateLimiter(
+    backend=rate_limit_backend,
+    ip_rule=RateLimitRule(burst=RATE_LIMIT_IP_BURST, per_minute=RATE_LIMIT_IP_PER_MINUTE),
+    username_rule=RateLimitRule(burst=RATE_LIMIT_USERNAME_BURST, per_minute=RATE_LIMIT_USERNAME_PER_MINUTE),
+)
+
+
+# first responses of requests sent with an Idempotency-Key; the table is shared by all workers
+idempotency_store: IIdempotencyStore = (
+    SQLIdempotencyStore(sessionmanager)
+    if IDEMPOTENCY_BACKEND == "db"
+    else InMemoryIdempotencyStore(IDEMPOTENCY_MAX_KEYS)
+)
+
+
+def get_rate_limiter() -> RateLimiter:
+    return rate_limiter
+
+
+def get_client_ip(request: Request) -> str | None:
+    """Client address as seen by the nginx proxy (`X-Real-IP`), falling back to the peer."""
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip:
+        return real_ip
+    return request.client.host if request.client else None
@@ -0,0 +1,44 @@
+from functools import lru_cache
+from typing import Any, Callable, Type
+
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, create_model
+
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], fields: tuple[str, ...]) -> Type[BaseModel]:
+    """Response model with only `fields` of `model`, built once per field set."""
+    definitions: dict[str, Any] = {
+        name: (model.model_fields[name].annotation, ...) for name in fields
+    }
+    return create_model(f"{model.__name__}Partial", __config__=model.model_config, **definitions)
+
+
+def fields_dependency(model: Type[BaseModel]) -> Callable[[str | None], tuple[str, ...] | None]:
+    """
+    Query dependency for `?fields=a,b` on routes returning `model`.
+
+    Only the fields of the response model are allowed, so the list can be pushed down
+    to a repository column projection as is.
+    """
+    allowed = tuple(model.model_fields)
+
+    def parse_fields(
+        fields: str | None = Query(None, description=f"Comma-separated subset of: {', '.join(allowed)}"),
+    ) -> tuple[str, ...] | None:
+        if not fields:
+            return None
+        requested = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+        unknown = [name for name in requested if name not in allowed]
+        if unknown or not requested:
+            raise HTTPException(422, f"Unknown fields {unknown}, allowed: {list(allowed)}")
+        return requested
+
+    return parse_fields
+
+
+def partial_response(model: Type[BaseModel], obj: Any, fields: tuple[str, ...], **kwargs: Any) -> JSONResponse:
+    """Serializes only `fields` of `obj` through the partial model of `model`."""
+    partial = partial_model(model, fields).model_validate(obj)
+    return JSONResponse(content=partial.model_dump(mode="json"), **kwargs)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from monitoring.health import health_monitor
+from monitoring.metrics import metrics
+
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz() -> dict[str, str]:
+    """Liveness: the process is up and serving, no I/O is done here."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz() -> JSONResponse:
+    """Readiness: cached DB probe plus pool and event-loop saturation."""
+    ready, details = health_monitor.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", **details},
+    )
+
+
+@router.get("/metrics")
+async def read_metrics() -> dict:
+    """Runtime counters of the worker's subsystems."""
+    return metrics.snapshot()
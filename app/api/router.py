@@ -1,7 +1,9 @@
 from fastapi import APIRouter
+from .health_router import router as health_router
 from .v1.v1_router import router as v1_router
 
 
 router = APIRouter()
 
+router.include_router(health_router)
 router.include_router(v1_router)
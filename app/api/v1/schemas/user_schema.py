@@ -14,6 +14,11 @@ class UserRead(UserBase):
 class UserToken(UserRead):
     token: str
 
+class UserSearchPage(BaseModel):
+    items: list[UserRead]
+    # offset of the next page, None on the last one
+    next_offset: int | None = None
+
 class UserUpdatePassword(BaseModel):
     old_password: str
     new_password: str
@@ -1,13 +1,27 @@
+from datetime import UTC, datetime
 from typing import Annotated
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 
 from api.auth import check_token, create_jwt_token
+from api.conditional import not_modified_or_none, strong_etag
+from api.fields import fields_dependency, partial_response
+from config.config import CACHE_CONTROL_USER_READ, USER_SEARCH_MAX_LIMIT, USER_SEARCH_MIN_INFIX_LENGTH
 from domain.domain_user import DomainUser
-from .schemas.user_schema import UserCreate, UserRead, UserToken, UserUpdatePassword
-from ..dependencies import get_user_service
+from .schemas.user_schema import UserCreate, UserRead, UserSearchPage, UserToken, UserUpdatePassword
+from ..dependencies import get_client_ip, get_rate_limiter, get_user_service, user_activity
+from repositories.user_repo import SearchMode
 from services.user_service import UserService
-from domain.exceptions import DoubleFoundError, NotFoundError, RepositoryException
+from services.rate_limiter import RateLimiter
+from domain.exceptions import (
+    ConcurrentUpdateError,
+    DoubleFoundError,
+    NotFoundError,
+    RateLimitExceededError,
+    RepositoryException,
+)
+
 
+user_read_fields = fields_dependency(UserRead)
 
 router = APIRouter(
     prefix="/users",
@@ -16,22 +30,40 @@ router = APIRouter(
 )
 
 
+def too_many_requests(ex: RateLimitExceededError) -> HTTPException:
+    return HTTPException(429, ex.message, headers={"Retry-After": str(max(1, round(ex.retry_after)))})
+
+
 @router.post("/", response_model=UserRead)
 async def create_user(
-    data: UserCreate, service: Annotated[UserService, Depends(get_user_service)]
+    data: UserCreate,
+    service: Annotated[UserService, Depends(get_user_service)],
+    limiter: Annotated[RateLimiter, Depends(get_rate_limiter)],
+    client_ip: Annotated[str | None, Depends(get_client_ip)],
 ) -> UserRead | None:
     try:
+        await limiter.check("signup", ip=client_ip, username=data.username)
         user = await service.create(data=data.model_dump())
         return UserRead.model_validate(user)
     except DoubleFoundError as ex:
         raise HTTPException(422, str(ex))
+    except RateLimitExceededError as ex:
+        raise too_many_requests(ex)
 
 
 @router.post("/login", response_model=UserToken)
-async def login(user_data: UserCreate, service: Annotated[UserService, Depends(get_user_service)]):
+async def login(
+    user_data: UserCreate,
+    service: Annotated[UserService, Depends(get_user_service)],
+    limiter: Annotated[RateLimiter, Depends(get_rate_limiter)],
+    client_ip: Annotated[str | None, Depends(get_client_ip)],
+):
     try:
+        await limiter.check("login", ip=client_ip, username=user_data.username)
         user = await service.verify_password(**user_data.model_dump())
         token = create_jwt_token(user_data.model_dump(exclude_unset=True))
+        now = datetime.now(UTC)
+        user_activity.record(user.id, last_login_at=now, last_seen_at=now)
         return UserToken(
             id=user.id,
             username=user.username,
@@ -43,15 +75,50 @@ async def login(user_data: UserCreate, service: Annotated[UserService, Depends(g
             f"Wrong password or user with username {
                             user_data.username} not found.",
         )
+    except RateLimitExceededError as ex:
+        raise too_many_requests(ex)
+
+
+# declared before /{id}, which would take "search" for an id
+@router.get("/search", response_model=UserSearchPage)
+async def search_users(
+    service: Annotated[UserService, Depends(get_user_service)],
+    user: Annotated[DomainUser, Depends(check_token)],
+    q: Annotated[str, Query(min_length=1, max_length=64)],
+    mode: SearchMode = SearchMode.PREFIX,
+    limit: Annotated[int, Query(ge=1, le=USER_SEARCH_MAX_LIMIT)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+) -> UserSearchPage:
+    if mode is SearchMode.CONTAINS and len(q) < USER_SEARCH_MIN_INFIX_LENGTH:
+        raise HTTPException(422, f"Search by a part of the username needs at least {USER_SEARCH_MIN_INFIX_LENGTH} characters")
+    try:
+        # one extra row tells whether there is a next page
+        users = await service.search(q, mode=mode, limit=limit + 1, offset=offset)
+    except RepositoryException as ex:
+        raise HTTPException(422, str(ex))
+    return UserSearchPage(
+        items=[UserRead(id=found.id, username=found.username) for found in users[:limit]],
+        next_offset=offset + limit if len(users) > limit else None,
+    )
 
 
 @router.get("/{id}", response_model=UserRead)
 async def read_user(
     id: int,
+    request: Request,
+    response: Response,
     user: Annotated[DomainUser, Depends(check_token)],
-) -> UserRead:
+    fields: Annotated[tuple[str, ...] | None, Depends(user_read_fields)],
+) -> UserRead | Response:
     try:
         if user.id == id:
+            # the user is already loaded by check_token, so the validator costs no query
+            etag = strong_etag("UserRead", fields, user.id, user.username)
+            not_modified = not_modified_or_none(request, response, etag, CACHE_CONTROL_USER_READ)
+            if not_modified is not None:
+                return not_modified
+            if fields:
+                return partial_response(UserRead, user, fields, headers=dict(response.headers))
             return UserRead.model_validate(user)
         else:
             raise HTTPException(422, f"Wrong user id {id}")
@@ -66,13 +133,19 @@ async def update_user_password(
     data: UserUpdatePassword,
     service: Annotated[UserService, Depends(get_user_service)],
     user: Annotated[DomainUser, Depends(check_token)],
-) -> UserRead | None:
+    fields: Annotated[tuple[str, ...] | None, Depends(user_read_fields)],
+) -> UserRead | Response | None:
     try:
         user = await service.update_password(
             username=user.username,
             old_password=data.old_password,
             new_password=data.new_password,
+            fields=fields,
         )
+        if fields:
+            return partial_response(UserRead, user, fields)
         return UserRead.model_validate(user)
+    except ConcurrentUpdateError as ex:
+        raise HTTPException(409, str(ex))
     except RepositoryException as ex:
         raise HTTPException(422, str(ex))
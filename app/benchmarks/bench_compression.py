@@ -0,0 +1,47 @@
+"""
+CPU cost vs bytes saved of response compression on JSON shaped like our API output.
+
+    python -m benchmarks.bench_compression
+
+Use it to choose COMPRESSION_MIN_SIZE and the levels: below the threshold the
+CPU spent per byte saved stops paying off.
+"""
+import json
+import time
+
+from middleware.compression import StreamCompressor, zstandard
+
+
+def user_list(count: int) -> bytes:
+    users = [{"id": i, "username": f"user_{i:07d}", "last_seen_at": "2025-01-01T00:00:00Z"} for i in range(count)]
+    return json.dumps(users).encode()
+
+
+def bench(encoding: str, level: int, payload: bytes, chunk_size: int, repeat: int) -> tuple[float, float]:
+    chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+    out_size = 0
+    start = time.thread_time()
+    for _ in range(repeat):
+        compressor = StreamCompressor(encoding, gzip_level=level, zstd_level=level)
+        out_size = sum(len(compressor.compress(c, last=i == len(chunks) - 1)) for i, c in enumerate(chunks))
+    cpu = (time.thread_time() - start) / repeat
+    return out_size / len(payload), cpu
+
+
+def main() -> None:
+    encodings = [("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    if zstandard is not None:
+        encodings += [("zstd", 1), ("zstd", 3), ("zstd", 9)]
+    print(f"{'size':>9} {'encoding':>8} {'ratio':>6} {'cpu us':>9} {'us/KB saved':>12}")
+    for count in (5, 50, 500, 5000, 50000):
+        payload = user_list(count)
+        repeat = max(3, 200_000 // len(payload))
+        for encoding, level in encodings:
+            ratio, cpu = bench(encoding, level, payload, chunk_size=16 * 1024, repeat=repeat)
+            saved_kb = len(payload) * (1 - ratio) / 1024
+            per_kb = cpu * 1e6 / saved_kb if saved_kb > 0 else float("inf")
+            print(f"{len(payload):>9} {f'{encoding}-{level}':>8} {ratio:>6.3f} {cpu * 1e6:>9.1f} {per_kb:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
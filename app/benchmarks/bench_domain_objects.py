@@ -0,0 +1,63 @@
+"""
+Construction time and memory of domain objects built from DB rows.
+
+    python -m benchmarks.bench_domain_objects [count]
+
+Compares the validated pydantic model, `model_construct` and the compact record
+(`DomainUser.compact_type()`) for `count` rows (1M by default).
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import UTC, datetime
+from typing import Any, Callable
+
+from domain.domain_user import DomainUser
+
+
+def make_rows(count: int) -> list[tuple[Any, ...]]:
+    seen = datetime(2025, 1, 1, tzinfo=UTC)
+    return [(i, f"user_{i:07d}", "$2b$12$" + "x" * 53, None, seen, 1) for i in range(count)]
+
+
+def measure(build: Callable[[list[tuple[Any, ...]]], list[Any]], rows: list[tuple[Any, ...]]) -> tuple[float, float]:
+    gc.collect()
+    start = time.perf_counter()
+    objects = build(rows)
+    elapsed = time.perf_counter() - start
+    del objects
+    gc.collect()
+
+    # memory is measured in a separate run, tracing slows construction down
+    tracemalloc.start()
+    objects = build(rows)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return elapsed, size
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rows = make_rows(count)
+    fields = tuple(DomainUser.model_fields)
+    compact = DomainUser.compact_type()
+
+    candidates: dict[str, Callable[[list[tuple[Any, ...]]], list[Any]]] = {
+        "model_validate": lambda rows: [DomainUser.model_validate(dict(zip(fields, row))) for row in rows],
+        "model_construct": lambda rows: [DomainUser.model_construct(**dict(zip(fields, row))) for row in rows],
+        "compact": lambda rows: [compact._make(row) for row in rows],
+    }
+    print(f"{count} objects")
+    print(f"{'kind':>16} {'seconds':>8} {'ns/object':>10} {'MB':>8} {'bytes/object':>13}")
+    for name, build in candidates.items():
+        elapsed, size = measure(build, rows)
+        print(
+            f"{name:>16} {elapsed:8.2f} {elapsed * 1e9 / count:10.0f}"
+            f" {size / 2**20:8.1f} {size / count:13.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
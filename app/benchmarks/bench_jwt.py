@@ -0,0 +1,45 @@
+"""
+JWT encode/verify: python-jose vs the HS256 codec used by the API.
+
+    python -m benchmarks.bench_jwt
+
+"verify (cached)" is the steady state of a client reusing its token.
+"""
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Callable
+
+from jose import jwt
+
+from util.jwt_codec import HS256Codec
+
+SECRET = "benchmark-secret"
+CLAIMS = {"username": "user_0000001", "password": "p" * 16, "exp": datetime.now(UTC) + timedelta(days=1)}
+
+
+def per_call_us(func: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1e6 / repeat
+
+
+def main() -> None:
+    repeat = 20000
+    codec = HS256Codec(SECRET)
+    uncached = HS256Codec(SECRET, cache_size=0)
+    token = codec.encode(CLAIMS)
+
+    results = {
+        "jose encode": per_call_us(lambda: jwt.encode(CLAIMS, SECRET, algorithm="HS256"), repeat),
+        "codec encode": per_call_us(lambda: codec.encode(CLAIMS), repeat),
+        "jose verify": per_call_us(lambda: jwt.decode(token, SECRET, algorithms=["HS256"]), repeat),
+        "codec verify": per_call_us(lambda: uncached.decode(token), repeat),
+        "codec verify (cached)": per_call_us(lambda: codec.decode(token), repeat),
+    }
+    for name, us in results.items():
+        print(f"{name:>22} {us:8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
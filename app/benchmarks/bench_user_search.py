@@ -0,0 +1,91 @@
+"""
+Latency of the username search over a large `users` table.
+
+    python -m benchmarks.bench_user_search [count] [database_url]
+
+Fills a fresh SQLite file with `count` users (1M by default) and times prefix and
+infix searches through the repository. Against Postgres, pass the URL of an empty
+database migrated with `alembic upgrade head` (for the pg_trgm index); it is
+filled the same way.
+"""
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import func, insert, select
+
+from db.db import Base, DatabaseSessionManager
+from db.models.user import UserORM
+from domain.domain_user import DomainUser
+from repositories.user_repo import SearchMode, UserSQLAlchemyRepo
+
+QUERIES = 200
+SYLLABLES = ["ka", "lo", "mi", "ra", "to", "ve", "an", "el", "or", "su", "ni", "da"]
+
+
+def username(rng: random.Random, i: int) -> str:
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return f"{name.capitalize() if i % 3 == 0 else name}_{i}"
+
+
+async def fill(manager: DatabaseSessionManager, count: int) -> None:
+    async with manager.connect() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        existing = (await connection.execute(select(func.count()).select_from(UserORM))).scalar_one()
+        rng = random.Random(42)
+        for start in range(existing, count, 10000):
+            rows = [
+                {"username": username(rng, i), "hashed_password": "x"} for i in range(start, min(count, start + 10000))
+            ]
+            await connection.execute(insert(UserORM), rows)
+        await connection.commit()
+
+
+async def measure(repo: UserSQLAlchemyRepo, queries: list[str], mode: SearchMode) -> list[float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        await repo.search(query, mode=mode, limit=20)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    if len(sys.argv) > 2:
+        url = sys.argv[2]
+    else:
+        url = f"sqlite+aiosqlite:///{Path(tempfile.mkdtemp()) / 'search.sqlite3'}"
+    manager = DatabaseSessionManager(url)
+    try:
+        start = time.perf_counter()
+        await fill(manager, count)
+        print(f"{count} users ready in {time.perf_counter() - start:.1f} s ({url})")
+
+        rng = random.Random(7)
+        cases = {
+            "prefix 2 chars": (SearchMode.PREFIX, [rng.choice(SYLLABLES) for _ in range(QUERIES)]),
+            "prefix 6 chars": (SearchMode.PREFIX, [
+                "".join(rng.choice(SYLLABLES) for _ in range(3)) for _ in range(QUERIES)
+            ]),
+            "contains 4 chars": (SearchMode.CONTAINS, [
+                "".join(rng.choice(SYLLABLES) for _ in range(2)) for _ in range(QUERIES)
+            ]),
+        }
+        print(f"{'query':>18} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        async with manager.session() as session:
+            repo = UserSQLAlchemyRepo(session, DomainUser, UserORM)
+            for name, (mode, queries) in cases.items():
+                timings = sorted(await measure(repo, queries, mode))
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                print(f"{name:>18} {statistics.median(timings):8.2f} {p95:8.2f} {timings[-1]:8.2f}")
+    finally:
+        await manager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
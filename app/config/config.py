@@ -3,4 +3,123 @@ from util.util import get_env_value
 
 # DB settings
 DATABASE_URL = get_env_value('DATABASE_URL')
+# comma-separated URLs of the databases `users` is hash-sharded across; the first one also
+# holds the unsharded tables. Without it DATABASE_URL is the only shard.
+DATABASE_SHARD_URLS = [
+    url.strip() for url in (get_env_value("DATABASE_SHARD_URLS", "") or "").split(",") if url.strip()
+] or [DATABASE_URL]
 SECRET = get_env_value("SECRET")
+# recently verified tokens kept in memory, each no longer than its own `exp`
+JWT_CACHE_SIZE = int(get_env_value("JWT_CACHE_SIZE", "4096"))
+
+# Startup settings
+WAIT_FOR_DB_TIMEOUT = float(get_env_value("WAIT_FOR_DB_TIMEOUT", "60"))
+WAIT_FOR_DB_MAX_DELAY = float(get_env_value("WAIT_FOR_DB_MAX_DELAY", "2"))
+RUN_MIGRATIONS = get_env_value("RUN_MIGRATIONS", "true").lower() == "true"
+# warm-up before readiness: pooled connections opened per shard (up to the pool size)
+WARMUP_ENABLED = get_env_value("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_CONNECTIONS = int(get_env_value("WARMUP_CONNECTIONS", "5"))
+WARMUP_TIMEOUT = float(get_env_value("WARMUP_TIMEOUT", "30"))
+# migrations fail fast instead of queuing behind app traffic for a table lock (Postgres)
+MIGRATION_LOCK_TIMEOUT_MS = int(get_env_value("MIGRATION_LOCK_TIMEOUT_MS", "5000"))
+
+# Health settings
+HEALTH_PROBE_INTERVAL = float(get_env_value("HEALTH_PROBE_INTERVAL", "2"))
+HEALTH_PROBE_TIMEOUT = float(get_env_value("HEALTH_PROBE_TIMEOUT", "1"))
+READY_MAX_POOL_WAITERS = int(get_env_value("READY_MAX_POOL_WAITERS", "10"))
+READY_MAX_LOOP_LAG_MS = float(get_env_value("READY_MAX_LOOP_LAG_MS", "500"))
+
+# Event-loop lag monitor settings
+LOOP_LAG_INTERVAL = float(get_env_value("LOOP_LAG_INTERVAL", "0.1"))
+# readiness looks at the worst lag of this many recent seconds
+LOOP_LAG_WINDOW = float(get_env_value("LOOP_LAG_WINDOW", "10"))
+# a loop stalled for longer gets its stack captured by the watchdog thread
+LOOP_BLOCK_THRESHOLD_MS = float(get_env_value("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_LOG_PER_MINUTE = int(get_env_value("LOOP_BLOCK_LOG_PER_MINUTE", "10"))
+
+# Admission control settings
+ADMISSION_TARGET_LATENCY_MS = float(get_env_value("ADMISSION_TARGET_LATENCY_MS", "250"))
+ADMISSION_MAX_QUEUE = int(get_env_value("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_QUEUE_TIMEOUT = float(get_env_value("ADMISSION_QUEUE_TIMEOUT", "1"))
+ADMISSION_RETRY_AFTER = int(get_env_value("ADMISSION_RETRY_AFTER", "1"))
+
+# Request deadline settings
+# default time a request may take, 0 disables deadlines; routes can have their own in main.py
+REQUEST_DEADLINE_MS = float(get_env_value("REQUEST_DEADLINE_MS", "10000"))
+# the Postgres statement_timeout outlives the deadline by this much, so the request's
+# cancellation comes first and the timeout only stops queries a lost cancel left running
+STATEMENT_TIMEOUT_GRACE_MS = float(get_env_value("STATEMENT_TIMEOUT_GRACE_MS", "100"))
+
+# Rate limit settings
+RATE_LIMIT_BACKEND = get_env_value("RATE_LIMIT_BACKEND", "memory")  # memory | db
+RATE_LIMIT_MAX_KEYS = int(get_env_value("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_IP_BURST = int(get_env_value("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_IP_PER_MINUTE = float(get_env_value("RATE_LIMIT_IP_PER_MINUTE", "60"))
+RATE_LIMIT_USERNAME_BURST = int(get_env_value("RATE_LIMIT_USERNAME_BURST", "5"))
+RATE_LIMIT_USERNAME_PER_MINUTE = float(get_env_value("RATE_LIMIT_USERNAME_PER_MINUTE", "10"))
+
+# Idempotency-Key settings
+IDEMPOTENCY_BACKEND = get_env_value("IDEMPOTENCY_BACKEND", "memory")  # memory | db
+IDEMPOTENCY_TTL = float(get_env_value("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(get_env_value("IDEMPOTENCY_MAX_KEYS", "10000"))
+# a claimed key whose request never finished (crashed worker) is free again after this
+IDEMPOTENCY_LOCK_TTL = float(get_env_value("IDEMPOTENCY_LOCK_TTL", "30"))
+# how long a duplicate waits for the first request before a 409
+IDEMPOTENCY_WAIT_TIMEOUT = float(get_env_value("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+IDEMPOTENCY_MAX_BODY = int(get_env_value("IDEMPOTENCY_MAX_BODY", "65536"))
+# keys are scoped per caller by this header: the JWT of `api.auth.api_key_header`
+IDEMPOTENCY_CREDENTIAL_HEADER = get_env_value("IDEMPOTENCY_CREDENTIAL_HEADER", "token")
+
+# Read batching settings
+READ_BATCHING = get_env_value("READ_BATCHING", "true").lower() == "true"
+READ_BATCH_WINDOW = float(get_env_value("READ_BATCH_WINDOW", "0"))
+
+# Password hashing settings
+# pick the value with `python -m util.crypto_calibrate --target-ms 250` on the target hardware
+BCRYPT_ROUNDS = int(get_env_value("BCRYPT_ROUNDS", "12"))
+HASH_AUDIT_INTERVAL = float(get_env_value("HASH_AUDIT_INTERVAL", str(6 * 60 * 60)))
+HASH_AUDIT_BATCH_SIZE = int(get_env_value("HASH_AUDIT_BATCH_SIZE", "500"))
+HASH_AUDIT_BATCH_PAUSE = float(get_env_value("HASH_AUDIT_BATCH_PAUSE", "0.5"))
+
+# User activity write-behind settings
+ACTIVITY_FLUSH_INTERVAL = float(get_env_value("ACTIVITY_FLUSH_INTERVAL", "5"))
+ACTIVITY_FLUSH_SIZE = int(get_env_value("ACTIVITY_FLUSH_SIZE", "1000"))
+ACTIVITY_MAX_KEYS = int(get_env_value("ACTIVITY_MAX_KEYS", "50000"))
+
+# HTTP caching settings
+CACHE_CONTROL_USER_READ = get_env_value("CACHE_CONTROL_USER_READ", "private, no-cache")
+
+# Response compression settings
+COMPRESSION_MIN_SIZE = int(get_env_value("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(get_env_value("COMPRESSION_GZIP_LEVEL", "1"))
+COMPRESSION_ZSTD_LEVEL = int(get_env_value("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# Repository settings
+# what to do with filters/sorts that no index supports: off | warn | reject
+FILTER_INDEX_POLICY = get_env_value("FILTER_INDEX_POLICY", "warn")
+# read-modify-write attempts of a versioned update before the conflict reaches the caller
+OPTIMISTIC_RETRY_ATTEMPTS = int(get_env_value("OPTIMISTIC_RETRY_ATTEMPTS", "3"))
+OPTIMISTIC_RETRY_BACKOFF = float(get_env_value("OPTIMISTIC_RETRY_BACKOFF", "0.01"))
+
+# User search settings
+USER_SEARCH_MAX_LIMIT = int(get_env_value("USER_SEARCH_MAX_LIMIT", "100"))
+# shorter infix queries have no trigram to use the index with
+USER_SEARCH_MIN_INFIX_LENGTH = int(get_env_value("USER_SEARCH_MIN_INFIX_LENGTH", "3"))
+
+# Profiling settings
+# profile every request, or only the ones sent with `X-Profile: <PROFILING_SECRET>`
+PROFILING_ENABLED = get_env_value("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SECRET = get_env_value("PROFILING_SECRET", "")
+PROFILING_THRESHOLD_MS = float(get_env_value("PROFILING_THRESHOLD_MS", "500"))
+PROFILING_INTERVAL_MS = float(get_env_value("PROFILING_INTERVAL_MS", "5"))
+PROFILING_DIR = get_env_value("PROFILING_DIR", "profiles")
+PROFILING_KEEP = int(get_env_value("PROFILING_KEEP", "50"))
+
+# Slow query log settings
+SLOW_QUERY_MS = float(get_env_value("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_LOG_PER_MINUTE = int(get_env_value("SLOW_QUERY_LOG_PER_MINUTE", "30"))
+# sampled EXPLAIN (ANALYZE, BUFFERS) of SELECTs that are slow again and again, Postgres only
+SLOW_QUERY_EXPLAIN = get_env_value("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+SLOW_QUERY_EXPLAIN_AFTER = int(get_env_value("SLOW_QUERY_EXPLAIN_AFTER", "5"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(get_env_value("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(get_env_value("SLOW_QUERY_EXPLAIN_INTERVAL", "600"))
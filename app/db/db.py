@@ -3,7 +3,7 @@
 # make migrations
 # alembic revision --autogenerate -m "your message here"
 import contextlib
-from typing import Any, AsyncIterator
+from typing import Any, AsyncIterator, Callable, Sequence
 
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
@@ -12,46 +12,94 @@ from sqlalchemy.ext.asyncio import (
     create_async_engine,
 )
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import QueuePool
 
-from config.config import DATABASE_URL
+from config.config import DATABASE_SHARD_URLS
+from db.deadline import DeadlineSession
+from db.sharding import ShardedSession, shard_index
+from monitoring.metrics import metrics
+from monitoring.slow_query import SlowQueryLog, slow_query_log
 
 
 Base = declarative_base()
 
+# QueuePool's documented default, used when `engine_kwargs` sets no `max_overflow`
+DEFAULT_MAX_OVERFLOW = 10
+
 
 class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
-        self.engine = create_async_engine(host, **engine_kwargs)
-        self.sessionmaker = async_sessionmaker(autocommit=False, bind=self.engine)
+    """
+    Engines and sessions of the app databases.
+
+    Given several URLs it manages one engine per shard; shard 0 is also the home of
+    the unsharded tables. Rows of sharded entities are routed with `shard_for(key)`.
+    """
+
+    def __init__(
+        self,
+        host: str | Sequence[str],
+        engine_kwargs: dict[str, Any] = {},
+        slow_query_log: SlowQueryLog | None = None,
+    ):
+        hosts = [host] if isinstance(host, str) else list(host)
+        self.engines = [create_async_engine(url, **engine_kwargs) for url in hosts]
+        if slow_query_log is not None:
+            for engine in self.engines:
+                slow_query_log.attach(engine)
+        # transactions get a statement_timeout from the request deadline (Postgres)
+        self.sessionmakers = [
+            async_sessionmaker(autocommit=False, bind=engine, sync_session_class=DeadlineSession)
+            for engine in self.engines
+        ]
+        self.engine = self.engines[0]
+        self.sessionmaker = self.sessionmakers[0]
+        self.max_overflow: int = engine_kwargs.get("max_overflow", DEFAULT_MAX_OVERFLOW)
+        # open sessions and connections per shard, each holding or about to take a pooled connection
+        self.in_use = [0] * len(self.engines)
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, key: Any) -> int:
+        return shard_index(key, self.shard_count)
 
     async def close(self):
         if self.engine is None:
             self.sessionmaker = None
             return
 
-        await self.engine.dispose()
+        for engine in self.engines:
+            await engine.dispose()
 
+        self.engines = []
+        self.sessionmakers = []
         self.engine = None
         self.sessionmaker = None
 
     @contextlib.asynccontextmanager
-    async def connect(self) -> AsyncIterator[AsyncConnection]:
+    async def connect(self, shard: int = 0) -> AsyncIterator[AsyncConnection]:
         if self.engine is None:
             raise Exception("DatabaseSessionManager is not initialized")
 
-        async with self.engine.begin() as connection:
-            try:
-                yield connection
-            except Exception:
-                await connection.rollback()
-                raise
+        self.in_use[shard] += 1
+        try:
+            async with self.engines[shard].begin() as connection:
+                try:
+                    yield connection
+                except Exception:
+                    await connection.rollback()
+                    raise
+        finally:
+            self.in_use[shard] -= 1
 
     @contextlib.asynccontextmanager
-    async def session(self) -> AsyncIterator[AsyncSession]:
+    async def session(self, shard: int = 0) -> AsyncIterator[AsyncSession]:
         if self.sessionmaker is None:
             raise Exception("DatabaseSessionManager is not initialized")
 
-        session = self.sessionmaker()
+        session = self.sessionmakers[shard]()
+        self.in_use[shard] += 1
         try:
             yield session
             await session.commit()
@@ -59,12 +107,66 @@ class DatabaseSessionManager:
             await session.rollback()
             raise
         finally:
+            self.in_use[shard] -= 1
             await session.close()
 
+    @contextlib.asynccontextmanager
+    async def sharded_session(self) -> AsyncIterator[ShardedSession]:
+        """Sessions of all shards for one unit of work, each opened when first used."""
+        if self.sessionmaker is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+
+        opened: list[int] = []
+
+        def counted(shard: int) -> Callable[[], AsyncSession]:
+            def open_session() -> AsyncSession:
+                opened.append(shard)
+                self.in_use[shard] += 1
+                return self.sessionmakers[shard]()
+            return open_session
 
-sessionmanager = DatabaseSessionManager(DATABASE_URL, {"echo": False})
+        shards = ShardedSession([counted(shard) for shard in range(self.shard_count)])
+        try:
+            yield shards
+            await shards.commit()
+        except Exception:
+            await shards.rollback()
+            raise
+        finally:
+            for shard in opened:
+                self.in_use[shard] -= 1
+            await shards.close()
+
+    def pool_waiters(self) -> int:
+        """
+        Estimates how many sessions and connections are queued for a pooled connection.
+
+        A pool with a free slot hands connections out without queueing, so only a pool that
+        has checked out all of `size() + max_overflow` connections has waiters: the users of
+        its shard that hold none. An open session that has not run a query yet counts too,
+        which makes this an upper bound. Pools without a fixed capacity never queue.
+        """
+        if self.max_overflow < 0:
+            return 0
+        waiters = 0
+        for shard, engine in enumerate(self.engines):
+            pool = engine.pool
+            if not isinstance(pool, QueuePool):
+                continue
+            checked_out = pool.checkedout()
+            if checked_out >= pool.size() + self.max_overflow:
+                waiters += max(0, self.in_use[shard] - checked_out)
+        return waiters
+
+
+sessionmanager = DatabaseSessionManager(DATABASE_SHARD_URLS, {"echo": False}, slow_query_log=slow_query_log)
+metrics.register("slow_queries", slow_query_log.snapshot)
 
 
 async def get_db():
+    if sessionmanager.shard_count > 1:
+        async with sessionmanager.sharded_session() as shards:
+            yield shards
+        return
     async with sessionmanager.session() as session:
         yield session
@@ -0,0 +1,40 @@
+import asyncio
+import math
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, SessionTransaction
+
+from config.config import STATEMENT_TIMEOUT_GRACE_MS
+
+# event-loop time (`loop.time()`) the current request must be done by, set by DeadlineMiddleware
+current_deadline: ContextVar[float | None] = ContextVar("current_deadline", default=None)
+
+
+def remaining_ms() -> float | None:
+    """Time left until the current deadline, None without one."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return (deadline - asyncio.get_running_loop().time()) * 1000
+
+
+class DeadlineSession(Session):
+    """
+    Session whose transactions on Postgres get a `statement_timeout` of the time
+    left until the request deadline (plus `STATEMENT_TIMEOUT_GRACE_MS`), so the
+    server stops a query of a request that has given up even if the cancel is lost.
+    """
+
+
+@event.listens_for(DeadlineSession, "after_begin")
+def _apply_statement_timeout(session: Session, transaction: SessionTransaction, connection: Connection) -> None:
+    if connection.dialect.name != "postgresql":
+        return
+    left = remaining_ms()
+    if left is None:
+        return
+    # SET LOCAL ends with the transaction, the pooled connection keeps its default
+    timeout = max(1, math.ceil(left + STATEMENT_TIMEOUT_GRACE_MS))
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from db.db import DatabaseSessionManager, sessionmanager
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+def alembic_config(url: str | None = None) -> "Config":
+    """Build the alembic config for in-process use, independent of the working directory."""
+    from alembic.config import Config
+
+    config = Config(str(APP_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(APP_DIR / "alembic"))
+    # the app has already configured logging, env.py must not replace it
+    config.attributes["configure_logger"] = False
+    if url is not None:
+        config.attributes["sqlalchemy_url"] = url
+    return config
+
+
+async def current_revisions(manager: DatabaseSessionManager = sessionmanager, shard: int = 0) -> set[str]:
+    """Return the revisions recorded in `alembic_version` (empty for a fresh database)."""
+    from alembic.runtime.migration import MigrationContext
+
+    async with manager.connect(shard) as connection:
+        heads = await connection.run_sync(
+            lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()
+        )
+    return set(heads)
+
+
+async def upgrade_if_needed(manager: DatabaseSessionManager = sessionmanager) -> bool:
+    """
+    Upgrades every shard database to head unless it is already there.
+
+    The check is a single `alembic_version` read on the app's own engine, so the common
+    "nothing changed" boot does not pay for a second interpreter and a full alembic run.
+
+    Returns:
+        bool: True if migrations were applied to any shard.
+    """
+    from alembic import command
+    from alembic.script import ScriptDirectory
+
+    if manager.engine is None:
+        raise Exception("DatabaseSessionManager is not initialized")
+
+    heads = set(ScriptDirectory.from_config(alembic_config()).get_heads())
+    upgraded = False
+    for shard, engine in enumerate(manager.engines):
+        current = await current_revisions(manager, shard)
+        if current == heads:
+            logger.info(f"Shard {shard} is at head {sorted(heads)}, skipping migrations")
+            continue
+
+        logger.info(f"Upgrading shard {shard} from {sorted(current) or 'empty'} to {sorted(heads)}")
+        config = alembic_config(engine.url.render_as_string(hide_password=False))
+        # env.py drives its own event loop, so it has to run outside of ours
+        await asyncio.to_thread(command.upgrade, config, "head")
+        upgraded = True
+    return upgraded
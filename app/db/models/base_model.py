@@ -1,5 +1,8 @@
 from typing import TypeVar
 
+from sqlalchemy import Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
 from ..db import Base
 
 class BaseORMModel(Base):
@@ -11,4 +14,15 @@ class BaseORMModel(Base):
             raise NotImplementedError(f"class {cls.__name__} must have __tablename__ attribute")
 
 
+class VersionedMixin:
+    """
+    Version column for optimistic concurrency control.
+
+    `UpdateMixin.update_if_version` writes a row only while its version is still the
+    one that was read, and increments it; `UpdateMixin.update` increments it as well.
+    """
+
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+
+
 TOrm = TypeVar("TOrm", bound=BaseORMModel)
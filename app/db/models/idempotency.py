@@ -0,0 +1,19 @@
+from sqlalchemy import Float, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base_model import BaseORMModel
+
+
+class IdempotencyKeyORM(BaseORMModel):
+    __tablename__ = "idempotency_keys"
+
+    # hash of the route, the caller's credentials and the Idempotency-Key header
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String, nullable=False)
+    # NULL while the first request is in progress
+    status: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # JSON list of [name, value] pairs
+    headers: Mapped[str | None] = mapped_column(Text, nullable=True)
+    body: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    # unix seconds
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
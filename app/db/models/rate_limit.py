@@ -0,0 +1,12 @@
+from sqlalchemy import Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base_model import BaseORMModel
+
+
+class RateLimitBucketORM(BaseORMModel):
+    __tablename__ = "rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    # GCRA theoretical arrival time, unix seconds
+    tat: Mapped[float] = mapped_column(Float, nullable=False, index=True)
@@ -1,12 +1,24 @@
-from sqlalchemy import String, Integer
+from datetime import datetime
+
+from sqlalchemy import DateTime, Index, String, Integer, func
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .base_model import BaseORMModel
+from .base_model import BaseORMModel, VersionedMixin
 
 
-class UserORM(BaseORMModel):
+class UserORM(BaseORMModel, VersionedMixin):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     username: Mapped[str] = mapped_column(String, unique=True, nullable=False, index=True)
     hashed_password: Mapped[str] = mapped_column(String)
+    # written in batches by the user activity write-behind buffer, which leaves `version`
+    # alone: activity timestamps never conflict with other changes
+    last_login_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_seen_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+# case-insensitive username search (UserSQLAlchemyRepo.search). On Postgres the
+# migration builds it as `lower(username) COLLATE "C"`, so prefix ranges are
+# byte ordered, next to a pg_trgm GIN index for infix search.
+Index("ix_users_username_lower", func.lower(UserORM.username))
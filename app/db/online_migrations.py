@@ -0,0 +1,187 @@
+"""
+Helpers for migrations that must not stall a live database.
+
+Use them from `alembic/versions`:
+
+    from db.online_migrations import backfill, create_index_concurrently
+
+    def upgrade() -> None:
+        op.add_column("users", sa.Column("flag", sa.Boolean(), nullable=True))
+        backfill("users", {"flag": sa.false()}, where="flag IS NULL")
+        create_index_concurrently("ix_users_flag", "users", ["flag"])
+
+On Postgres the index is built with `CREATE INDEX CONCURRENTLY` and every backfill
+batch is committed on its own, so neither holds a lock for longer than a batch.
+Other dialects get the plain statements.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Mapping, Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger(__name__)
+
+
+def is_postgres() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def set_lock_timeout(timeout_ms: int) -> None:
+    """
+    Makes statements of the current connection give up after waiting `timeout_ms`
+    for a lock, instead of queuing behind app traffic (and blocking it in turn).
+    env.py already sets MIGRATION_LOCK_TIMEOUT_MS; this overrides it for one migration.
+    """
+    if is_postgres():
+        op.execute(f"SET lock_timeout = {int(timeout_ms)}")
+
+
+@contextmanager
+def _without_lock_timeout() -> Iterator[None]:
+    """
+    Lifts the lock timeout for the concurrent DDL run inside it.
+
+    A concurrent index build waits for every transaction touching the table to end,
+    which easily takes longer than MIGRATION_LOCK_TIMEOUT_MS, and it only waits out
+    transactions without blocking them, so it can wait as long as it takes.
+    """
+    if op.get_context().as_sql:
+        # offline env.py sets no timeout, so the default is the value to return to
+        op.execute("SET lock_timeout = 0")
+        yield
+        op.execute("RESET lock_timeout")
+        return
+    previous = op.get_bind().execute(sa.text("SHOW lock_timeout")).scalar()
+    op.execute("SET lock_timeout = 0")
+    try:
+        yield
+    finally:
+        op.execute(sa.text("SELECT set_config('lock_timeout', :value, false)").bindparams(value=previous))
+
+
+def _invalid_index_exists(index_name: str) -> bool:
+    # an interrupted CONCURRENTLY build leaves an invalid index behind, which
+    # IF NOT EXISTS would happily accept
+    return bool(
+        op.get_bind().execute(
+            sa.text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+            ),
+            {"name": index_name},
+        ).scalar()
+    )
+
+
+def create_index_concurrently(
+    index_name: str,
+    table: str,
+    columns: Sequence[str | sa.TextClause],
+    unique: bool = False,
+    where: str | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Builds an index without blocking writes to `table`.
+
+    `CREATE INDEX CONCURRENTLY` can't run in a transaction, so on Postgres the
+    migration transaction is committed and the index is built in autocommit mode,
+    with no lock timeout.
+    A leftover invalid index of a failed earlier attempt is dropped first, which
+    makes the migration safe to rerun.
+
+    Args:
+        columns: Column names or expressions such as `sa.text("lower(username)")`.
+        where: SQL condition of a partial index.
+        **kwargs: Passed to `op.create_index` (e.g. `postgresql_using="gin"`).
+    """
+    if not is_postgres():
+        op.create_index(
+            index_name, table, columns, unique=unique,
+            sqlite_where=sa.text(where) if where else None, **kwargs,
+        )
+        return
+    with op.get_context().autocommit_block(), _without_lock_timeout():
+        # offline (--sql) there is no database to look at
+        if not op.get_context().as_sql and _invalid_index_exists(index_name):
+            logger.warning(f"Dropping invalid index {index_name} left by an interrupted build")
+            op.drop_index(index_name, table_name=table, postgresql_concurrently=True)
+        op.create_index(
+            index_name, table, columns, unique=unique,
+            postgresql_where=sa.text(where) if where else None,
+            postgresql_concurrently=True, if_not_exists=True, **kwargs,
+        )
+
+
+def drop_index_concurrently(index_name: str, table: str) -> None:
+    """Drops an index without blocking reads and writes of `table`, with no lock timeout."""
+    if not is_postgres():
+        op.drop_index(index_name, table_name=table)
+        return
+    with op.get_context().autocommit_block(), _without_lock_timeout():
+        op.drop_index(index_name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def backfill(
+    table: str,
+    values: Mapping[str, Any],
+    where: str,
+    key: str = "id",
+    batch_size: int = 1000,
+    pause: float = 0.05,
+    start_after: Any = None,
+) -> int:
+    """
+    Updates `table` in chunks of `batch_size` consecutive `key`s, committing each.
+
+    Every chunk is a short transaction, so row locks are held briefly and replicas
+    and vacuum keep up; `pause` seconds between chunks leave room for app traffic.
+    `where` must select only the rows still to be done (e.g. `"flag IS NULL"`): that
+    makes a rerun after a failure skip the finished part, and `start_after` can skip
+    it even faster, from the last key in the progress log.
+
+    Args:
+        values: Column name to a value or a SQL expression (`sa.text("...")`).
+        where: SQL condition of the rows that still need the update.
+        key: Unique, indexed column the chunks are cut by.
+
+    Returns:
+        The number of updated rows.
+    """
+    target = sa.table(table, sa.column(key), *(sa.column(name) for name in values))
+    key_column = target.c[key]
+    updated = 0
+
+    # in autocommit mode every statement is its own transaction
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last = start_after
+        total_max = bind.execute(sa.select(sa.func.max(key_column))).scalar()
+        started = time.monotonic()
+        while total_max is not None and (last is None or last < total_max):
+            chunk = sa.select(key_column).order_by(key_column).limit(batch_size)
+            if last is not None:
+                chunk = chunk.where(key_column > last)
+            upper = bind.execute(sa.select(sa.func.max(chunk.subquery().c[key]))).scalar()
+            if upper is None:
+                break
+
+            statement = (
+                sa.update(target)
+                .where(key_column <= upper, sa.text(f"({where})"))
+                .values({target.c[name]: value for name, value in values.items()})
+            )
+            if last is not None:
+                statement = statement.where(key_column > last)
+            updated += bind.execute(statement).rowcount
+            last = upper
+            logger.info(
+                f"Backfill {table}: {updated} rows updated, up to {key} {last} of {total_max}, "
+                f"{time.monotonic() - started:.0f} s"
+            )
+            if pause:
+                time.sleep(pause)
+    return updated
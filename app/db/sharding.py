@@ -0,0 +1,67 @@
+import hashlib
+from typing import Any, Callable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def shard_index(key: Any, shard_count: int) -> int:
+    """Shard of `key`: stable across processes and restarts, unlike the salted `hash()`."""
+    if shard_count == 1:
+        return 0
+    digest = hashlib.blake2b(str(key).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+# Autoincrement ids are only unique within a shard. Sharded entities expose
+# `local_id * shard_count + shard` instead, so an id is globally unique and
+# also tells which shard the row lives on.
+def to_global_id(local_id: int, shard: int, shard_count: int) -> int:
+    return local_id * shard_count + shard
+
+
+def to_local_id(global_id: int, shard_count: int) -> tuple[int, int]:
+    """Returns `(shard, local_id)` of a global id."""
+    return global_id % shard_count, global_id // shard_count
+
+
+class ShardedSession:
+    """
+    Request-scoped set of sessions, one per shard, each opened on first use.
+
+    Commits run shard by shard and are not atomic across shards: a unit of work
+    should write to a single shard, which routing by the shard key ensures.
+    """
+
+    def __init__(self, sessionmakers: Sequence[Callable[[], AsyncSession]]) -> None:
+        self.sessionmakers = sessionmakers
+        self.count = len(sessionmakers)
+        self._sessions: dict[int, AsyncSession] = {}
+
+    @classmethod
+    def single(cls, session: AsyncSession) -> "ShardedSession":
+        """Wraps a plain session as the only shard."""
+        shards = cls([lambda: session])
+        shards._sessions[0] = session
+        return shards
+
+    def shard_for(self, key: Any) -> int:
+        return shard_index(key, self.count)
+
+    def get(self, shard: int) -> AsyncSession:
+        session = self._sessions.get(shard)
+        if session is None:
+            session = self._sessions[shard] = self.sessionmakers[shard]()
+        return session
+
+    async def commit(self) -> None:
+        for session in self._sessions.values():
+            await session.commit()
+
+    async def rollback(self) -> None:
+        for session in self._sessions.values():
+            await session.rollback()
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
@@ -1,38 +1,71 @@
 import asyncio
 import logging
+import sys
 
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.future import select
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
 
-from db.db import sessionmanager
+from config.config import WAIT_FOR_DB_MAX_DELAY, WAIT_FOR_DB_TIMEOUT
+from db.db import DatabaseSessionManager, sessionmanager
 
 logger = logging.getLogger(__name__)
-root_logger = logging.getLogger()
-root_logger.setLevel(logging.WARNING)
 
 
-async def wait_for_db():
-    num_retries = 60
-    wait_time = 1
+class DatabaseUnavailableError(Exception):
+    pass
 
-    print("\033[32mWait for DB was ready.")
-    for _ in range(num_retries):
+
+async def wait_for_db(
+    manager: DatabaseSessionManager = sessionmanager,
+    timeout: float = WAIT_FOR_DB_TIMEOUT,
+    initial_delay: float = 0.05,
+    max_delay: float = WAIT_FOR_DB_MAX_DELAY,
+) -> int:
+    """
+    Polls the database (every shard) until it answers `SELECT 1`.
+
+    The delay between attempts grows exponentially from `initial_delay` up to `max_delay`,
+    so a database that is already up costs a single round trip, and a starting one is
+    picked up within a fraction of a second.
+
+    Returns:
+        int: The number of attempts it took.
+
+    Raises:
+        DatabaseUnavailableError: If the database is still unreachable after `timeout` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            # Выполняем простой запрос, чтобы проверить жива ли база
-            async with sessionmanager.session() as session:
-                await session.execute(select(1))
-                print("\n\033[32mDB is ready!\033[0m")
-                return
-        except (OperationalError, ConnectionRefusedError) as exc:
-            logger.warning(f"DB not ready yet: {exc}")
-            print(".", end="", flush=True)
-            await asyncio.sleep(wait_time)
-        except Exception as exc:
-            logger.exception(f"Unexpected error while waiting for DB: {exc}")
-            raise
-
-    logger.error(
-        f"\033[31mCouldn't connect to database after {num_retries} attempts, exiting...\033[0m")
-    exit(1)
-
-asyncio.run(wait_for_db())
+            for shard in range(manager.shard_count):
+                async with manager.connect(shard) as connection:
+                    await connection.execute(select(1))
+            return attempt
+        except (DBAPIError, OSError) as exc:
+            if loop.time() + delay > deadline:
+                raise DatabaseUnavailableError(
+                    f"Couldn't connect to database after {attempt} attempts: {exc}"
+                ) from exc
+            logger.warning(f"DB not ready yet (attempt {attempt}): {exc}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+async def _main() -> None:
+    try:
+        attempts = await wait_for_db()
+        print(f"\033[32mDB is ready after {attempts} attempt(s)!\033[0m")
+    except DatabaseUnavailableError as exc:
+        logger.error(f"\033[31m{exc}, exiting...\033[0m")
+        sys.exit(1)
+    finally:
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(_main())
@@ -1,4 +1,6 @@
-from typing import TypeVar
+from collections import namedtuple
+from functools import cache
+from typing import Any, TypeVar
 from abc import ABC
 
 from pydantic import BaseModel, ConfigDict
@@ -7,5 +9,38 @@ from pydantic import BaseModel, ConfigDict
 class BaseDomainModel(BaseModel, ABC):
     model_config = ConfigDict(from_attributes=True)
 
+    @classmethod
+    def compact_type(cls) -> type[Any]:
+        return compact_type(cls)
+
+    def to_compact(self) -> Any:
+        return self.compact_type()._make(getattr(self, name) for name in type(self).model_fields)
+
 
 TDomain = TypeVar("TDomain", bound=BaseDomainModel, covariant=True)
+
+
+@cache
+def compact_type(model: type[BaseDomainModel]) -> type[Any]:
+    """
+    Compact, immutable counterpart of a domain model for hot internal paths.
+
+    It is a slotted named tuple with the model's fields in declaration order, built
+    without validation (`Compact._make(row)` straight from a DB row), so it costs a
+    fraction of the time and memory of the pydantic model. Convert with `to_model()`
+    at the API boundary; response models with `from_attributes` also read it as is.
+    """
+    fields = list(model.model_fields.items())
+    defaults: list[Any] = []
+    # named tuple defaults apply to the trailing fields only
+    for _, info in reversed(fields):
+        if info.is_required():
+            break
+        defaults.insert(0, info.get_default(call_default_factory=True))
+    base = namedtuple(f"{model.__name__}Compact", [name for name, _ in fields], defaults=defaults)  # type: ignore[misc]
+
+    def to_model(self: Any) -> BaseDomainModel:
+        # the values came from the DB or a validated model, they are trusted
+        return model.model_construct(**self._asdict())
+
+    return type(base.__name__, (base,), {"__slots__": (), "domain_model": model, "to_model": to_model})
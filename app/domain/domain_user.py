@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from .base_domain_model import BaseDomainModel
 
 
@@ -5,3 +7,6 @@ class DomainUser(BaseDomainModel):
     id: int
     username: str
     hashed_password: str
+    last_login_at: datetime | None = None
+    last_seen_at: datetime | None = None
+    version: int = 1
@@ -14,3 +14,17 @@ class NotFoundError(RepositoryException):
 
 class DoubleFoundError(RepositoryException):
     pass
+
+
+class RateLimitExceededError(DomainException):
+    def __init__(self, message: str = "", retry_after: float = 0.0) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UnindexedQueryError(RepositoryException):
+    pass
+
+
+class ConcurrentUpdateError(RepositoryException):
+    pass
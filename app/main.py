@@ -1,3 +1,6 @@
+import time
+_import_started = time.perf_counter()
+
 import config.logger
 import logging
 import asyncio
@@ -8,18 +11,50 @@ from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.config import Config
 from uvicorn.server import Server
 
+from api.dependencies import idempotency_store, rate_limit_backend, user_activity
 from api.router import router
+from config.config import PROFILING_ENABLED, PROFILING_SECRET, RUN_MIGRATIONS
 from db.db import sessionmanager
+from db.migrations import upgrade_if_needed
+from db.wait_for_db import wait_for_db
+from middleware.admission import AdmissionControlMiddleware, RouteLimit
+from middleware.compression import CompressionMiddleware
+from middleware.deadline import DeadlineMiddleware, RouteDeadline
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.profiling import ProfilingMiddleware
+from monitoring.health import health_monitor
+from monitoring.loop_monitor import loop_monitor
+from tasks.jobs import register_jobs
+from tasks.scheduler import Scheduler
+from tasks.warmup import warmup
+from util.timing import timed_phase
 
 
 logger = logging.getLogger(__name__)
-stop_event = asyncio.Event()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # created per start, so the app can be started again (e.g. by another TestClient)
+    stop_event = asyncio.Event()
+    scheduler = Scheduler()
+    # in the background: /healthz answers meanwhile, /readyz waits for it
+    warmup_task = asyncio.create_task(warmup.run())
+    loop_monitor_task = asyncio.create_task(loop_monitor.run(stop_event))
+    health_task = asyncio.create_task(health_monitor.run(stop_event))
+    register_jobs(scheduler, stop_event, sessionmanager, user_activity, rate_limit_backend, idempotency_store)
+    scheduler_task = asyncio.create_task(scheduler.run(stop_event))
     yield
     stop_event.set()
+    warmup_task.cancel()
+    # jobs finish (or are cancelled) before the engine they use is disposed
+    await scheduler_task
+    await health_task
+    await loop_monitor_task
+    try:
+        await user_activity.flush()
+    except Exception:
+        logger.exception("Could not flush user activity on shutdown")
     await sessionmanager.close()
 
 
@@ -28,13 +63,6 @@ app = FastAPI(
     root_path="/",
 )
 
-app.add_middleware(
-       CORSMiddleware,
-       allow_origins=["*"],  # Разрешенные источники
-       allow_credentials=True,
-       allow_methods=["*"],  # Разрешите все методы или укажите конкретные
-       allow_headers=["*"],  # Разрешите все заголовки или укажите конкретные
-   )
 
 @app.middleware("http")
 async def log_request_response(request: Request, call_next):
@@ -44,8 +72,65 @@ async def log_request_response(request: Request, call_next):
     return response
 
 
+# inside compression, so a replayed response is encoded for the retry's Accept-Encoding
+app.add_middleware(
+    IdempotencyMiddleware,
+    store=idempotency_store,
+    routes=[("POST", "/api/v1/users/"), ("POST", "/api/v1/users/update_password")],
+)
+
+app.add_middleware(CompressionMiddleware)
+
+# bcrypt-bound routes get small, separate limits so they can't starve cheap reads
+app.add_middleware(
+    AdmissionControlMiddleware,
+    routes=[
+        RouteLimit(
+            name="login", path="/api/v1/users/login", method="POST",
+            initial_limit=4, max_limit=16, target_latency_ms=1000,
+        ),
+        RouteLimit(
+            name="signup", path="/api/v1/users/", method="POST",
+            initial_limit=4, max_limit=16, target_latency_ms=1000,
+        ),
+    ],
+    default=RouteLimit(name="default", initial_limit=50, max_limit=500),
+)
+
+# outside admission control, so time spent queueing counts and abandoned requests leave the queue
+app.add_middleware(
+    DeadlineMiddleware,
+    routes=[
+        RouteDeadline(path="/api/v1/users/search", method="GET", timeout_ms=3000),
+    ],
+)
+
+# outside admission control, so a profile covers queueing there too; not installed at all when off
+if PROFILING_ENABLED or PROFILING_SECRET:
+    app.add_middleware(ProfilingMiddleware, always=PROFILING_ENABLED, secret=PROFILING_SECRET)
+
+# outermost, so preflights are answered first and responses made by middleware carry CORS headers too
+app.add_middleware(
+       CORSMiddleware,
+       allow_origins=["*"],  # Разрешенные источники
+       allow_credentials=True,
+       allow_methods=["*"],  # Разрешите все методы или укажите конкретные
+       allow_headers=["*"],  # Разрешите все заголовки или укажите конкретные
+   )
+
 app.include_router(router)
 
+logger.info(f"app import took {(time.perf_counter() - _import_started) * 1000:.1f} ms")
+
+
+async def prepare_database() -> None:
+    """Wait for the DB and bring its schema to head, all in this process."""
+    with timed_phase("wait for db", logger):
+        await wait_for_db()
+    if RUN_MIGRATIONS:
+        with timed_phase("migrations", logger):
+            await upgrade_if_needed()
+
 
 async def run_fastapi():
     config = Config(app=app, host="0.0.0.0", port=9000, lifespan="on", log_level="warning")
@@ -54,10 +139,9 @@ async def run_fastapi():
 
 
 async def main() -> None:
-    await asyncio.gather(
-        run_fastapi(),
-        # some_task(stop_event, sessionmanager),
-    )
+    with timed_phase("startup", logger):
+        await prepare_database()
+    await run_fastapi()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import (
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_TARGET_LATENCY_MS,
+)
+from monitoring.metrics import metrics
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """
+    Admission settings for one route.
+
+    `path` is matched exactly; `method=None` matches any method.
+    """
+
+    name: str
+    path: str | None = None
+    method: str | None = None
+    initial_limit: int = 20
+    min_limit: int = 1
+    max_limit: int = 200
+    max_queue: int = ADMISSION_MAX_QUEUE
+    queue_timeout: float = ADMISSION_QUEUE_TIMEOUT
+    target_latency_ms: float = ADMISSION_TARGET_LATENCY_MS
+    backoff_ratio: float = 0.9
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method is None or self.method == method) and self.path == path
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit that adapts to observed latency.
+
+    The limit grows additively (about +1 per limit's worth of fast requests) while
+    requests finish under the target latency and the limit is actually used, and
+    shrinks multiplicatively, at most once per target interval, when they do not.
+    Requests over the limit wait in a bounded FIFO queue for at most `queue_timeout`.
+    """
+
+    def __init__(self, settings: RouteLimit) -> None:
+        self.settings = settings
+        self.limit = float(settings.initial_limit)
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed. Returns False if the request is shed."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.settings.max_queue:
+            self.shed += 1
+            return False
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.settings.queue_timeout)
+        except (TimeoutError, asyncio.CancelledError) as ex:
+            if future.done():
+                # the slot was handed over at the same moment
+                if isinstance(ex, TimeoutError):
+                    self.admitted += 1
+                    return True
+                self._release_slot()
+                raise
+            future.cancel()
+            self._waiters.remove(future)
+            if isinstance(ex, TimeoutError):
+                self.shed += 1
+                return False
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, latency_ms: float) -> None:
+        was_saturated = self.in_flight >= int(self.limit) or bool(self._waiters)
+        s = self.settings
+        if latency_ms > s.target_latency_ms:
+            now = time.monotonic()
+            if now - self._last_decrease >= s.target_latency_ms / 1000:
+                self.limit = max(float(s.min_limit), self.limit * s.backoff_ratio)
+                self._last_decrease = now
+        elif was_saturated:
+            self.limit = min(float(s.max_limit), self.limit + 1 / self.limit)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that bounds concurrency per route and sheds load with fast 503s.
+
+    Routes listed in `routes` get their own limiter, so expensive endpoints can't
+    starve cheap ones; everything else shares the `default` limiter unless its path
+    starts with one of `exempt_prefixes`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: list[RouteLimit],
+        default: RouteLimit | None = None,
+        exempt_prefixes: tuple[str, ...] = ("/healthz", "/readyz", "/metrics"),
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ) -> None:
+        self.app = app
+        self.limiters = [(route, AIMDLimiter(route)) for route in routes]
+        self.default = AIMDLimiter(default) if default is not None else None
+        self.exempt_prefixes = exempt_prefixes
+        self.retry_after = retry_after
+        metrics.register("admission", self.snapshot)
+
+    def limiter_for(self, method: str, path: str) -> AIMDLimiter | None:
+        for route, limiter in self.limiters:
+            if route.matches(method, path):
+                return limiter
+        if path.startswith(self.exempt_prefixes):
+            return None
+        return self.default
+
+    def snapshot(self) -> dict[str, Any]:
+        limiters = [limiter for _, limiter in self.limiters]
+        if self.default is not None:
+            limiters.append(self.default)
+        return {limiter.settings.name: limiter.snapshot() for limiter in limiters}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            await self._reject(send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release((time.perf_counter() - start) * 1000)
+
+    async def _reject(self, send: Send) -> None:
+        body = b'{"detail":"Server is overloaded, retry later"}'
+        start: Message = {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.retry_after).encode()),
+            ],
+        }
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,196 @@
+import time
+import zlib
+from typing import Any
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import COMPRESSION_GZIP_LEVEL, COMPRESSION_MIN_SIZE, COMPRESSION_ZSTD_LEVEL
+from monitoring.metrics import metrics
+
+try:
+    import zstandard  # type: ignore[import-not-found]
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+
+class StreamCompressor:
+    """Incremental compressor: every chunk is flushed so streamed bodies stay streamed."""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int) -> None:
+        if encoding == "zstd":
+            assert zstandard is not None
+            self._obj: Any = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._sync_flush: Any = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits=31 writes the gzip header and trailer
+            self._obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._sync_flush = zlib.Z_SYNC_FLUSH
+
+    def compress(self, chunk: bytes, last: bool) -> bytes:
+        data = self._obj.compress(chunk)
+        if last:
+            return data + self._obj.flush()
+        return data + self._obj.flush(self._sync_flush)
+
+
+def negotiate_encoding(accept_encoding: str, zstd_available: bool = zstandard is not None) -> str | None:
+    """Picks zstd (if installed) or gzip from `Accept-Encoding`, honouring `q=0`."""
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+
+    def allowed(encoding: str) -> bool:
+        return accepted.get(encoding, accepted.get("*", 0.0)) > 0
+
+    if zstd_available and allowed("zstd"):
+        return "zstd"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+class CompressionStats:
+    def __init__(self) -> None:
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def snapshot(self) -> dict[str, Any]:
+        saved = self.bytes_in - self.bytes_out
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            "cpu_ms": round(self.cpu_seconds * 1000, 1),
+            # the cost/benefit figure to watch when tuning levels and the threshold
+            "cpu_us_per_kb_saved": round(self.cpu_seconds * 1e6 / (saved / 1024), 2) if saved > 0 else None,
+        }
+
+
+class CompressionMiddleware:
+    """
+    ASGI response compression with gzip, or zstd when the `zstandard` package is installed.
+
+    Bodies smaller than `minimum_size` are sent as is. Larger and streaming bodies
+    are compressed chunk by chunk and never buffered whole: at most `minimum_size`
+    bytes are held back to decide whether compression is worth it.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        zstd_level: int = COMPRESSION_ZSTD_LEVEL,
+        excluded_content_types: tuple[str, ...] = ("text/event-stream", "image/", "video/", "audio/"),
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self.excluded_content_types = excluded_content_types
+        self.stats = CompressionStats()
+        metrics.register("compression", self.stats.snapshot)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send) -> None:
+        self.middleware = middleware
+        self.stats = middleware.stats
+        self.encoding = encoding
+        self._send = send
+        self.start: Message | None = None
+        self.pending = b""
+        # None while undecided, then True (compress) or False (pass through)
+        self.active: bool | None = None
+        self.compressor: StreamCompressor | None = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                message["status"] < 200
+                or message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or content_type.startswith(self.middleware.excluded_content_types)
+            ):
+                self.active = False
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.active is False:
+            await self._send(message)
+            return
+
+        body: bytes = message.get("body", b"")
+        more_body: bool = message.get("more_body", False)
+
+        if self.active is None:
+            self.pending += body
+            if more_body and len(self.pending) < self.middleware.minimum_size:
+                return
+            if not more_body and len(self.pending) < self.middleware.minimum_size:
+                self.active = False
+                self.stats.skipped += 1
+                await self._send_start(compressed=False)
+                await self._send({"type": "http.response.body", "body": self.pending})
+                return
+            self.active = True
+            self.compressor = StreamCompressor(
+                self.encoding, self.middleware.gzip_level, self.middleware.zstd_level
+            )
+            self.stats.compressed += 1
+            await self._send_start(compressed=True)
+            body, self.pending = self.pending, b""
+
+        await self._send(
+            {"type": "http.response.body", "body": self._compress(body, last=not more_body), "more_body": more_body}
+        )
+
+    def _compress(self, chunk: bytes, last: bool) -> bytes:
+        assert self.compressor is not None
+        start = time.thread_time()
+        data = self.compressor.compress(chunk, last)
+        self.stats.cpu_seconds += time.thread_time() - start
+        self.stats.bytes_in += len(chunk)
+        self.stats.bytes_out += len(data)
+        return data
+
+    async def _send_start(self, compressed: bool) -> None:
+        assert self.start is not None
+        headers = MutableHeaders(raw=list(self.start["headers"]))
+        headers.add_vary_header("Accept-Encoding")
+        if compressed:
+            del headers["content-length"]
+            headers["content-encoding"] = self.encoding
+            # the encoded bytes differ, so a strong validator would be wrong for them
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["etag"] = f"W/{etag}"
+        await self._send({**self.start, "headers": headers.raw})
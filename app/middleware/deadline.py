@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import REQUEST_DEADLINE_MS
+from db.deadline import current_deadline
+from monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RouteDeadline:
+    """Deadline of one route; `path` is matched exactly, `method=None` matches any method."""
+
+    path: str
+    timeout_ms: float
+    method: str | None = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method is None or self.method == method) and self.path == path
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware that stops requests past their deadline or abandoned by the client.
+
+    The request runs in a task of its own. It is cancelled when its deadline (the
+    route's `timeout_ms`, else `default_ms`) passes, and answered with a 504 if no
+    response has started yet. It is also cancelled as soon as the server reports
+    `http.disconnect`. A cancelled query is cancelled on the database too, and its
+    connection goes back to the pool right away. The deadline is published in
+    `db.deadline.current_deadline`, where sessions turn it into a `statement_timeout`.
+
+    The request body is read ahead into memory to notice a disconnect while the
+    app is busy; nginx bounds its size.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        routes: list[RouteDeadline],
+        default_ms: float = REQUEST_DEADLINE_MS,
+    ) -> None:
+        self.app = app
+        self.routes = routes
+        self.default_ms = default_ms
+        self.completed = 0
+        self.timeouts = 0
+        self.disconnects = 0
+        metrics.register("deadlines", self.snapshot)
+
+    def timeout_for(self, method: str, path: str) -> float | None:
+        for route in self.routes:
+            if route.matches(method, path):
+                return route.timeout_ms / 1000
+        return self.default_ms / 1000 if self.default_ms > 0 else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self.timeout_for(scope["method"], scope["path"])
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        disconnected = asyncio.Event()
+        response_started = False
+
+        async def read_ahead() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def app_send(message: Message) -> None:
+            nonlocal response_started
+            response_started = True
+            await send(message)
+
+        async def run_app() -> None:
+            # create_task takes a coroutine, an ASGI app only promises an awaitable
+            await self.app(scope, messages.get, app_send)
+
+        reader = asyncio.create_task(read_ahead())
+        disconnect = asyncio.create_task(disconnected.wait())
+        # the app task copies the context, so it sees the deadline
+        token = current_deadline.set(asyncio.get_running_loop().time() + timeout)
+        try:
+            app_task = asyncio.create_task(run_app())
+        finally:
+            current_deadline.reset(token)
+
+        try:
+            done, _ = await asyncio.wait({app_task, disconnect}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if app_task in done:
+                self.completed += 1
+                app_task.result()
+                return
+            await self._cancel(app_task)
+            if disconnect in done:
+                self.disconnects += 1
+                logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+                return
+            self.timeouts += 1
+            logger.warning(f"{scope['method']} {scope['path']} exceeded its {timeout * 1000:.0f} ms deadline")
+            if not response_started:
+                await self._timeout_response(send)
+        finally:
+            reader.cancel()
+            disconnect.cancel()
+            if not app_task.done():
+                # the server is cancelling this request
+                await self._cancel(app_task)
+
+    async def _cancel(self, task: asyncio.Task[None]) -> None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+        except Exception:
+            logger.exception("Cancelled request failed")
+
+    async def _timeout_response(self, send: Send) -> None:
+        body = b'{"detail":"Request deadline exceeded"}'
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "default_ms": self.default_ms,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "disconnects": self.disconnects,
+        }
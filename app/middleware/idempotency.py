@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import (
+    IDEMPOTENCY_CREDENTIAL_HEADER,
+    IDEMPOTENCY_LOCK_TTL,
+    IDEMPOTENCY_MAX_BODY,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_WAIT_TIMEOUT,
+)
+from monitoring.metrics import metrics
+from services.idempotency import IIdempotencyStore, StoredResponse
+
+logger = logging.getLogger(__name__)
+
+# transient answers are not replayed, a retry should run again
+UNSTORED_STATUSES = frozenset({408, 429})
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware that runs a request sent with an `Idempotency-Key` header at most once.
+
+    On the routes in `routes` (pairs of method and exact path) the first response per
+    key is kept in `store` for `ttl` seconds and replayed to retries with an
+    `Idempotent-Replayed: true` header. A duplicate that arrives while the first
+    request is running waits for it: in this worker on a future, across workers by
+    polling the store, for at most `wait_timeout` before a 409. Keys are scoped to
+    the route and the caller's credential (the `credential_header`), and reusing a
+    key with a different body is a 422. Server errors, 408/429 and bodies over
+    `max_body` are not kept.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        store: IIdempotencyStore,
+        routes: list[tuple[str, str]],
+        ttl: float = IDEMPOTENCY_TTL,
+        lock_ttl: float = IDEMPOTENCY_LOCK_TTL,
+        wait_timeout: float = IDEMPOTENCY_WAIT_TIMEOUT,
+        max_body: int = IDEMPOTENCY_MAX_BODY,
+        poll_interval: float = 0.05,
+        header: str = "idempotency-key",
+        credential_header: str = IDEMPOTENCY_CREDENTIAL_HEADER,
+    ) -> None:
+        self.app = app
+        self.store = store
+        self.routes = frozenset(routes)
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.max_body = max_body
+        self.poll_interval = poll_interval
+        self.header = header
+        self.credential_header = credential_header.lower()
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.conflicts = 0
+        self._in_flight: dict[str, asyncio.Future[None]] = {}
+        metrics.register("idempotency", self.snapshot)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get(self.header)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(idempotency_key) <= 255:
+            await self._error(send, 400, "Idempotency-Key must be 1 to 255 characters")
+            return
+
+        key = self.scoped_key(scope["method"], scope["path"], headers.get(self.credential_header, ""), idempotency_key)
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        waited_since = time.monotonic()
+
+        while True:
+            local = self._in_flight.get(key)
+            if local is not None:
+                # a duplicate in this worker: wait for the first one, then look again
+                self.waited += 1
+                if not await self._wait(local, waited_since):
+                    break
+                continue
+
+            future = self._in_flight[key] = asyncio.get_running_loop().create_future()
+            try:
+                record = await self.store.claim(key, fingerprint, time.time(), self.lock_ttl)
+                if record is None:
+                    await self._execute(key, scope, body, receive, send)
+                    return
+            finally:
+                del self._in_flight[key]
+                future.set_result(None)
+
+            if record.fingerprint != fingerprint:
+                self.conflicts += 1
+                await self._error(send, 422, "Idempotency-Key was already used with a different request")
+                return
+            if record.response is not None:
+                self.replayed += 1
+                await self._replay(send, record.response)
+                return
+            # in progress in another worker
+            self.waited += 1
+            if time.monotonic() - waited_since >= self.wait_timeout:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        self.conflicts += 1
+        await self._error(send, 409, "A request with this Idempotency-Key is still in progress")
+
+    @staticmethod
+    def scoped_key(method: str, path: str, credential: str, idempotency_key: str) -> str:
+        """The store key: the same Idempotency-Key of another route or caller is another request."""
+        return hashlib.sha256("\n".join((method, path, credential, idempotency_key)).encode()).hexdigest()
+
+    async def _wait(self, future: asyncio.Future[None], waited_since: float) -> bool:
+        left = self.wait_timeout - (time.monotonic() - waited_since)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), max(0.0, left))
+        except TimeoutError:
+            return False
+        return True
+
+    async def _read_body(self, receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _execute(self, key: str, scope: Scope, body: bytes, receive: Receive, send: Send) -> None:
+        self.executed += 1
+        start: Message | None = None
+        chunks: list[bytes] = []
+        size = 0
+        body_sent = False
+
+        async def replay_receive() -> Message:
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # the body is consumed, only `http.disconnect` can come now
+            return await receive()
+
+        async def capture_send(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= self.max_body:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await self._release(key)
+            raise
+
+        if start is None or start["status"] >= 500 or start["status"] in UNSTORED_STATUSES or size > self.max_body:
+            await self._release(key)
+            return
+        status = start["status"]
+        headers = [(name, value) for name, value in start["headers"] if name.lower() != b"content-length"]
+        try:
+            await self.store.complete(key, StoredResponse(status, headers, b"".join(chunks)), time.time() + self.ttl)
+        except Exception:
+            logger.exception("Could not store the response of an idempotent request")
+            await self._release(key)
+
+    async def _release(self, key: str) -> None:
+        try:
+            await asyncio.shield(self.store.release(key))
+        except Exception:
+            logger.exception("Could not release an idempotency key")
+
+    async def _replay(self, send: Send, response: StoredResponse) -> None:
+        await self._send(send, response.status, [*response.headers, (b"idempotent-replayed", b"true")], response.body)
+
+    async def _error(self, send: Send, status: int, detail: str) -> None:
+        body = b'{"detail":"' + detail.encode() + b'"}'
+        await self._send(send, status, [(b"content-type", b"application/json")], body)
+
+    async def _send(self, send: Send, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+        headers = [*headers, (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "conflicts": self.conflicts,
+        }
@@ -0,0 +1,54 @@
+import hmac
+import time
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from monitoring.metrics import metrics
+from monitoring.profiler import SamplingProfiler, current_profile
+
+
+class ProfilingMiddleware:
+    """
+    Samples requests with `SamplingProfiler` and keeps the profiles of slow ones.
+
+    With `always=True` every request is profiled; otherwise only the requests with a
+    `header` equal to `secret`. Requests that are not profiled only pay for a header lookup.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        profiler: SamplingProfiler | None = None,
+        always: bool = False,
+        secret: str = "",
+        header: str = "x-profile",
+    ) -> None:
+        self.app = app
+        self.profiler = profiler or SamplingProfiler()
+        self.always = always
+        self.secret = secret.encode()
+        self.header = header
+        metrics.register("profiler", self.profiler.snapshot)
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.always:
+            return True
+        if not self.secret:
+            return False
+        value = Headers(scope=scope).get(self.header)
+        return value is not None and hmac.compare_digest(value.encode(), self.secret)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = self.profiler.start(scope["method"], scope["path"])
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_profile.reset(token)
+            await self.profiler.finish(profile, (time.perf_counter() - start) * 1000)
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import select
+
+from config.config import (
+    HEALTH_PROBE_INTERVAL,
+    HEALTH_PROBE_TIMEOUT,
+    READY_MAX_LOOP_LAG_MS,
+    READY_MAX_POOL_WAITERS,
+)
+from db.db import DatabaseSessionManager, sessionmanager
+from monitoring.loop_monitor import LoopLagMonitor, loop_monitor
+from tasks.warmup import Warmup, warmup
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    ok: bool = False
+    error: str | None = None
+    latency_ms: float | None = None
+    checked_at: float | None = field(default=None, repr=False)
+
+
+class HealthMonitor:
+    """
+    Keeps a cached view of the worker's health for the readiness endpoint.
+
+    A background loop probes the database every `interval` seconds and event-loop
+    lag comes from `LoopLagMonitor`, so `/readyz` only reads memory and never adds
+    load to a database or a loop that is already struggling. With a `warmup`, the
+    worker is not ready before it has finished.
+    """
+
+    def __init__(
+        self,
+        manager: DatabaseSessionManager,
+        interval: float = HEALTH_PROBE_INTERVAL,
+        probe_timeout: float = HEALTH_PROBE_TIMEOUT,
+        max_pool_waiters: int = READY_MAX_POOL_WAITERS,
+        max_loop_lag_ms: float = READY_MAX_LOOP_LAG_MS,
+        lag_monitor: LoopLagMonitor = loop_monitor,
+        warmup: Warmup | None = None,
+    ) -> None:
+        self.manager = manager
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.max_pool_waiters = max_pool_waiters
+        self.max_loop_lag_ms = max_loop_lag_ms
+        self.lag_monitor = lag_monitor
+        self.warmup = warmup
+        self.db = ProbeResult()
+
+    async def _probe_shard(self, shard: int) -> None:
+        async with self.manager.connect(shard) as connection:
+            await connection.execute(select(1))
+
+    async def probe_db(self) -> ProbeResult:
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.probe_timeout):
+                await asyncio.gather(*(self._probe_shard(shard) for shard in range(self.manager.shard_count)))
+            result = ProbeResult(ok=True, latency_ms=(time.perf_counter() - start) * 1000)
+        except Exception as ex:
+            result = ProbeResult(ok=False, error=repr(ex))
+        result.checked_at = time.monotonic()
+        if result.ok != self.db.ok:
+            logger.warning(f"DB probe changed state: ok={result.ok} error={result.error}")
+        self.db = result
+        return result
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        while not stop_event.is_set():
+            await self.probe_db()
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.interval)
+            except TimeoutError:
+                pass
+
+    def is_db_fresh(self) -> bool:
+        if not self.db.ok or self.db.checked_at is None:
+            return False
+        # a probe that stopped reporting is as bad as a failing one
+        return time.monotonic() - self.db.checked_at <= self.interval * 3 + self.probe_timeout
+
+    def readiness(self) -> tuple[bool, dict[str, Any]]:
+        pool_waiters = self.manager.pool_waiters()
+        loop_lag_ms = self.lag_monitor.recent_lag_ms()
+        checks = {
+            "db": self.is_db_fresh(),
+            "pool": pool_waiters <= self.max_pool_waiters,
+            "loop_lag": loop_lag_ms <= self.max_loop_lag_ms,
+        }
+        if self.warmup is not None:
+            checks["warmup"] = self.warmup.finished
+        details = {
+            "checks": checks,
+            "db_error": self.db.error,
+            "db_latency_ms": self.db.latency_ms,
+            "pool_waiters": pool_waiters,
+            "loop_lag_ms": round(loop_lag_ms, 1),
+            "loop_blocks": self.lag_monitor.blocks,
+        }
+        if self.warmup is not None:
+            details["warmup_ms"] = self.warmup.snapshot()["duration_ms"]
+        return all(checks.values()), details
+
+
+health_monitor = HealthMonitor(sessionmanager, warmup=warmup)
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any
+
+from config.config import (
+    LOOP_BLOCK_LOG_PER_MINUTE,
+    LOOP_BLOCK_THRESHOLD_MS,
+    LOOP_LAG_INTERVAL,
+    LOOP_LAG_WINDOW,
+)
+from monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LagHistogram:
+    BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms: float) -> None:
+        for i, bound in enumerate(self.BOUNDS_MS):
+            if value_ms <= bound:
+                break
+        else:
+            i = len(self.BOUNDS_MS)
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def snapshot(self) -> dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.BOUNDS_MS] + ["le_inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop scheduling lag and catches the calls that block the loop.
+
+    A task sleeps `interval` seconds in a loop and records how late it wakes up in a
+    histogram. A watchdog thread watches the task's heartbeat: when the loop has not
+    run it for `block_threshold_ms`, something is holding the loop thread, and the
+    watchdog captures that thread's stack while the blocking call is still on it.
+    Stacks are kept for `/metrics` and logged at most `log_per_minute` times.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_INTERVAL,
+        window: float = LOOP_LAG_WINDOW,
+        block_threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+        log_per_minute: int = LOOP_BLOCK_LOG_PER_MINUTE,
+        keep_stacks: int = 10,
+    ) -> None:
+        self.interval = interval
+        self.window = window
+        self.block_threshold_ms = block_threshold_ms
+        self.log_per_minute = log_per_minute
+        self.histogram = LagHistogram()
+        self.lag_ms = 0.0
+        self.blocks = 0
+        self.recent_blocks: deque[dict[str, Any]] = deque(maxlen=keep_stacks)
+        self._samples: deque[tuple[float, float]] = deque(maxlen=max(1, int(window / interval) + 1))
+        self._heartbeat = time.monotonic()
+        self._captured_beat: float | None = None
+        self._tokens = float(log_per_minute)
+        self._refilled_at = time.monotonic()
+
+    def record(self, lag_ms: float) -> None:
+        self.lag_ms = lag_ms
+        self.histogram.observe(lag_ms)
+        self._samples.append((time.monotonic(), lag_ms))
+
+    def recent_lag_ms(self) -> float:
+        """The worst lag of the last `window` seconds."""
+        since = time.monotonic() - self.window
+        return max((lag for at, lag in self._samples if at >= since), default=0.0)
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = threading.Event()
+        watchdog = threading.Thread(
+            target=self._watch, args=(threading.get_ident(), stopping), name="loop-watchdog", daemon=True
+        )
+        self._heartbeat = time.monotonic()
+        watchdog.start()
+        try:
+            while not stop_event.is_set():
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                self.record(max(0.0, loop.time() - expected) * 1000)
+                self._heartbeat = time.monotonic()
+        finally:
+            stopping.set()
+            await asyncio.to_thread(watchdog.join, 1)
+
+    def _watch(self, thread_id: int, stopping: threading.Event) -> None:
+        check_every = min(self.block_threshold_ms / 2000, 0.05)
+        while not stopping.wait(check_every):
+            beat = self._heartbeat
+            stalled_ms = (time.monotonic() - beat - self.interval) * 1000
+            # one capture per stall: the heartbeat moves on once the loop is free again
+            if stalled_ms < self.block_threshold_ms or beat == self._captured_beat:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            del frame
+            self.capture(stalled_ms, stack)
+
+    def capture(self, stalled_ms: float, stack: list[str]) -> None:
+        self.blocks += 1
+        self.recent_blocks.append({"at": time.time(), "stalled_ms": round(stalled_ms), "stack": stack})
+        if self._take_token():
+            logger.warning(f"Event loop blocked for {stalled_ms:.0f} ms so far, by:\n{''.join(stack)}")
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(float(self.log_per_minute), self._tokens + (now - self._refilled_at) * self.log_per_minute / 60)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "lag_ms": round(self.lag_ms, 1),
+            "recent_max_lag_ms": round(self.recent_lag_ms(), 1),
+            "histogram": self.histogram.snapshot(),
+            "blocks": self.blocks,
+            # the innermost frames are the ones that matter
+            "recent_blocks": [
+                {**block, "stack": block["stack"][-8:]} for block in self.recent_blocks
+            ],
+        }
+
+
+loop_monitor = LoopLagMonitor()
+metrics.register("event_loop", loop_monitor.snapshot)
@@ -0,0 +1,22 @@
+from typing import Any, Callable
+
+MetricsProvider = Callable[[], dict[str, Any]]
+
+
+class MetricsRegistry:
+    """Collects snapshots from the subsystems that expose runtime counters."""
+
+    def __init__(self) -> None:
+        self._providers: dict[str, MetricsProvider] = {}
+
+    def register(self, name: str, provider: MetricsProvider) -> None:
+        self._providers[name] = provider
+
+    def unregister(self, name: str) -> None:
+        self._providers.pop(name, None)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: provider() for name, provider in self._providers.items()}
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from config.config import PROFILING_DIR, PROFILING_INTERVAL_MS, PROFILING_KEEP, PROFILING_THRESHOLD_MS
+
+logger = logging.getLogger(__name__)
+
+# the profile of the request a task works for; tasks spawned by the request inherit it
+current_profile: ContextVar["RequestProfile | None"] = ContextVar("current_profile", default=None)
+
+
+# leaf of the stacks sampled while a request waits for I/O, a lock, a timer...
+AWAITING = "<awaiting>"
+
+
+# compared by identity, so active profiles can be kept in a set
+@dataclass(eq=False)
+class RequestProfile:
+    method: str
+    path: str
+    started_at: float = field(default_factory=time.time)
+    samples: Counter[str] = field(default_factory=Counter)
+    # the task the request started in, to see where it waits while suspended
+    task: asyncio.Task[Any] | None = None
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Stack from the outermost frame to `frame` in the collapsed format: `a;b;c`."""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def collapse_awaits(task: asyncio.Task[Any] | None) -> str:
+    """Chain of coroutines `task` is suspended in, outermost first, ending with `AWAITING`."""
+    names = []
+    awaitable: Any = task.get_coro() if task is not None else None
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(_frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    names.append(AWAITING)
+    return ";".join(names)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of requests running on the event loop.
+
+    While at least one request is profiled, a thread takes a snapshot of the loop
+    thread's stack every `interval_ms` and counts it for the request whose task is
+    running at that moment; every other profiled request gets the chain of awaits it
+    is suspended in, ending with `<awaiting>`, so I/O-bound requests are profiled too.
+    With nothing to profile the thread is not running, so the cost is zero. Profiles
+    of requests slower than `threshold_ms` are written as collapsed stacks
+    (flamegraph.pl, speedscope, inferno), keeping the `keep` newest.
+    """
+
+    def __init__(
+        self,
+        interval_ms: float = PROFILING_INTERVAL_MS,
+        threshold_ms: float = PROFILING_THRESHOLD_MS,
+        directory: str | Path = PROFILING_DIR,
+        keep: int = PROFILING_KEEP,
+    ) -> None:
+        self.interval = interval_ms / 1000
+        self.threshold_ms = threshold_ms
+        self.directory = Path(directory)
+        self.keep = keep
+        self.profiled = 0
+        self.saved = 0
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._active: set[RequestProfile] = set()
+        self._thread: threading.Thread | None = None
+
+    def start(self, method: str, path: str) -> RequestProfile:
+        profile = RequestProfile(method, path, task=asyncio.current_task())
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._active.add(profile)
+            self.profiled += 1
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample_loop,
+                    args=(loop, threading.get_ident()),
+                    name="request-profiler",
+                    daemon=True,
+                )
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+
+    def _sample_loop(self, loop: asyncio.AbstractEventLoop, thread_id: int) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frame = sys._current_frames().get(thread_id)
+            task = asyncio.current_task(loop)
+            running = task.get_context().get(current_profile) if task is not None else None
+            # read while the loop runs on: a coroutine that just resumed may give a
+            # stale chain, which only misplaces that one sample
+            stacks = {
+                profile: collapse_stack(frame) if profile is running else collapse_awaits(profile.task)
+                for profile in active
+                if profile is not running or frame is not None
+            }
+            with self._lock:
+                for profile, stack in stacks.items():
+                    profile.samples[stack] += 1
+                self.samples += len(stacks)
+            del frame
+            time.sleep(self.interval)
+
+    async def finish(self, profile: RequestProfile, duration_ms: float) -> Path | None:
+        """Stops sampling for `profile` and saves it if the request was slow."""
+        self.stop(profile)
+        if duration_ms < self.threshold_ms or not profile.samples:
+            return None
+        with self._lock:
+            samples = dict(profile.samples)
+        path = await asyncio.to_thread(self._write, profile, samples, duration_ms)
+        self.saved += 1
+        logger.warning(f"Slow request {profile.method} {profile.path} took {duration_ms:.0f} ms, profile saved to {path}")
+        return path
+
+    def _write(self, profile: RequestProfile, samples: dict[str, int], duration_ms: float) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", profile.path).strip("_") or "root"
+        # names start with the start time in ns, so they sort oldest first
+        name = f"{int(profile.started_at * 1e9)}-{profile.method}-{slug}-{duration_ms:.0f}ms.collapsed"
+        path = self.directory / name
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.items()))
+
+        profiles = sorted(self.directory.glob("*.collapsed"))
+        for old in profiles[:max(0, len(profiles) - self.keep)]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "active": len(self._active),
+            "profiled": self.profiled,
+            "saved": self.saved,
+            "samples": self.samples,
+            "threshold_ms": self.threshold_ms,
+        }
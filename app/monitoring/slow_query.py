@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import logging
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass
+from types import FrameType
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from config.config import (
+    SLOW_QUERY_EXPLAIN,
+    SLOW_QUERY_EXPLAIN_AFTER,
+    SLOW_QUERY_EXPLAIN_INTERVAL,
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+    SLOW_QUERY_LOG_PER_MINUTE,
+    SLOW_QUERY_MS,
+)
+
+try:
+    from greenlet import getcurrent  # type: ignore[import-untyped]
+except ImportError:  # without greenlet there is no async engine either
+    getcurrent = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|\$\d+|:\w+|%\(\w+\)s)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+
+
+def normalize_sql(statement: str) -> str:
+    """One line with literals replaced by `?` and expanded `IN` lists folded to `(...)`."""
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _PLACEHOLDER_LIST.sub("(...)", sql)
+
+
+def _value_shape(parameters: Any) -> str:
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def parameter_shape(parameters: Any, executemany: bool) -> str:
+    """Types of the bound parameters, never their values."""
+    if executemany and parameters:
+        return f"{len(parameters)} x {_value_shape(parameters[0])}"
+    return _value_shape(parameters)
+
+
+def find_caller(prefixes: tuple[str, ...]) -> str | None:
+    """
+    The innermost app function (module starting with one of `prefixes`) on the stack.
+
+    The async engine runs the DBAPI calls in a greenlet of its own; the awaiting
+    coroutines are on the stack of the suspended parent greenlet, so it is walked too.
+    """
+    frame: FrameType | None = sys._getframe(1)
+    current = getcurrent() if getcurrent is not None else None
+    while True:
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if module.startswith(prefixes):
+                return f"{module}.{frame.f_code.co_qualname}"
+            frame = frame.f_back
+        if current is None or current.parent is None:
+            return None
+        current = current.parent
+        frame = current.gr_frame
+
+
+@dataclass
+class QueryStats:
+    sql: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    caller: str | None = None
+    explained_at: float | None = None
+    plan: str | None = None
+
+
+class SlowQueryLog:
+    """
+    Times every statement through engine events and reports the slow ones.
+
+    A statement slower than `threshold_ms` is logged with its normalized SQL, the
+    shape of its parameters and the repository method that issued it. At most
+    `log_per_minute` lines are written (a token bucket), the rest is only counted,
+    so a struggling database can't flood the logs. Per-statement totals are kept
+    for `/metrics`. On Postgres, a SELECT that was slow `explain_after` times is
+    sampled for an `EXPLAIN (ANALYZE, BUFFERS)` on a separate connection, at most
+    once per `explain_interval` seconds per statement.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_MS,
+        log_per_minute: int = SLOW_QUERY_LOG_PER_MINUTE,
+        explain: bool = SLOW_QUERY_EXPLAIN,
+        explain_after: int = SLOW_QUERY_EXPLAIN_AFTER,
+        explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        explain_interval: float = SLOW_QUERY_EXPLAIN_INTERVAL,
+        caller_prefixes: tuple[str, ...] = ("repositories.", "services.", "tasks.", "api."),
+        max_statements: int = 500,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.log_per_minute = log_per_minute
+        self.explain = explain
+        self.explain_after = explain_after
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self.caller_prefixes = caller_prefixes
+        self.max_statements = max_statements
+        self.slow = 0
+        self.suppressed = 0
+        self.statements: dict[str, QueryStats] = {}
+        self._tokens = float(log_per_minute)
+        self._refilled_at = time.monotonic()
+        self._engines: dict[Engine, AsyncEngine] = {}
+        self._explains: set[asyncio.Task[None]] = set()
+
+    def attach(self, engine: AsyncEngine | Engine) -> None:
+        sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        if isinstance(engine, AsyncEngine):
+            self._engines[sync_engine] = engine
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+        event.listen(sync_engine, "handle_error", self._error)
+
+    def _before(self, conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _error(self, exception_context: Any) -> None:
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+    def _after(self, conn: Connection, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        started = conn.info.get("query_started")
+        if not started:
+            return
+        duration_ms = (time.perf_counter() - started.pop()) * 1000
+        if duration_ms < self.threshold_ms or statement.startswith("EXPLAIN"):
+            return
+        self.record(conn, statement, parameters, executemany, duration_ms)
+
+    def record(self, conn: Connection, statement: str, parameters: Any, executemany: bool, duration_ms: float) -> None:
+        self.slow += 1
+        sql = normalize_sql(statement)
+        fingerprint = hashlib.blake2b(sql.encode(), digest_size=6).hexdigest()
+        caller = find_caller(self.caller_prefixes)
+        stats = self.statements.get(fingerprint)
+        if stats is None and len(self.statements) < self.max_statements:
+            stats = self.statements[fingerprint] = QueryStats(sql)
+        if stats is not None:
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.caller = caller or stats.caller
+
+        if self._take_token():
+            suppressed = f" ({self.suppressed} more suppressed)" if self.suppressed else ""
+            self.suppressed = 0
+            logger.warning(
+                f"Slow query {fingerprint} {duration_ms:.1f} ms from {caller or 'unknown'}: {sql} "
+                f"params {parameter_shape(parameters, executemany)}{suppressed}"
+            )
+        else:
+            self.suppressed += 1
+
+        if stats is not None and self._should_explain(conn, statement, stats):
+            stats.explained_at = time.monotonic()
+            task = asyncio.get_running_loop().create_task(
+                self._explain(self._engines[conn.engine], fingerprint, statement, parameters)
+            )
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(float(self.log_per_minute), self._tokens + (now - self._refilled_at) * self.log_per_minute / 60)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _should_explain(self, conn: Connection, statement: str, stats: QueryStats) -> bool:
+        if not self.explain or conn.dialect.name != "postgresql" or conn.engine not in self._engines:
+            return False
+        # ANALYZE runs the statement again, so writes are never explained
+        if not statement.lstrip()[:6].upper() == "SELECT" or stats.count < self.explain_after:
+            return False
+        if stats.explained_at is not None and time.monotonic() - stats.explained_at < self.explain_interval:
+            return False
+        return random.random() < self.explain_sample_rate
+
+    async def _explain(self, engine: AsyncEngine, fingerprint: str, statement: str, parameters: Any) -> None:
+        try:
+            async with engine.connect() as connection:
+                result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                plan = "\n".join(row[0] for row in result)
+        except Exception as ex:
+            logger.warning(f"Could not EXPLAIN slow query {fingerprint}: {ex!r}")
+            return
+        stats = self.statements.get(fingerprint)
+        if stats is not None:
+            stats.plan = plan
+        logger.warning(f"Plan of slow query {fingerprint}:\n{plan}")
+
+    def snapshot(self) -> dict[str, Any]:
+        top = sorted(self.statements.items(), key=lambda item: item[1].total_ms, reverse=True)[:10]
+        return {
+            "slow": self.slow,
+            "suppressed": self.suppressed,
+            "threshold_ms": self.threshold_ms,
+            "top": [
+                {
+                    "id": fingerprint,
+                    "sql": stats.sql,
+                    "count": stats.count,
+                    "total_ms": round(stats.total_ms, 1),
+                    "max_ms": round(stats.max_ms, 1),
+                    "caller": stats.caller,
+                    "explained": stats.plan is not None,
+                }
+                for fingerprint, stats in top
+            ],
+        }
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,106 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Generic, Type
+
+from sqlalchemy import select
+
+from db.db import DatabaseSessionManager
+from db.models.base_model import TOrm
+from domain.base_domain_model import TDomain
+from domain.exceptions import DoubleFoundError, NotFoundError, RepositoryException
+
+
+class BatchLoader(Generic[TDomain, TOrm]):
+    """
+    DataLoader-style batching of single-key reads across concurrent requests.
+
+    Keys requested within `window` seconds (0 means the current loop iteration) are
+    resolved by one `SELECT ... WHERE key IN (...)` in a session of its own, and each
+    caller gets its own row back with the `ReadMixin.read` contract: `NotFoundError`
+    for a missing key and `DoubleFoundError` for a duplicated one.
+
+    The batch runs outside of the callers' transactions, so it only sees committed
+    rows; it is meant for lookups like authentication, not read-your-writes.
+    """
+
+    def __init__(
+        self,
+        manager: DatabaseSessionManager,
+        domain_model: Type[TDomain],
+        orm_class: Type[TOrm],
+        key: str,
+        window: float = 0.0,
+        max_batch: int = 500,
+    ) -> None:
+        self.manager = manager
+        self.domain_model = domain_model
+        self.orm_class = orm_class
+        self.key = key
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.loaded_keys = 0
+        self._pending: dict[Any, list[asyncio.Future[TDomain]]] = {}
+        self._handle: asyncio.TimerHandle | asyncio.Handle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def load(self, value: Any) -> TDomain:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[TDomain] = loop.create_future()
+        self._pending.setdefault(value, []).append(future)
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._handle is None:
+            if self.window > 0:
+                self._handle = loop.call_later(self.window, self._dispatch)
+            else:
+                self._handle = loop.call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict[Any, list[asyncio.Future[TDomain]]]) -> None:
+        self.batches += 1
+        self.loaded_keys += len(batch)
+        column = getattr(self.orm_class, self.key)
+        try:
+            async with self.manager.session() as session:
+                stmt = select(self.orm_class).where(column.in_(list(batch)))
+                rows = (await session.execute(stmt)).scalars().all()
+                found: dict[Any, list[TDomain]] = defaultdict(list)
+                for row in rows:
+                    found[getattr(row, self.key)].append(self.domain_model.model_validate(row))
+        except Exception as ex:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(RepositoryException(str(ex)))
+            return
+
+        for value, futures in batch.items():
+            matches = found.get(value, [])
+            for future in futures:
+                if future.done():
+                    continue
+                if not matches:
+                    future.set_exception(NotFoundError())
+                elif len(matches) > 1:
+                    future.set_exception(DoubleFoundError())
+                else:
+                    future.set_result(matches[0])
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "keys": self.loaded_keys,
+            "avg_batch": round(self.loaded_keys / self.batches, 2) if self.batches else 0,
+        }
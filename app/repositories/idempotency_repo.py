@@ -0,0 +1,62 @@
+import json
+
+from sqlalchemy import delete, select, update
+
+from db.db import DatabaseSessionManager
+from db.models.idempotency import IdempotencyKeyORM
+from services.idempotency import IdempotencyRecord, StoredResponse
+
+from .sqlalchemy_repo import dialect_insert
+
+
+class SQLIdempotencyStore:
+    """
+    First responses shared by every worker through the `idempotency_keys` table.
+
+    A key is claimed with a single `INSERT ... ON CONFLICT DO UPDATE ... WHERE` that
+    only takes over expired records, committed in its own short session, so two
+    workers can never both run the same request.
+    """
+
+    def __init__(self, manager: DatabaseSessionManager) -> None:
+        self.manager = manager
+        self.table = IdempotencyKeyORM.__table__
+
+    async def claim(self, key: str, fingerprint: str, now: float, lock_ttl: float) -> IdempotencyRecord | None:
+        c = self.table.c
+        async with self.manager.session() as session:
+            insert_stmt = dialect_insert(session.get_bind().dialect.name, self.table).values(
+                key=key, fingerprint=fingerprint, status=None, headers=None, body=None, expires_at=now + lock_ttl
+            )
+            stmt = insert_stmt.on_conflict_do_update(
+                index_elements=[c.key],
+                set_={name: insert_stmt.excluded[name] for name in ("fingerprint", "status", "headers", "body", "expires_at")},
+                where=c.expires_at <= now,
+            ).returning(c.key)
+            if (await session.execute(stmt)).first() is not None:
+                return None
+            row = (await session.execute(select(self.table).where(c.key == key))).one()
+        response = None
+        if row.status is not None:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(row.headers)]
+            response = StoredResponse(row.status, headers, row.body)
+        return IdempotencyRecord(row.fingerprint, response, row.expires_at)
+
+    async def complete(self, key: str, response: StoredResponse, expires_at: float) -> None:
+        headers = json.dumps([(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.headers])
+        async with self.manager.session() as session:
+            await session.execute(
+                update(self.table)
+                .where(self.table.c.key == key)
+                .values(status=response.status, headers=headers, body=response.body, expires_at=expires_at)
+            )
+
+    async def release(self, key: str) -> None:
+        async with self.manager.session() as session:
+            await session.execute(delete(self.table).where(self.table.c.key == key, self.table.c.status.is_(None)))
+
+    async def purge(self, now: float) -> int:
+        """Deletes expired records; they behave exactly like missing ones."""
+        async with self.manager.session() as session:
+            result = await session.execute(delete(self.table).where(self.table.c.expires_at <= now))
+        return result.rowcount
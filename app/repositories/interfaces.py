@@ -1,8 +1,47 @@
-from typing import Generic, Optional, Protocol, Any, Sequence
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Generic, Optional, Protocol, Any, Sequence, Union
 
 from domain.base_domain_model import TDomain
 
 
+class Op(StrEnum):
+    EQ = "eq"
+    NE = "ne"
+    LT = "lt"
+    LE = "le"
+    GT = "gt"
+    GE = "ge"
+    IN = "in"
+    NOT_IN = "not_in"
+    PREFIX = "prefix"
+    IS_NULL = "is_null"
+
+
+@dataclass(frozen=True)
+class Filter:
+    """
+    A typed filter expression on one field, compiled to SQL by the repository.
+
+    `IN`/`NOT_IN` take a collection, `PREFIX` a string, and `IS_NULL` a bool
+    (True for `IS NULL`, False for `IS NOT NULL`).
+    """
+
+    field: str
+    op: Op = Op.EQ
+    value: Any = None
+
+
+@dataclass(frozen=True)
+class OrderBy:
+    field: str
+    descending: bool = False
+
+
+# plain equality as before, or a list of filter expressions combined with AND
+Filters = Union[dict[str, Any], Sequence[Filter]]
+
+
 class ICreateRepository(Protocol, Generic[TDomain]):
     async def create(self, data: dict[str, Any]) -> TDomain:
         """
@@ -15,19 +54,72 @@ class ICreateRepository(Protocol, Generic[TDomain]):
             TDomain: The domain model instance of the created record.
 
         Raises:
-            DoubleFoundError: If a duplicate entry is found in the repository.
+            DoubleFoundError: If a duplicate entry is found in the repository. The insert
+                runs in a savepoint, so the transaction can go on after this error.
+            RepositoryException: If any other repository error occurs, e.g. a NOT NULL
+                or foreign key violation.
+        """
+        ...
+
+    async def create_if_absent(self, data: dict[str, Any], conflict_columns: Sequence[str]) -> Optional[TDomain]:
+        """
+        Creates a new record unless one with the same `conflict_columns` values exists,
+        in a single `INSERT ... ON CONFLICT DO NOTHING RETURNING` statement.
+
+        Args:
+            data (dict): A dictionary containing the data for the new record.
+            conflict_columns (Sequence[str]): Columns of a unique index or constraint identifying the record.
+
+        Returns:
+            Optional[TDomain]: The created record, or None if it already existed.
+
+        Raises:
             RepositoryException: If any other repository error occurs.
         """
         ...
 
+    async def upsert(
+        self,
+        data: dict[str, Any],
+        conflict_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+    ) -> TDomain:
+        """
+        Creates a new record or updates the existing one, in a single
+        `INSERT ... ON CONFLICT DO UPDATE RETURNING` statement.
+
+        Args:
+            data (dict): A dictionary containing the data for the record.
+            conflict_columns (Sequence[str]): Columns of a unique index or constraint identifying the record.
+            update_columns (Optional[Sequence[str]]): Columns of `data` to overwrite on conflict.
+                Defaults to every column of `data` not in `conflict_columns`.
+
+        Returns:
+            TDomain: The domain model instance of the created or updated record.
+
+        Raises:
+            RepositoryException: If any repository error occurs.
+        """
+        ...
+
 
 class IReadRepository(Protocol, Generic[TDomain]):
-    async def read(self, filters: Optional[dict[str, Any]] = None) -> TDomain:
+    async def read(
+        self,
+        filters: Optional[Filters] = None,
+        fields: Optional[Sequence[str]] = None,
+        batch: bool = False,
+    ) -> TDomain:
         """
         Reads data using the specified filters.
 
         Args:
-            filters (Optional[dict]): A dictionary of filters
+            filters (Optional[Filters]): Equality filters as a dict, or a list of `Filter` expressions
+            fields (Optional[Sequence[str]]): Columns to load. When given, only these are selected
+                and a partial, unvalidated domain instance with just these fields is returned.
+            batch (bool): Batch a lookup by the loader's key with the ones of concurrent requests.
+                The loader reads committed rows in a session of its own, so a caller that writes in
+                this transaction, or reads to write, must not batch.
 
         Returns:
             TDomain: The domain model instance corresponding to the query result.
@@ -41,19 +133,34 @@ class IReadRepository(Protocol, Generic[TDomain]):
 
 class IListRepository(Protocol, Generic[TDomain]):
     async def list(
-        self, filters: Optional[dict[str, Any]] = None, order_columns: Optional[list[Any]] = None
+        self,
+        filters: Optional[Filters] = None,
+        order_columns: Optional[list[Any]] = None,
+        fields: Optional[Sequence[str]] = None,
+        order_by: Optional[Sequence[OrderBy]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        compact: bool = False,
     ) -> Sequence[TDomain]:
         """
         Asynchronously retrieves a list of domain objects based on provided filters and order columns.
 
         Args:
-            filters (Optional[dict]): A dictionary of filters to apply to the query.
+            filters (Optional[Filters]): Equality filters as a dict, or a list of `Filter` expressions.
             order_columns (Optional[list]): A list of columns to order the results by.
+            fields (Optional[Sequence[str]]): Columns to load. When given, only these are selected
+                and partial, unvalidated domain instances with just these fields are returned.
+            order_by (Optional[Sequence[OrderBy]]): Fields to order by, applied after `order_columns`.
+            limit (Optional[int]): Maximum number of records to return.
+            offset (Optional[int]): Number of records to skip.
+            compact (bool): Return the model's compact records (slotted named tuples built from
+                the rows without validation) instead of pydantic models, for list-heavy internal paths.
 
         Returns:
             List[TDomain]: A list of domain objects.
 
         Raises:
+            UnindexedQueryError: If no index supports the filters or ordering and the policy rejects it.
             SQLAlchemyError: If there is an error executing the repository query.
             ValidationError: If there is an error validating the domain model.
         """
@@ -61,13 +168,17 @@ class IListRepository(Protocol, Generic[TDomain]):
 
 
 class IUpdateRepository(Protocol, Generic[TDomain]):
-    async def update(self, data: dict[str, Any], filters: Optional[dict[str, Any]] = None) -> Sequence[TDomain]:
+    async def update(
+        self, data: dict[str, Any], filters: Optional[Filters] = None, savepoint: bool = False
+    ) -> Sequence[TDomain]:
         """
         Updates records in the repository based on the provided filters and data.
 
         Args:
-            filters (Optional[dict]): A dictionary of filters to apply to the query.
+            filters (Optional[Filters]): Equality filters as a dict, or a list of `Filter` expressions.
             data (dict): A dictionary of data to update the records with.
+            savepoint (bool): Write the update right away in a savepoint, so that when it fails
+                the caller's transaction is still usable and none of its other changes are lost.
 
         Returns:
             List[TDomain]: A list of updated domain model instances.
@@ -77,14 +188,44 @@ class IUpdateRepository(Protocol, Generic[TDomain]):
         """
         ...
 
+    async def update_if_version(
+        self,
+        id: Any,
+        version: int,
+        data: dict[str, Any],
+        savepoint: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> TDomain:
+        """
+        Updates one record only if it still has the version it was read with, and increments
+        the version, in a single `UPDATE ... WHERE id = ? AND version = ?` without row locks.
+
+        Args:
+            id (Any): The primary key of the record.
+            version (int): The version the record was read with.
+            data (dict): A dictionary of data to update the record with.
+            savepoint (bool): Run the update in a savepoint, so that when it fails the caller's
+                transaction is still usable and none of its other changes are lost.
+            fields (Optional[Sequence[str]]): Columns to return. When given, only these are in
+                `RETURNING` and a partial, unvalidated domain instance is returned.
+
+        Returns:
+            TDomain: The updated domain model instance, with the new version.
+
+        Raises:
+            ConcurrentUpdateError: If the record was changed since it was read, or does not exist.
+            RepositoryException: If the entity has no version column or the update fails.
+        """
+        ...
+
 
 class IDeleteRepository(Protocol, Generic[TDomain]):
-    async def delete(self, filters: dict[str, Any]) -> int:
+    async def delete(self, filters: Filters) -> int:
         """
         Deletes records from the repository based on the provided filters.
 
         Args:
-            filters (Optional[dict]): A dictionary of filters to apply to the query.
+            filters (Optional[Filters]): Equality filters as a dict, or a list of `Filter` expressions.
 
         Returns:
             int: The number of records deleted.
@@ -96,12 +237,12 @@ class IDeleteRepository(Protocol, Generic[TDomain]):
 
 
 class ICountRepository(Protocol, Generic[TDomain]):
-    async def count(self, filters: Optional[dict[str, Any]] = None) -> int:
+    async def count(self, filters: Optional[Filters] = None) -> int:
         """
         Returns records count from the repository based on the provided filters.
 
         Args:
-            filters (Optional[dict]): A dictionary of filters to apply to the query.
+            filters (Optional[Filters]): Equality filters as a dict, or a list of `Filter` expressions.
 
         Returns:
             int: The number of records.
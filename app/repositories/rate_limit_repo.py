@@ -0,0 +1,45 @@
+from sqlalchemy import case, delete, select
+
+from db.db import DatabaseSessionManager
+from db.models.rate_limit import RateLimitBucketORM
+from services.rate_limiter import RateLimitRule
+
+from .sqlalchemy_repo import dialect_insert
+
+
+class SQLRateLimitBackend:
+    """
+    Bucket store shared by every worker through the `rate_limit_buckets` table.
+
+    Taking a token is a single atomic `INSERT ... ON CONFLICT DO UPDATE ... WHERE`,
+    committed in its own short session so it never holds locks for the request.
+    """
+
+    def __init__(self, manager: DatabaseSessionManager) -> None:
+        self.manager = manager
+        self.table = RateLimitBucketORM.__table__
+
+    async def take(self, key: str, rule: RateLimitRule, now: float) -> float:
+        tat = self.table.c.tat
+        new_tat = case((tat > now, tat), else_=now) + rule.emission_interval
+        async with self.manager.session() as session:
+            stmt = (
+                dialect_insert(session.get_bind().dialect.name, self.table)
+                .values(key=key, tat=now + rule.emission_interval)
+                .on_conflict_do_update(
+                    index_elements=[self.table.c.key],
+                    set_={"tat": new_tat},
+                    where=new_tat - now <= rule.burst_tolerance,
+                )
+                .returning(tat)
+            )
+            if (await session.execute(stmt)).first() is not None:
+                return 0.0
+            current = (await session.execute(select(tat).where(self.table.c.key == key))).scalar_one()
+        return max(current, now) + rule.emission_interval - now - rule.burst_tolerance
+
+    async def purge(self, now: float) -> int:
+        """Deletes buckets that are full again; they behave exactly like missing ones."""
+        async with self.manager.session() as session:
+            result = await session.execute(delete(self.table).where(self.table.c.tat <= now))
+        return result.rowcount
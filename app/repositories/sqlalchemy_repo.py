@@ -1,40 +1,426 @@
-from typing import Generic, Optional, Sequence, Type, Any
+import asyncio
+import contextlib
+import logging
+from enum import StrEnum
+from functools import cache
+from typing import TYPE_CHECKING, Awaitable, Callable, Generic, Optional, Sequence, Type, Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import insert, select
+from sqlalchemy import (
+    ColumnElement,
+    Row,
+    Select,
+    Table,
+    UniqueConstraint,
+    false,
+    func,
+    inspect,
+    insert,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.elements import BinaryExpression, CollationClause
+from sqlalchemy.orm import InstrumentedAttribute
 
-from db.models.base_model import TOrm
+from config.config import FILTER_INDEX_POLICY
+from db.models.base_model import TOrm, VersionedMixin
+from db.sharding import ShardedSession, to_global_id, to_local_id
 from domain.base_domain_model import TDomain
-from domain.exceptions import NotFoundError, RepositoryException, DoubleFoundError
+from domain.exceptions import (
+    ConcurrentUpdateError,
+    DoubleFoundError,
+    NotFoundError,
+    RepositoryException,
+    UnindexedQueryError,
+)
+from .interfaces import Filter, Filters, Op, OrderBy
+
+if TYPE_CHECKING:
+    from .batch_loader import BatchLoader
+
+logger = logging.getLogger(__name__)
+
+
+class IndexPolicy(StrEnum):
+    OFF = "off"
+    WARN = "warn"
+    REJECT = "reject"
+
+
+# operators a B-tree index can serve; `!=` and `NOT IN` scan anyway. PREFIX (`LIKE 'x%'`)
+# only can where the index compares bytes, see `prefix_indexed_columns`
+SARGABLE_OPS = frozenset({Op.EQ, Op.IN, Op.LT, Op.LE, Op.GT, Op.GE, Op.IS_NULL})
+
+# collations in which Postgres can turn `LIKE 'x%'` into a B-tree range
+BYTE_ORDER_COLLATIONS = frozenset({"C", "POSIX"})
+
+# SQLSTATE of a duplicate key in a unique index or constraint
+UNIQUE_VIOLATION = "23505"
+SQLITE_UNIQUE_VIOLATIONS = frozenset({"SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY"})
+
+_warned_queries: set[tuple[str, frozenset[str], str | None]] = set()
+
+
+@cache
+def indexed_columns(table: Table) -> frozenset[str]:
+    """Columns that lead an index, the primary key or a unique constraint of `table`."""
+    leading: set[str] = set()
+    for index in table.indexes:
+        # expression indexes have no leading column
+        key = getattr(index.expressions[0], "key", None) if index.expressions else None
+        if key is not None:
+            leading.add(key)
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint) and constraint.columns:
+            leading.add(next(iter(constraint.columns)).key)
+    if table.primary_key.columns:
+        leading.add(next(iter(table.primary_key.columns)).key)
+    return frozenset(leading)
+
+
+@cache
+def prefix_indexed_columns(table: Table) -> frozenset[str]:
+    """
+    Columns that lead an index able to serve a prefix `LIKE` on Postgres: one comparing in
+    the C collation (of the column or the index) or using a `*_pattern_ops` operator class.
+    """
+    leading: set[str] = set()
+    for index in table.indexes:
+        if not index.expressions:
+            continue
+        first = index.expressions[0]
+        if (
+            isinstance(first, BinaryExpression)
+            and isinstance(first.right, CollationClause)
+            and first.right.collation in BYTE_ORDER_COLLATIONS
+        ):
+            key = getattr(first.left, "key", None)
+        else:
+            key = getattr(first, "key", None)
+            ops = index.dialect_options["postgresql"]["ops"] or {}
+            column_collation = getattr(getattr(first, "type", None), "collation", None)
+            if not str(ops.get(key, "")).endswith("_pattern_ops") and column_collation not in BYTE_ORDER_COLLATIONS:
+                key = None
+        if key is not None:
+            leading.add(key)
+    for column in table.columns:
+        # the primary key and unique constraints compare in the column's collation
+        if getattr(column.type, "collation", None) in BYTE_ORDER_COLLATIONS and column.key in indexed_columns(table):
+            leading.add(column.key)
+    return frozenset(leading)
+
+
+def to_filter_list(filters: Optional[Filters]) -> list[Filter]:
+    if not filters:
+        return []
+    if isinstance(filters, dict):
+        return [Filter(name, Op.EQ, value) for name, value in filters.items()]
+    return list(filters)
+
+
+def dialect_insert(dialect_name: str, table: Table | Any) -> postgresql.Insert | sqlite.Insert:
+    """INSERT construct of the dialect, so `on_conflict_*` is available on Postgres and SQLite."""
+    if dialect_name == "postgresql":
+        return postgresql.insert(table)
+    if dialect_name == "sqlite":
+        return sqlite.insert(table)
+    raise RepositoryException(f"INSERT ... ON CONFLICT is not supported for {dialect_name}")
+
+
+def is_unique_violation(ex: IntegrityError) -> bool:
+    """Whether `ex` is a duplicate key, as opposed to a NOT NULL, foreign key or check violation."""
+    # asyncpg and psycopg report the SQLSTATE, sqlite3 an extended error name
+    sqlstate = getattr(ex.orig, "sqlstate", None) or getattr(ex.orig, "pgcode", None)
+    if sqlstate is not None:
+        return sqlstate == UNIQUE_VIOLATION
+    return getattr(ex.orig, "sqlite_errorname", None) in SQLITE_UNIQUE_VIOLATIONS
 
 
 class BaseSQLAlchemyRepo(Generic[TDomain, TOrm]):
+    # column whose value picks the shard of a row; entities without one live on shard 0
+    shard_key: Optional[str] = None
+
     def __init__(
         self,
-        db: AsyncSession,
+        db: AsyncSession | ShardedSession,
         domain_model: Type[TDomain],
         orm_class: Type[TOrm],
+        loader: Optional["BatchLoader[TDomain, TOrm]"] = None,
+        index_policy: IndexPolicy | str = FILTER_INDEX_POLICY,
     ) -> None:
-        self.db: AsyncSession = db
+        self.shards = db if isinstance(db, ShardedSession) else ShardedSession.single(db)
         self.domain_model = domain_model
         self.orm_class = orm_class
+        self.loader = loader
+        self.index_policy = IndexPolicy(index_policy)
+        self.pk_name: str = inspect(orm_class).primary_key[0].key
+        self.sharded = self.shard_key is not None and self.shards.count > 1
+        self.version_name: Optional[str] = "version" if issubclass(orm_class, VersionedMixin) else None
+
+    @property
+    def db(self) -> AsyncSession:
+        """Session of shard 0, the only one unless the repository is sharded."""
+        return self.shards.get(0)
+
+    def _column(self, name: str) -> InstrumentedAttribute[Any]:
+        if name not in inspect(self.orm_class).column_attrs:
+            raise RepositoryException(f"Unknown field {name!r} for {self.orm_class.__name__}")
+        return getattr(self.orm_class, name)
+
+    def _compile(self, item: Filter, shard: int = 0) -> ColumnElement[bool]:
+        if self.sharded and item.field == self.pk_name and item.op not in (Op.PREFIX, Op.IS_NULL):
+            return self._compile_local_pk(item, shard)
+        column = self._column(item.field)
+        match item.op:
+            case Op.EQ:
+                return column == item.value
+            case Op.NE:
+                return column != item.value
+            case Op.LT:
+                return column < item.value
+            case Op.LE:
+                return column <= item.value
+            case Op.GT:
+                return column > item.value
+            case Op.GE:
+                return column >= item.value
+            case Op.IN:
+                return column.in_(item.value)
+            case Op.NOT_IN:
+                return column.not_in(item.value)
+            case Op.PREFIX:
+                # `%` and `_` in the value are matched literally
+                return column.startswith(item.value, autoescape=True)
+            case Op.IS_NULL:
+                return column.is_(None) if item.value else column.is_not(None)
+        raise RepositoryException(f"Unsupported filter operator {item.op!r}")
+
+    def _compile_local_pk(self, item: Filter, shard: int) -> ColumnElement[bool]:
+        # a predicate on global ids, rewritten for the local ids of `shard`:
+        # global = local * n + shard
+        n = self.shards.count
+        column = self._column(item.field)
+        match item.op:
+            case Op.EQ:
+                return column == item.value // n if item.value % n == shard else false()
+            case Op.NE:
+                return column != item.value // n if item.value % n == shard else true()
+            case Op.IN:
+                return column.in_([value // n for value in item.value if value % n == shard])
+            case Op.NOT_IN:
+                return column.not_in([value // n for value in item.value if value % n == shard])
+            case Op.LT:
+                return column < -((shard - item.value) // n)
+            case Op.LE:
+                return column <= (item.value - shard) // n
+            case Op.GT:
+                return column > (item.value - shard) // n
+            case Op.GE:
+                return column >= -((shard - item.value) // n)
+        raise RepositoryException(f"Unsupported filter operator {item.op!r}")
+
+    def _check_index(self, filters: list[Filter], order_by: Sequence[OrderBy] = ()) -> None:
+        """
+        Applies the index policy: a filtered or sorted query needs a sargable predicate
+        on an indexed column, or (without one) an index on its leading sort column.
+        """
+        if self.index_policy is IndexPolicy.OFF or not (filters or order_by):
+            return
+        indexed = indexed_columns(self.orm_class.__table__)
+        if any(item.op in SARGABLE_OPS and item.field in indexed for item in filters):
+            return
+        prefixes = [item.field for item in filters if item.op is Op.PREFIX]
+        if prefixes:
+            # SQLite's LIKE optimization works on its ordinary indexes
+            dialect = self.shards.get(0).get_bind().dialect.name
+            prefix_indexed = prefix_indexed_columns(self.orm_class.__table__) if dialect == "postgresql" else indexed
+            if any(field in prefix_indexed for field in prefixes):
+                return
+        sort_field = order_by[0].field if order_by else None
+        if not filters and sort_field in indexed:
+            return
+
+        fields = frozenset(item.field for item in filters)
+        message = (
+            f"Query on {self.orm_class.__tablename__} filtering by {sorted(fields)}"
+            f"{f' and sorting by {sort_field!r}' if sort_field else ''} has no supporting index"
+        )
+        if self.index_policy is IndexPolicy.REJECT:
+            raise UnindexedQueryError(message)
+        key = (self.orm_class.__tablename__, fields, sort_field)
+        if key not in _warned_queries:
+            _warned_queries.add(key)
+            logger.warning(message)
+
+    def _filters(self, filters: Optional[Filters], order_by: Sequence[OrderBy] = ()) -> list[Filter]:
+        """Normalizes `filters` and checks them against the index policy."""
+        items = to_filter_list(filters)
+        self._check_index(items, order_by)
+        return items
+
+    def _where(self, stmt: Any, items: list[Filter], shard: int = 0) -> Any:
+        if items:
+            stmt = stmt.where(*(self._compile(item, shard) for item in items))
+        return stmt
+
+    def _targets(self, items: list[Filter]) -> list[int]:
+        """Shards a query can match: the ones of its shard key or id values, otherwise all."""
+        if not self.sharded:
+            return [0]
+        n = self.shards.count
+        candidates: set[int] | None = None
+        for item in items:
+            if item.op not in (Op.EQ, Op.IN) or item.field not in (self.shard_key, self.pk_name):
+                continue
+            values = [item.value] if item.op is Op.EQ else list(item.value)
+            if item.field == self.shard_key:
+                shards = {self.shards.shard_for(value) for value in values}
+            else:
+                shards = {value % n for value in values}
+            candidates = shards if candidates is None else candidates & shards
+        return sorted(candidates) if candidates is not None else list(range(n))
+
+    def _data_shard(self, data: dict[str, Any]) -> tuple[int, dict[str, Any]]:
+        """Shard a new row belongs to, and its data with the id made local to it."""
+        if not self.sharded:
+            return 0, data
+        if self.shard_key not in data:
+            raise RepositoryException(f"{self.shard_key!r} is required to pick the shard of a new row")
+        shard = self.shards.shard_for(data[self.shard_key])
+        if data.get(self.pk_name) is not None:
+            pk_shard, local_id = to_local_id(data[self.pk_name], self.shards.count)
+            if pk_shard != shard:
+                raise RepositoryException(f"{self.pk_name}={data[self.pk_name]} does not belong to shard {shard}")
+            data = {**data, self.pk_name: local_id}
+        return shard, data
+
+    async def _fan_out(self, run: Callable[[int], Awaitable[list[Any]]], shards: list[int]) -> list[Any]:
+        """Runs `run(shard)` on every shard concurrently, each in its own session, and concatenates the results."""
+        if len(shards) == 1:
+            return await run(shards[0])
+        results = await asyncio.gather(*(run(shard) for shard in shards))
+        return [row for rows in results for row in rows]
+
+    def _to_domain(self, row: Any, shard: int = 0) -> TDomain:
+        obj = self.domain_model.model_validate(row)
+        if self.sharded:
+            setattr(obj, self.pk_name, to_global_id(getattr(row, self.pk_name), shard, self.shards.count))
+        return obj
+
+    def _select(self, fields: Optional[Sequence[str]] = None) -> Select:
+        """SELECT of the whole entity, or only of the `fields` columns when given."""
+        if not fields:
+            return select(self.orm_class)
+        columns = inspect(self.orm_class).column_attrs
+        unknown = [name for name in fields if name not in columns]
+        if unknown:
+            raise RepositoryException(f"Unknown fields {unknown} for {self.orm_class.__name__}")
+        return select(*(getattr(self.orm_class, name) for name in fields))
+
+    def _to_compact(self, row: Row[Any], shard: int = 0) -> Any:
+        record = self.domain_model.compact_type()._make(row)
+        if self.sharded:
+            pk = getattr(record, self.pk_name)
+            record = record._replace(**{self.pk_name: to_global_id(pk, shard, self.shards.count)})
+        return record
+
+    def _to_partial(self, row: Row[Any], shard: int = 0) -> TDomain:
+        # trusted DB values, only the projected fields are set
+        values = dict(row._mapping)
+        if self.sharded and values.get(self.pk_name) is not None:
+            values[self.pk_name] = to_global_id(values[self.pk_name], shard, self.shards.count)
+        return self.domain_model.model_construct(**values)
 
 
 class CreateMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
     async def create(self, data: dict[str, Any]) -> TDomain:
+        shard, data = self._data_shard(data)
         stmt = insert(self.orm_class).values(**data).returning(self.orm_class)
-        result = await self.db.execute(stmt)
+        session = self.shards.get(shard)
+        try:
+            # a failed insert rolls back only its savepoint, so the caller's transaction goes on
+            async with session.begin_nested():
+                result = await session.execute(stmt)
+        except IntegrityError as ex:
+            if is_unique_violation(ex):
+                raise DoubleFoundError(str(ex.orig))
+            raise RepositoryException(str(ex.orig))
         row = result.scalar_one()
-        return self.domain_model.model_validate(row)
+        return self._to_domain(row, shard)
+
+    def _insert(self, shard: int, data: dict[str, Any]) -> postgresql.Insert | sqlite.Insert:
+        dialect_name = self.shards.get(shard).get_bind().dialect.name
+        return dialect_insert(dialect_name, self.orm_class).values(**data)
+
+    async def create_if_absent(self, data: dict[str, Any], conflict_columns: Sequence[str]) -> Optional[TDomain]:
+        shard, data = self._data_shard(data)
+        stmt = (
+            self._insert(shard, data)
+            .on_conflict_do_nothing(index_elements=[self._column(name) for name in conflict_columns])
+            .returning(self.orm_class)
+        )
+        try:
+            row = (await self.shards.get(shard).execute(stmt)).scalar_one_or_none()
+        except Exception as ex:
+            raise RepositoryException(str(ex))
+        if row is None:
+            return None
+        return self._to_domain(row, shard)
+
+    async def upsert(
+        self,
+        data: dict[str, Any],
+        conflict_columns: Sequence[str],
+        update_columns: Optional[Sequence[str]] = None,
+    ) -> TDomain:
+        shard, data = self._data_shard(data)
+        if update_columns is None:
+            update_columns = [name for name in data if name not in conflict_columns]
+        insert_stmt = self._insert(shard, data)
+        # `excluded` holds the values of the row that failed to insert
+        stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[self._column(name) for name in conflict_columns],
+            set_={name: insert_stmt.excluded[name] for name in update_columns},
+        ).returning(self.orm_class)
+        try:
+            result = await self.shards.get(shard).execute(stmt, execution_options={"populate_existing": True})
+            row = result.scalar_one()
+        except Exception as ex:
+            raise RepositoryException(str(ex))
+        return self._to_domain(row, shard)
 
 
 class ReadMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
-    async def read(self, filters: Optional[dict[str, Any]] = None) -> TDomain:
-        stmt = select(self.orm_class)
-        if filters:
-            stmt = stmt.filter_by(**filters)
+    async def read(
+        self,
+        filters: Optional[Filters] = None,
+        fields: Optional[Sequence[str]] = None,
+        batch: bool = False,
+    ) -> TDomain:
+        if (
+            batch
+            and self.loader is not None
+            and not self.sharded
+            and not fields
+            and isinstance(filters, dict)
+            and filters.keys() == {self.loader.key}
+        ):
+            # single-key lookups are batched with the ones of concurrent requests
+            return await self.loader.load(filters[self.loader.key])
+
+        items = self._filters(filters)
+        stmt = self._select(fields)
+
+        async def run(shard: int) -> list[tuple[int, Any]]:
+            result = await self.shards.get(shard).execute(self._where(stmt, items, shard))
+            rows = result.all() if fields else result.scalars().all()
+            return [(shard, row) for row in rows]
+
         try:
-            res = (await self.db.execute(stmt)).scalars().all()
+            res = await self._fan_out(run, self._targets(items))
         except Exception as ex:
             raise RepositoryException(str(ex))
 
@@ -43,73 +429,165 @@ class ReadMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
         elif len(res) > 1:
             raise DoubleFoundError
 
-        return self.domain_model.model_validate(res[0])
+        shard, row = res[0]
+        if fields:
+            return self._to_partial(row, shard)
+        return self._to_domain(row, shard)
 
 
 class ListMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
     async def list(
         self,
-        filters: Optional[dict[str, Any]] = None,
+        filters: Optional[Filters] = None,
         order_columns: Optional[list[Any]] = None,
+        fields: Optional[Sequence[str]] = None,
+        order_by: Optional[Sequence[OrderBy]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        compact: bool = False,
     ) -> Sequence[TDomain]:
-        stmt = select(self.orm_class)
-        if filters:
-            stmt = stmt.filter_by(**filters)
+        if compact and fields:
+            raise RepositoryException("compact records always hold every field, drop `fields`")
+        order_by = order_by or ()
+        items = self._filters(filters, order_by)
+        targets = self._targets(items)
+        merged = len(targets) > 1
+        if merged and order_columns:
+            raise RepositoryException("order_columns can't be merged across shards, use order_by")
+        if merged and fields and any(item.field not in fields for item in order_by):
+            raise RepositoryException("order_by fields must be selected to merge results across shards")
+
+        stmt = self._select(list(self.domain_model.model_fields) if compact else fields)
         if order_columns:
             stmt = stmt.order_by(*order_columns)
-        result = await self.db.execute(stmt)
-        rows = result.scalars().all()
-        return [self.domain_model.model_validate(row) for row in rows]
+        for item in order_by:
+            column = self._column(item.field)
+            stmt = stmt.order_by(column.desc() if item.descending else column.asc())
+        if merged:
+            # every shard returns its first `offset + limit` rows, the page is cut after merging
+            if limit is not None:
+                stmt = stmt.limit((offset or 0) + limit)
+        else:
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            if offset:
+                stmt = stmt.offset(offset)
+
+        async def run(shard: int) -> list[TDomain]:
+            result = await self.shards.get(shard).execute(self._where(stmt, items, shard))
+            if compact:
+                return [self._to_compact(row, shard) for row in result.all()]
+            if fields:
+                return [self._to_partial(row, shard) for row in result.all()]
+            return [self._to_domain(row, shard) for row in result.scalars().all()]
+
+        records = await self._fan_out(run, targets)
+        if not merged:
+            return records
+
+        # stable sorts from the last key to the first give the multi-key order
+        for item in reversed(order_by):
+            records.sort(
+                key=lambda record: (getattr(record, item.field) is None, getattr(record, item.field)),
+                reverse=item.descending,
+            )
+        start = offset or 0
+        return records[start:start + limit] if limit is not None else records[start:]
 
 
 class UpdateMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
-    async def update(self, data: dict[str, Any], filters: Optional[dict[str, Any]] = None) -> Sequence[TDomain]:
-        stmt = select(self.orm_class)
-        if filters:
-            stmt = stmt.filter_by(**filters)
+    async def update(
+        self, data: dict[str, Any], filters: Optional[Filters] = None, savepoint: bool = False
+    ) -> Sequence[TDomain]:
+        if self.sharded and (self.shard_key in data or self.pk_name in data):
+            raise RepositoryException(f"Updating {self.shard_key!r} or {self.pk_name!r} would move rows between shards")
+        items = self._filters(filters)
+
+        async def run(shard: int) -> list[TDomain]:
+            session = self.shards.get(shard)
+            stmt = self._where(select(self.orm_class), items, shard)
+            updated_records = []
+            # leaving the savepoint flushes the changes, so a failed write is raised here
+            async with session.begin_nested() if savepoint else contextlib.nullcontext():
+                records = (await session.execute(stmt)).scalars().all()
+                for record in records:
+                    for key, value in data.items():
+                        setattr(record, key, value)
+                    # versioned writers that read the row before this change must see a conflict
+                    if self.version_name is not None and self.version_name not in data:
+                        setattr(record, self.version_name, getattr(record, self.version_name) + 1)
+                    updated_records.append(self._to_domain(record, shard))
+            return updated_records
+
         try:
-            records = (await self.db.execute(stmt)).scalars().all()
+            return await self._fan_out(run, self._targets(items))
         except Exception as ex:
             raise RepositoryException(str(ex))
-        if not records:
-            return []
-
-        updated_records = []
-        for record in records:
-            for key, value in data.items():
-                setattr(record, key, value)
-            updated_records.append(self.domain_model.model_validate(record))
 
-        return updated_records
+    async def update_if_version(
+        self,
+        id: Any,
+        version: int,
+        data: dict[str, Any],
+        savepoint: bool = False,
+        fields: Optional[Sequence[str]] = None,
+    ) -> TDomain:
+        if self.version_name is None:
+            raise RepositoryException(f"{self.orm_class.__name__} has no version column")
+        if self.sharded and (self.shard_key in data or self.pk_name in data):
+            raise RepositoryException(f"Updating {self.shard_key!r} or {self.pk_name!r} would move rows between shards")
+        item = Filter(self.pk_name, Op.EQ, id)
+        shard = self._targets([item])[0]
+        session = self.shards.get(shard)
+        version_column = self._column(self.version_name)
+        stmt = (
+            update(self.orm_class)
+            .where(self._compile(item, shard), version_column == version)
+            .values(**data, **{self.version_name: version_column + 1})
+        )
+        stmt = stmt.returning(*(self._column(name) for name in fields)) if fields else stmt.returning(self.orm_class)
+        try:
+            async with session.begin_nested() if savepoint else contextlib.nullcontext():
+                result = await session.execute(stmt, execution_options={"populate_existing": True})
+                row = result.first() if fields else result.scalar_one_or_none()
+        except Exception as ex:
+            raise RepositoryException(str(ex))
+        if row is None:
+            # objects this session loaded before are stale, the next read must fetch them again
+            session.expire_all()
+            raise ConcurrentUpdateError(f"{self.orm_class.__name__} {id} was changed concurrently or does not exist")
+        if fields:
+            return self._to_partial(row, shard)
+        return self._to_domain(row, shard)
 
 
 class DeleteMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
-    async def delete(self, filters: dict[str, Any]) -> int:
-        stmt = select(self.orm_class)
-        if filters:
-            stmt = stmt.filter_by(**filters)
+    async def delete(self, filters: Filters) -> int:
+        items = self._filters(filters)
+
+        async def run(shard: int) -> list[int]:
+            session = self.shards.get(shard)
+            stmt = self._where(select(self.orm_class), items, shard)
+            records = (await session.execute(stmt)).scalars().all()
+            for record in records:
+                await session.delete(record)
+            return [len(records)]
+
         try:
-            records = (await self.db.execute(stmt)).scalars().all()
+            return sum(await self._fan_out(run, self._targets(items)))
         except Exception as ex:
             raise RepositoryException(str(ex))
 
-        if not records:
-            return 0
 
-        for record in records:
-            await self.db.delete(record)
-
-        return len(records)
+class CountMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
+    async def count(self, filters: Optional[Filters] = None) -> int:
+        items = self._filters(filters)
 
+        async def run(shard: int) -> list[int]:
+            stmt = self._where(select(func.count()).select_from(self.orm_class), items, shard)
+            return [(await self.shards.get(shard).execute(stmt)).scalar_one()]
 
-class CountMixin(BaseSQLAlchemyRepo[TDomain, TOrm], Generic[TDomain, TOrm]):
-    async def count(self, filters: Optional[dict[str, Any]] = None) -> int:
-        stmt = select(self.orm_class)
-        if filters:
-            stmt = stmt.filter_by(**filters)
         try:
-            res = (await self.db.execute(stmt)).scalars().all()
+            return sum(await self._fan_out(run, self._targets(items)))
         except Exception as ex:
             raise RepositoryException(str(ex))
-
-        return len(res)
@@ -1,5 +1,7 @@
-from typing import Protocol, Generic
-from sqlalchemy import select
+import sys
+from enum import StrEnum
+from typing import Protocol, Generic, Sequence
+from sqlalchemy import ColumnElement, and_, func, select, true
 
 from db.models.base_model import TOrm
 
@@ -9,6 +11,24 @@ from domain.exceptions import RepositoryException
 from .sqlalchemy_repo import CreateMixin, ReadMixin, UpdateMixin
 from .interfaces import ICreateRepository, IReadRepository, IUpdateRepository
 
+class SearchMode(StrEnum):
+    PREFIX = "prefix"
+    CONTAINS = "contains"
+
+
+def prefix_range(column: ColumnElement[str], prefix: str) -> ColumnElement[bool]:
+    """
+    `column LIKE 'prefix%'` as a range, which a B-tree index serves even when the
+    prefix is a bound parameter of a cached generic plan.
+    """
+    if not prefix:
+        return true()
+    last = ord(prefix[-1])
+    if last == sys.maxunicode:
+        return column.startswith(prefix, autoescape=True)
+    return and_(column >= prefix, column < prefix[:-1] + chr(last + 1))
+
+
 class IUserRepoProtocol(
     ICreateRepository[TDomain],
     IReadRepository[TDomain],
@@ -18,6 +38,27 @@ class IUserRepoProtocol(
     async def exists(self, username: str) -> bool:
         ...
 
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.PREFIX,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Sequence[TDomain]:
+        """
+        Searches users by a part of the username, case-insensitively.
+
+        Args:
+            query: The start of the username (`PREFIX`) or any part of it (`CONTAINS`).
+            mode: How `query` is matched.
+            limit: The maximum number of users to return.
+            offset: The number of matching users to skip.
+
+        Returns:
+            Sequence[TDomain]: Users ordered by lowercased username, with only `id` and `username` loaded.
+        """
+        ...
+
 
 class UserSQLAlchemyRepo(
     CreateMixin[TDomain, TOrm],
@@ -25,10 +66,52 @@ class UserSQLAlchemyRepo(
     UpdateMixin[TDomain, TOrm],
     Generic[TDomain, TOrm],
 ):
+    shard_key = "username"
+
     async def exists(self, username: str) -> bool:
-        stmt = select(self.orm_class).filter_by(username=username)
+        stmt = select(self.orm_class.id).filter_by(username=username).limit(1)
+        shard = self.shards.shard_for(username) if self.sharded else 0
+        try:
+            return (await self.shards.get(shard).execute(stmt)).first() is not None
+        except Exception as ex:
+            raise RepositoryException(str(ex))
+
+    async def search(
+        self,
+        query: str,
+        mode: SearchMode = SearchMode.PREFIX,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Sequence[TDomain]:
+        needle = query.lower()
+        lowered = func.lower(self.orm_class.username)
+        targets = list(range(self.shards.count)) if self.sharded else [0]
+        merged = len(targets) > 1
+
+        async def run(shard: int) -> list[TDomain]:
+            session = self.shards.get(shard)
+            # matches the `lower(username) COLLATE "C"` index: byte order, like SQLite and Python
+            ordered = lowered.collate("C") if session.get_bind().dialect.name == "postgresql" else lowered
+            if mode is SearchMode.PREFIX:
+                condition = prefix_range(ordered, needle)
+            else:
+                # the pg_trgm index on Postgres, a scan on SQLite
+                condition = lowered.contains(needle, autoescape=True)
+            stmt = (
+                select(self.orm_class.id, self.orm_class.username)
+                .where(condition)
+                .order_by(ordered, self.orm_class.username)
+            )
+            # every shard returns its first `offset + limit` rows, the page is cut after merging
+            stmt = stmt.limit(offset + limit) if merged else stmt.limit(limit).offset(offset)
+            result = await session.execute(stmt)
+            return [self._to_partial(row, shard) for row in result.all()]
+
         try:
-            res = (await self.db.execute(stmt)).scalars().all()
-            return len(res) > 0
+            users = await self._fan_out(run, targets)
         except Exception as ex:
             raise RepositoryException(str(ex))
+        if not merged:
+            return users
+        users.sort(key=lambda user: (user.username.lower(), user.username))
+        return users[offset:offset + limit]
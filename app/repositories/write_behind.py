@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import Any, Generic, Type
+
+from sqlalchemy import Update, cast, column, inspect, update, values
+
+from db.db import DatabaseSessionManager
+from db.models.base_model import TOrm
+from db.sharding import to_local_id
+
+logger = logging.getLogger(__name__)
+
+# bind parameters a Postgres statement can carry
+MAX_PARAMS = 32767
+
+
+class WriteBehindBuffer(Generic[TOrm]):
+    """
+    Buffers high-frequency column updates and writes them in batches.
+
+    `record()` only touches memory: values are merged per primary key, so a key
+    updated many times between flushes costs a single row write. `flush()` writes
+    everything in a session of its own, with one set-based statement per column set
+    on Postgres: `UPDATE ... FROM (VALUES ...) WHERE pk = v.pk`, split only when the
+    rows exceed the bind parameter limit. Other dialects (SQLite has no column
+    aliases on VALUES) get a bulk `UPDATE ... WHERE pk = ?` executemany instead.
+    It runs on a timer, when `flush_size` keys are pending, and on shutdown. At most
+    `max_keys` keys are held; updates for new keys beyond that are dropped and
+    counted, since these writes are best-effort by design.
+    With `sharded=True` the keys are global ids of a sharded entity and every row is
+    written to the shard its id points to.
+    """
+
+    def __init__(
+        self,
+        manager: DatabaseSessionManager,
+        orm_class: Type[TOrm],
+        flush_size: int = 1000,
+        max_keys: int = 50000,
+        sharded: bool = False,
+    ) -> None:
+        self.manager = manager
+        self.orm_class = orm_class
+        self.flush_size = flush_size
+        self.max_keys = max_keys
+        self.sharded = sharded
+        self.mapper = inspect(orm_class)
+        self.pk_name = self.mapper.primary_key[0].key
+        self.flushes = 0
+        self.written = 0
+        self.dropped = 0
+        self.failures = 0
+        self._pending: dict[Any, dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._flush_task: asyncio.Task[int] | None = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, key: Any, **values: Any) -> None:
+        current = self._pending.get(key)
+        if current is not None:
+            current.update(values)
+            return
+        if len(self._pending) >= self.max_keys:
+            self.dropped += 1
+            return
+        self._pending[key] = dict(values)
+        if len(self._pending) >= self.flush_size and self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_in_background())
+
+    async def _flush_in_background(self) -> int:
+        try:
+            return await self.flush()
+        except Exception:
+            logger.exception(f"Write-behind flush of {self.orm_class.__name__} failed")
+            return 0
+        finally:
+            self._flush_task = None
+
+    async def flush(self) -> int:
+        """Writes all pending updates. Returns the number of keys written."""
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            shard_count = self.manager.shard_count if self.sharded else 1
+            groups: dict[tuple[int, frozenset[str]], list[dict[str, Any]]] = {}
+            for key, values in batch.items():
+                shard, local_key = to_local_id(key, shard_count)
+                groups.setdefault((shard, frozenset(values)), []).append({self.pk_name: local_key, **values})
+            try:
+                for shard in sorted({shard for shard, _ in groups}):
+                    async with self.manager.session(shard) as session:
+                        set_based = session.get_bind().dialect.name == "postgresql"
+                        for (row_shard, columns), rows in groups.items():
+                            if row_shard != shard:
+                                continue
+                            if not set_based:
+                                await session.execute(update(self.orm_class), rows)
+                                continue
+                            names = [self.pk_name, *sorted(columns)]
+                            chunk = max(1, MAX_PARAMS // len(names))
+                            for start in range(0, len(rows), chunk):
+                                await session.execute(self.set_based_update(names, rows[start:start + chunk]))
+            except Exception:
+                self.failures += 1
+                self._restore(batch)
+                raise
+
+            self.flushes += 1
+            self.written += len(batch)
+            return len(batch)
+
+    def set_based_update(self, names: list[str], rows: list[dict[str, Any]]) -> Update:
+        """`UPDATE ... FROM (VALUES ...)` writing `names[1:]` of all `rows`, matched on the primary key (`names[0]`)."""
+        types = {name: self.mapper.columns[name].type for name in names}
+        source = values(*(column(name, types[name]) for name in names), name="pending").data(
+            [tuple(row[name] for name in names) for row in rows]
+        )
+        pk_name, *value_names = names
+        # the cast types a VALUES column that holds only NULLs
+        return (
+            update(self.orm_class)
+            .where(self.mapper.columns[pk_name] == source.c[pk_name])
+            .values({name: cast(source.c[name], types[name]) for name in value_names})
+        )
+
+    def _restore(self, batch: dict[Any, dict[str, Any]]) -> None:
+        # values recorded while the flush was running are newer and win
+        for key, values in batch.items():
+            newer = self._pending.get(key)
+            if newer is not None:
+                self._pending[key] = {**values, **newer}
+            elif len(self._pending) < self.max_keys:
+                self._pending[key] = values
+            else:
+                self.dropped += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol
+
+# expired records swept from the LRU end per claim, so one claim does bounded work
+SWEEP_BATCH = 8
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass(frozen=True)
+class IdempotencyRecord:
+    # hash of the request the key was first used with
+    fingerprint: str
+    # None while the first request is still running
+    response: StoredResponse | None
+    expires_at: float
+
+
+class IIdempotencyStore(Protocol):
+    async def claim(self, key: str, fingerprint: str, now: float, lock_ttl: float) -> IdempotencyRecord | None:
+        """
+        Claims `key` for a request about to run, unless it is taken.
+
+        A key is free when it was never used or its record has expired; claiming it
+        records the request as in progress for `lock_ttl` seconds.
+
+        Returns:
+            IdempotencyRecord | None: None if the key was claimed, otherwise the record holding it.
+        """
+        ...
+
+    async def complete(self, key: str, response: StoredResponse, expires_at: float) -> None:
+        """Stores the response of the request that claimed `key`."""
+        ...
+
+    async def release(self, key: str) -> None:
+        """Frees `key` after its request failed, so a retry runs again."""
+        ...
+
+
+class InMemoryIdempotencyStore:
+    """
+    Per-process store of first responses in an LRU-ordered dict.
+
+    Every claim sweeps a few expired records off the least recently used end, and
+    past `max_keys` the least recently used completed ones are evicted; an evicted
+    key simply runs again. A claim still in progress is never evicted, so its key
+    cannot run twice at once.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._records: OrderedDict[str, IdempotencyRecord] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    async def claim(self, key: str, fingerprint: str, now: float, lock_ttl: float) -> IdempotencyRecord | None:
+        record = self._records.get(key)
+        if record is not None and record.expires_at > now:
+            self._records.move_to_end(key)
+            return record
+        self._records[key] = IdempotencyRecord(fingerprint, None, now + lock_ttl)
+        self._records.move_to_end(key)
+        self._evict(now)
+        return None
+
+    async def complete(self, key: str, response: StoredResponse, expires_at: float) -> None:
+        record = self._records.get(key)
+        if record is not None:
+            self._records[key] = IdempotencyRecord(record.fingerprint, response, expires_at)
+
+    async def release(self, key: str) -> None:
+        self._records.pop(key, None)
+
+    def _evict(self, now: float) -> None:
+        for _ in range(SWEEP_BATCH):
+            oldest = next(iter(self._records), None)
+            if oldest is None or self._records[oldest].expires_at > now:
+                break
+            del self._records[oldest]
+        skipped = 0
+        while len(self._records) > self.max_keys and skipped < SWEEP_BATCH:
+            key, record = self._records.popitem(last=False)
+            if record.response is None and record.expires_at > now:
+                # still running: moved to the most recently used end instead
+                self._records[key] = record
+                skipped += 1
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, TypeVar
+
+from config.config import OPTIMISTIC_RETRY_ATTEMPTS, OPTIMISTIC_RETRY_BACKOFF
+from domain.exceptions import ConcurrentUpdateError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def retry_on_conflict(
+    operation: Callable[[], Awaitable[T]],
+    attempts: int = OPTIMISTIC_RETRY_ATTEMPTS,
+    backoff: float = OPTIMISTIC_RETRY_BACKOFF,
+) -> T:
+    """
+    Runs a read-modify-write `operation` again while it loses a versioned update to another writer.
+
+    `operation` must read what it changes on every call, the retry is only as fresh as that
+    read. Attempts are spaced by a jittered, doubling `backoff`, so writers that collided
+    do not collide again in lockstep.
+
+    Args:
+        operation (Callable): The read-modify-write to run, without arguments.
+        attempts (int): How many times to run it at most.
+        backoff (float): The first pause between attempts, in seconds.
+
+    Returns:
+        T: The result of the first attempt that did not conflict.
+
+    Raises:
+        ConcurrentUpdateError: If every attempt conflicted.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return await operation()
+        except ConcurrentUpdateError:
+            if attempt >= attempts:
+                logger.warning(f"Giving up after {attempts} conflicting attempts")
+                raise
+            await asyncio.sleep(random.uniform(0, backoff * 2 ** (attempt - 1)))
+    raise ConcurrentUpdateError("No attempts to run")
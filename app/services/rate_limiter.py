@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Protocol
+
+from domain.exceptions import RateLimitExceededError
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Token bucket of `burst` tokens refilled at `per_minute` tokens per minute."""
+
+    burst: int
+    per_minute: float
+
+    @property
+    def emission_interval(self) -> float:
+        return 60.0 / self.per_minute
+
+    @property
+    def burst_tolerance(self) -> float:
+        return self.emission_interval * self.burst
+
+
+class IRateLimitBackend(Protocol):
+    async def take(self, key: str, rule: RateLimitRule, now: float) -> float:
+        """
+        Takes one token from the bucket under `key`.
+
+        The bucket is stored as a GCRA "theoretical arrival time": one float per key that is
+        equivalent to a token bucket, and a key whose time is in the past is a full bucket.
+
+        Returns:
+            float: 0 if the token was taken, otherwise seconds until one is available.
+        """
+        ...
+
+
+# expired entries swept from the LRU end per insert, so one insert does bounded work
+SWEEP_BATCH = 8
+
+
+class InMemoryRateLimitBackend:
+    """
+    Per-process bucket store: one float per key in an LRU-ordered dict.
+
+    Every take sweeps a few expired buckets off the least recently used end, and
+    past `max_keys` the least recently used ones are evicted, which can only make
+    a limit more lenient.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._tat: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    async def take(self, key: str, rule: RateLimitRule, now: float) -> float:
+        tat = max(self._tat.get(key, now), now) + rule.emission_interval
+        if tat - now > rule.burst_tolerance:
+            return tat - now - rule.burst_tolerance
+
+        self._tat[key] = tat
+        self._tat.move_to_end(key)
+        self._evict(now)
+        return 0.0
+
+    def _evict(self, now: float) -> None:
+        for _ in range(SWEEP_BATCH):
+            oldest = next(iter(self._tat), None)
+            if oldest is None or self._tat[oldest] > now:
+                break
+            del self._tat[oldest]
+        while len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+
+
+class RateLimiter:
+    """
+    Limits expensive auth endpoints by client IP and by username.
+
+    Both buckets must have a token; the IP comes from `X-Real-IP`, which is set by
+    the nginx proxy in front of the app.
+    """
+
+    def __init__(self, backend: IRateLimitBackend, ip_rule: RateLimitRule, username_rule: RateLimitRule) -> None:
+        self.backend = backend
+        self.ip_rule = ip_rule
+        self.username_rule = username_rule
+
+    async def check(self, scope: str, ip: str | None, username: str | None) -> None:
+        """
+        Raises:
+            RateLimitExceededError: If either the IP or the username is over its limit.
+        """
+        now = time.time()
+        retry_after = 0.0
+        if ip:
+            retry_after = await self.backend.take(f"{scope}:ip:{ip}", self.ip_rule, now)
+        if not retry_after and username:
+            retry_after = await self.backend.take(
+                f"{scope}:user:{username.lower()}", self.username_rule, now
+            )
+        if retry_after:
+            raise RateLimitExceededError("Too many requests", retry_after=retry_after)
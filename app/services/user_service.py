@@ -1,8 +1,16 @@
-from repositories.user_repo import IUserRepoProtocol
+import logging
+from typing import Sequence
+
+from repositories.user_repo import IUserRepoProtocol, SearchMode
 from domain.domain_user import DomainUser
-from domain.exceptions import DoubleFoundError, NotFoundError
+from domain.exceptions import DoubleFoundError, NotFoundError, RepositoryException
+from services.optimistic import retry_on_conflict
 from util.crypto_hash import AbstractCrypto
 
+logger = logging.getLogger(__name__)
+
+UPDATE_PASSWORD_READ_FIELDS = ("id", "hashed_password", "version")
+
 
 class UserService:
     repository: IUserRepoProtocol
@@ -16,8 +24,9 @@ class UserService:
         """
         Asynchronously creates a new user in the repository.
 
-        This function takes a dictionary containing user data, checks if a user with the given username
-        already exists, and if not, hashes the provided password and creates a new user entry in the repository.
+        This function takes a dictionary containing user data, hashes the provided password and creates
+        a new user entry in the repository, unless a user with the given username already exists. The check
+        and the insert are a single atomic statement, so concurrent signups can't both pass it.
 
         Args:
             data (dict): A dictionary containing user information. Expected keys are:
@@ -31,20 +40,29 @@ class UserService:
             DoubleFoundError: If a user with the specified username already exists in the repository.
         """
         username = data["username"]
-        if await self.repository.exists(username=username):
-            raise DoubleFoundError(f'user with username {username} already exists.')
-
         password = data["password"]
         hashed_password = self.crypto_hash.hash(password)
-        return await self.repository.create(data={"username": username, "hashed_password": hashed_password})
+        user = await self.repository.create_if_absent(
+            data={"username": username, "hashed_password": hashed_password},
+            conflict_columns=["username"],
+        )
+        if user is None:
+            raise DoubleFoundError(f'user with username {username} already exists.')
+        return user
 
-    async def verify_password(self, username: str, password: str) -> DomainUser:
+    async def verify_password(self, username: str, password: str, batch: bool = False) -> DomainUser:
         """
         Verifies the provided password for a given username.
 
+        If the stored hash was made with outdated parameters (e.g. a different bcrypt cost),
+        it is rehashed with the current ones and saved right away in a savepoint, so a failed
+        rehash never fails the login.
+
         Args:
             username (str): The username of the user whose password needs to be verified.
             password (str): The password to verify against the stored hashed password.
+            batch (bool): Batch the user lookup with the ones of concurrent requests, see
+                `IReadRepository.read`; the rehash is still written in this transaction.
 
         Returns:
             DomainUser: The user object if the password is verified successfully.
@@ -52,38 +70,76 @@ class UserService:
         Raises:
             self.wrong_password_ex: If the password verification fails.
         """
-        user = await self.repository.read(filters={"username": username})
+        user = await self.repository.read(filters={"username": username}, batch=batch)
         if self.crypto_hash.verify(password, user.hashed_password):
+            if self.crypto_hash.needs_update(user.hashed_password):
+                return await self._rehash(user, password)
             return user
         else:
             raise self.wrong_password_ex
 
-    async def update_password(self, username: str, old_password: str, new_password: str) -> DomainUser:
+    async def _rehash(self, user: DomainUser, password: str) -> DomainUser:
+        try:
+            # a concurrent change of the user wins, the next login rehashes again
+            return await self.repository.update_if_version(
+                user.id, user.version, {'hashed_password': self.crypto_hash.hash(password)}, savepoint=True
+            )
+        except RepositoryException as ex:
+            logger.warning(f'Could not rehash password of user {user.id}: {ex}')
+            return user
+
+    async def update_password(
+        self, username: str, old_password: str, new_password: str, fields: Sequence[str] | None = None
+    ) -> DomainUser:
         """
         Updates the password for a given user if the old password is verified.
 
+        The user is written back only if its version is still the one that was read, so a
+        concurrent change is never overwritten; on a conflict the read and the check run again.
+
         Args:
             username (str): The username of the user whose password is to be updated.
             old_password (str): The current password of the user.
             new_password (str): The new password to be set for the user.
+            fields (Sequence[str] | None): Fields of the updated user to return. When given, only
+                these columns are returned by the UPDATE and the user is partial.
 
         Returns:
             DomainUser: The updated user object with the new password.
 
         Raises:
-            DoubleFoundError: If more than one user with the same username is found in the database.
+            ConcurrentUpdateError: If the user kept changing concurrently through every retry.
             Exception: If the old password does not match the current password.
         """
-        user = await self.repository.read(filters={"username": username})
-        if self.crypto_hash.verify(old_password, user.hashed_password):
-            hashed_password = self.crypto_hash.hash(new_password)
-            updated_users = await self.repository.update(
-                filters={'username': username},
-                data={'hashed_password': hashed_password}
+        hashed_password: str | None = None
+
+        async def attempt() -> DomainUser:
+            nonlocal hashed_password
+            # only the columns the check and the conditional update need
+            user = await self.repository.read(filters={"username": username}, fields=UPDATE_PASSWORD_READ_FIELDS)
+            if not self.crypto_hash.verify(old_password, user.hashed_password):
+                raise self.wrong_password_ex
+            if hashed_password is None:
+                hashed_password = self.crypto_hash.hash(new_password)
+            return await self.repository.update_if_version(
+                user.id, user.version, {'hashed_password': hashed_password}, fields=fields
             )
-            if len(updated_users) == 1:
-                return updated_users[0]
-            else:
-                raise DoubleFoundError(f'username {username} has a double in DB!')
-        else:
-            raise self.wrong_password_ex
+
+        return await retry_on_conflict(attempt)
+
+    async def search(
+        self, query: str, mode: SearchMode = SearchMode.PREFIX, limit: int = 20, offset: int = 0
+    ) -> Sequence[DomainUser]:
+        """
+        Searches users by a part of the username, case-insensitively.
+
+        Args:
+            query (str): The start of the username, or any part of it with `SearchMode.CONTAINS`.
+            mode (SearchMode): How the query is matched.
+            limit (int): The page size.
+            offset (int): The number of matching users to skip.
+
+        Returns:
+            Sequence[DomainUser]: Users ordered by lowercased username, with only `id` and `username` set.
+        """
+        return await self.repository.search(query, mode=mode, limit=limit, offset=offset)
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from sqlalchemy import select
+
+from config.config import HASH_AUDIT_BATCH_PAUSE, HASH_AUDIT_BATCH_SIZE
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
+from util.crypto_hash import AbstractCrypto
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHashAudit:
+    """
+    Throttled scan of stored password hashes for outdated parameters.
+
+    Active accounts are rehashed on login by `UserService.verify_password`; a hash can
+    only be rebuilt from the plaintext, so dormant accounts can't be rewritten here.
+    The audit walks the table in keyed batches with a pause between them and reports
+    how many accounts are still on old parameters, e.g. to plan a forced reset.
+    """
+
+    def __init__(
+        self,
+        manager: DatabaseSessionManager,
+        crypto_hash: AbstractCrypto,
+        batch_size: int = HASH_AUDIT_BATCH_SIZE,
+        batch_pause: float = HASH_AUDIT_BATCH_PAUSE,
+    ) -> None:
+        self.manager = manager
+        self.crypto_hash = crypto_hash
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.scanned = 0
+        self.outdated = 0
+        self.finished_at: float | None = None
+
+    async def run_once(self, stop_event: asyncio.Event | None = None) -> int:
+        """Scans the whole table once. Returns the number of outdated hashes."""
+        scanned = outdated = 0
+        for shard in range(self.manager.shard_count):
+            last_id = 0
+            while stop_event is None or not stop_event.is_set():
+                stmt = (
+                    select(UserORM.id, UserORM.hashed_password)
+                    .where(UserORM.id > last_id)
+                    .order_by(UserORM.id)
+                    .limit(self.batch_size)
+                )
+                async with self.manager.session(shard) as session:
+                    rows = (await session.execute(stmt)).all()
+                if not rows:
+                    break
+                scanned += len(rows)
+                outdated += sum(1 for row in rows if self.crypto_hash.needs_update(row.hashed_password))
+                last_id = rows[-1].id
+                await asyncio.sleep(self.batch_pause)
+            else:
+                return outdated
+
+        self.scanned, self.outdated = scanned, outdated
+        self.finished_at = time.time()
+        if outdated:
+            logger.warning(f"{outdated} of {scanned} password hashes use outdated parameters")
+        return outdated
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"scanned": self.scanned, "outdated": self.outdated, "finished_at": self.finished_at}
+
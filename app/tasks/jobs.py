@@ -0,0 +1,57 @@
+import asyncio
+import time
+from typing import Any
+
+from config.config import ACTIVITY_FLUSH_INTERVAL, HASH_AUDIT_INTERVAL
+from db.db import DatabaseSessionManager
+from monitoring.metrics import metrics
+from repositories.idempotency_repo import SQLIdempotencyStore
+from repositories.rate_limit_repo import SQLRateLimitBackend
+from repositories.write_behind import WriteBehindBuffer
+from services.idempotency import IIdempotencyStore
+from services.rate_limiter import IRateLimitBackend
+from util.crypto_hash import CryptoHash
+
+from .hash_audit import PasswordHashAudit
+from .scheduler import Scheduler
+
+
+def register_jobs(
+    scheduler: Scheduler,
+    stop_event: asyncio.Event,
+    sessionmanager: DatabaseSessionManager,
+    user_activity: WriteBehindBuffer[Any],
+    rate_limit_backend: IRateLimitBackend,
+    idempotency_store: IIdempotencyStore,
+) -> None:
+    """Registers the app's periodic background jobs on `scheduler`, which must be a fresh one."""
+    hash_audit = PasswordHashAudit(sessionmanager, CryptoHash())
+    metrics.register("hash_audit", hash_audit.snapshot)
+    scheduler.add_job(
+        "hash_audit",
+        lambda: hash_audit.run_once(stop_event),
+        interval=HASH_AUDIT_INTERVAL,
+        jitter=60,
+    )
+
+    scheduler.add_job("user_activity_flush", user_activity.flush, interval=ACTIVITY_FLUSH_INTERVAL)
+
+    backend = rate_limit_backend
+    if isinstance(backend, SQLRateLimitBackend):
+        scheduler.add_job(
+            "rate_limit_purge",
+            lambda: backend.purge(time.time()),
+            interval=300,
+            jitter=30,
+        )
+
+    store = idempotency_store
+    if isinstance(store, SQLIdempotencyStore):
+        scheduler.add_job(
+            "idempotency_purge",
+            lambda: store.purge(time.time()),
+            interval=300,
+            jitter=30,
+        )
+
+    metrics.register("scheduler", scheduler.snapshot)
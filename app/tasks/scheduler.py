@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+
+class CronSchedule:
+    """
+    Minimal 5-field cron expression: `minute hour day-of-month month day-of-week`.
+
+    Supports `*`, numbers, ranges `a-b`, lists `a,b` and steps `*/n` / `a-b/n`;
+    day-of-week is 0-6 with 0 = Sunday. Like cron, when both day fields are
+    restricted a day matches if either of them does.
+    """
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str) -> None:
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression must have 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(value, low, high) for value, (low, high) in zip(fields, self.RANGES)
+        )
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(value: str, low: int, high: int) -> frozenset[int]:
+        result: set[int] = set()
+        for part in value.split(","):
+            body, _, step_text = part.partition("/")
+            step = int(step_text) if step_text else 1
+            if body == "*":
+                start, end = low, high
+            elif "-" in body:
+                start, end = (int(x) for x in body.split("-", 1))
+            else:
+                start = end = int(body)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"invalid cron field {value!r}")
+            result.update(range(start, end + 1, step))
+        return frozenset(result)
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment: datetime) -> datetime:
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 4)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"cron expression {self.expression!r} never fires")
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    running: int = 0
+    last_duration_ms: float | None = None
+    max_duration_ms: float = 0.0
+    total_duration_ms: float = 0.0
+    last_error: str | None = None
+
+
+@dataclass
+class Job:
+    """
+    A periodic job: every `interval` seconds or on a `cron` expression (local time).
+
+    Up to `max_concurrency` runs may overlap; a due run beyond that is skipped, not
+    queued. `jitter` adds a random 0..jitter seconds delay to every run so workers
+    don't fire in lockstep.
+    """
+
+    name: str
+    func: JobFunc
+    interval: float | None = None
+    cron: CronSchedule | None = None
+    jitter: float = 0.0
+    max_concurrency: int = 1
+    run_at_start: bool = False
+    timeout: float | None = None
+    stats: JobStats = field(default_factory=JobStats)
+
+    def next_delay(self) -> float:
+        if self.cron is not None:
+            now = datetime.now()
+            delay = (self.cron.next_after(now) - now).total_seconds()
+        else:
+            delay = self.interval or 0.0
+        return delay + random.uniform(0, self.jitter)
+
+
+class Scheduler:
+    """
+    Runs periodic background jobs next to the server.
+
+    A failing job is logged and counted, it never takes the process down. When the
+    stop event is set no new runs start, runs in progress get `shutdown_timeout`
+    seconds to finish and are cancelled after that.
+    """
+
+    def __init__(self, shutdown_timeout: float = 10.0) -> None:
+        self.shutdown_timeout = shutdown_timeout
+        self.jobs: dict[str, Job] = {}
+        self._runs: set[asyncio.Task[None]] = set()
+
+    def add_job(
+        self,
+        name: str,
+        func: JobFunc,
+        *,
+        interval: float | None = None,
+        cron: str | None = None,
+        jitter: float = 0.0,
+        max_concurrency: int = 1,
+        run_at_start: bool = False,
+        timeout: float | None = None,
+    ) -> Job:
+        if (interval is None) == (cron is None):
+            raise ValueError("exactly one of interval and cron must be set")
+        if name in self.jobs:
+            raise ValueError(f"job {name} is already registered")
+        job = Job(
+            name=name,
+            func=func,
+            interval=interval,
+            cron=CronSchedule(cron) if cron is not None else None,
+            jitter=jitter,
+            max_concurrency=max_concurrency,
+            run_at_start=run_at_start,
+            timeout=timeout,
+        )
+        self.jobs[name] = job
+        return job
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        loops = [asyncio.create_task(self._job_loop(job, stop_event)) for job in self.jobs.values()]
+        await stop_event.wait()
+        await asyncio.gather(*loops)
+        await self._drain()
+
+    async def _job_loop(self, job: Job, stop_event: asyncio.Event) -> None:
+        first = job.run_at_start
+        while not stop_event.is_set():
+            if not first:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), job.next_delay())
+                    break
+                except TimeoutError:
+                    pass
+            first = False
+            if job.stats.running >= job.max_concurrency:
+                job.stats.skipped += 1
+                logger.warning(f"Job {job.name} is still running, skipping this run")
+                continue
+            task = asyncio.create_task(self._run_job(job))
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    async def _run_job(self, job: Job) -> None:
+        stats = job.stats
+        stats.running += 1
+        start = time.perf_counter()
+        try:
+            if job.timeout is not None:
+                await asyncio.wait_for(job.func(), job.timeout)
+            else:
+                await job.func()
+        except asyncio.CancelledError:
+            stats.failures += 1
+            stats.last_error = "cancelled"
+            raise
+        except Exception as ex:
+            stats.failures += 1
+            stats.last_error = repr(ex)
+            logger.exception(f"Job {job.name} failed")
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            stats.running -= 1
+            stats.runs += 1
+            stats.last_duration_ms = duration
+            stats.total_duration_ms += duration
+            stats.max_duration_ms = max(stats.max_duration_ms, duration)
+
+    async def _drain(self) -> None:
+        if not self._runs:
+            return
+        _, pending = await asyncio.wait(set(self._runs), timeout=self.shutdown_timeout)
+        for task in pending:
+            logger.warning("Cancelling a job run that did not finish on shutdown")
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def snapshot(self) -> dict[str, Any]:
+        result = {}
+        for name, job in self.jobs.items():
+            stats = job.stats
+            result[name] = {
+                "runs": stats.runs,
+                "failures": stats.failures,
+                "skipped": stats.skipped,
+                "running": stats.running,
+                "last_duration_ms": stats.last_duration_ms,
+                "max_duration_ms": round(stats.max_duration_ms, 1),
+                "avg_duration_ms": round(stats.total_duration_ms / stats.runs, 1) if stats.runs else None,
+                "last_error": stats.last_error,
+            }
+        return result
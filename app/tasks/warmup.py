@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+
+from config.config import WARMUP_CONNECTIONS, WARMUP_ENABLED, WARMUP_TIMEOUT
+from db.db import DatabaseSessionManager, sessionmanager
+from db.models.user import UserORM
+from domain.domain_user import DomainUser
+from domain.exceptions import NotFoundError
+from monitoring.metrics import metrics
+from repositories.user_repo import UserSQLAlchemyRepo
+from util.crypto_hash import get_pwd_context
+
+logger = logging.getLogger(__name__)
+
+# whether such a user exists doesn't matter, only the statements do
+PROBE_USERNAME = "__warmup__"
+
+
+class Warmup:
+    """
+    Startup work that would otherwise be paid for by the first requests after a deploy.
+
+    Configures the ORM mappers, loads the bcrypt backend, and opens `connections`
+    pooled connections per shard at the same time. Each connection runs the hot
+    repository statements once, so SQLAlchemy's compiled cache and the driver's
+    prepared statements are ready too. The health monitor reports the worker as
+    not ready until `finished`. A failed or timed-out warm-up is logged and still
+    finishes, so it can't keep the worker out of rotation for good.
+    """
+
+    def __init__(
+        self,
+        manager: DatabaseSessionManager,
+        connections: int = WARMUP_CONNECTIONS,
+        timeout: float = WARMUP_TIMEOUT,
+        enabled: bool = WARMUP_ENABLED,
+    ) -> None:
+        self.manager = manager
+        self.connections = connections
+        self.timeout = timeout
+        self.enabled = enabled
+        self.finished = False
+        self.error: str | None = None
+        self.duration_ms: float | None = None
+        self.steps_ms: dict[str, float] = {}
+
+    async def run(self) -> None:
+        if not self.enabled:
+            self.finished = True
+            return
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await self._step("mappers", self._configure_mappers)
+                await self._step("password hashing", self._load_bcrypt)
+                await self._step("connections", self._warm_pools)
+        except Exception as ex:
+            self.error = repr(ex)
+            logger.warning(f"Warm-up failed, serving cold: {ex!r}")
+        finally:
+            self.duration_ms = (time.perf_counter() - started) * 1000
+            self.finished = True
+        logger.info(f"warm-up took {self.duration_ms:.1f} ms: {self.steps_ms}")
+
+    async def _step(self, name: str, step: Callable[[], Awaitable[None]]) -> None:
+        started = time.perf_counter()
+        await step()
+        self.steps_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    async def _configure_mappers(self) -> None:
+        configure_mappers()
+
+    async def _load_bcrypt(self) -> None:
+        # importing passlib and selecting (and self-testing) the bcrypt backend
+        await asyncio.to_thread(lambda: get_pwd_context().handler().get_backend())
+
+    def _connection_count(self, shard: int) -> int:
+        pool = self.manager.engines[shard].pool
+        # other pools either share one connection or don't keep them
+        return min(self.connections, pool.size()) if isinstance(pool, QueuePool) else 1
+
+    async def _warm_pools(self) -> None:
+        await asyncio.gather(*(self._warm_shard(shard) for shard in range(self.manager.shard_count)))
+
+    async def _warm_shard(self, shard: int) -> None:
+        count = self._connection_count(shard)
+        # every session holds its connection until all are open, so the pool opens `count` of them
+        barrier = asyncio.Barrier(count)
+
+        async def warm() -> None:
+            try:
+                async with self.manager.session(shard) as session:
+                    await self._prime(session)
+                    await barrier.wait()
+            except BaseException:
+                await barrier.abort()
+                raise
+
+        await asyncio.gather(*(warm() for _ in range(count)))
+
+    async def _prime(self, session: AsyncSession) -> None:
+        repo = UserSQLAlchemyRepo(session, DomainUser, UserORM)
+        await repo.exists(PROBE_USERNAME)
+        try:
+            await repo.read(filters={"username": PROBE_USERNAME})
+        except NotFoundError:
+            pass
+        await repo.search(PROBE_USERNAME)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "finished": self.finished,
+            "duration_ms": round(self.duration_ms, 1) if self.duration_ms is not None else None,
+            "steps_ms": self.steps_ms,
+            "error": self.error,
+        }
+
+
+warmup = Warmup(sessionmanager)
+metrics.register("warmup", warmup.snapshot)
@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from middleware.admission import AdmissionControlMiddleware, AIMDLimiter, RouteLimit
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_and_sheds():
+    limiter = AIMDLimiter(RouteLimit(name="t", initial_limit=1, max_queue=1, queue_timeout=0.05))
+    assert await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+    # очередь заполнена — следующий запрос сбрасывается сразу
+    assert await limiter.acquire() is False
+
+    limiter.release(latency_ms=1)
+    assert await waiter is True
+    assert limiter.in_flight == 1
+    assert limiter.shed == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_queue_timeout():
+    limiter = AIMDLimiter(RouteLimit(name="t", initial_limit=1, queue_timeout=0.01))
+    assert await limiter.acquire()
+    assert await limiter.acquire() is False
+    assert limiter.queued == 0
+    assert limiter.shed == 1
+
+
+@pytest.mark.asyncio
+async def test_limiter_adapts_to_latency():
+    limiter = AIMDLimiter(RouteLimit(name="t", initial_limit=10, target_latency_ms=100))
+    await limiter.acquire()
+    limiter.release(latency_ms=500)
+    assert limiter.limit == pytest.approx(9.0)
+
+    for _ in range(9):
+        await limiter.acquire()
+    limiter.release(latency_ms=1)
+    assert limiter.limit > 9.0
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_with_retry_after():
+    release = asyncio.Event()
+
+    async def slow(request):
+        await release.wait()
+        return PlainTextResponse("slow")
+
+    async def fast(request):
+        return PlainTextResponse("fast")
+
+    app = AdmissionControlMiddleware(
+        Starlette(routes=[Route("/slow", slow), Route("/fast", fast)]),
+        routes=[RouteLimit(name="slow", path="/slow", initial_limit=1, max_queue=0)],
+        default=RouteLimit(name="default"),
+    )
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/slow"))
+        await asyncio.sleep(0.05)
+
+        shed = await client.get("/slow")
+        assert shed.status_code == 503
+        assert shed.headers["retry-after"] == "1"
+        # медленный маршрут не мешает остальным
+        assert (await client.get("/fast")).status_code == 200
+
+        release.set()
+        assert (await first).status_code == 200
+
+    snapshot = app.snapshot()
+    assert snapshot["slow"]["shed"] == 1
+    assert snapshot["slow"]["admitted"] == 1
+    assert snapshot["default"]["admitted"] == 1
+
+
+def test_cors_is_outermost():
+    import main
+
+    # сброшенные 503 тоже должны нести заголовки CORS
+    assert main.app.user_middleware[0].cls is CORSMiddleware
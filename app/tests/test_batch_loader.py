@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Integer, String, update
+from sqlalchemy.orm import Mapped, mapped_column
+
+from db.db import DatabaseSessionManager
+from domain.base_domain_model import BaseDomainModel
+from domain.exceptions import DoubleFoundError, NotFoundError
+from repositories.batch_loader import BatchLoader
+from repositories.sqlalchemy_repo import ReadMixin
+from conftest import Base
+
+
+class LoaderORM(Base):
+    __tablename__ = "loader_dummy"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String)
+
+
+class LoaderDomain(BaseDomainModel):
+    id: int
+    name: str
+
+
+@pytest.fixture
+async def manager(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/loader.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(LoaderORM.__table__.create)
+        await connection.execute(
+            LoaderORM.__table__.insert(),
+            [{"name": "alice"}, {"name": "bob"}, {"name": "dup"}, {"name": "dup"}],
+        )
+    yield manager
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_share_one_query(manager):
+    loader = BatchLoader(manager, LoaderDomain, LoaderORM, key="name")
+    results = await asyncio.gather(
+        loader.load("alice"),
+        loader.load("bob"),
+        loader.load("alice"),
+        loader.load("missing"),
+        loader.load("dup"),
+        return_exceptions=True,
+    )
+    assert loader.batches == 1
+    assert results[0].name == "alice"
+    assert results[1].name == "bob"
+    assert results[2] == results[0]
+    assert isinstance(results[3], NotFoundError)
+    assert isinstance(results[4], DoubleFoundError)
+
+
+@pytest.mark.asyncio
+async def test_max_batch_splits(manager):
+    loader = BatchLoader(manager, LoaderDomain, LoaderORM, key="name", max_batch=1)
+    await asyncio.gather(loader.load("alice"), loader.load("bob"))
+    assert loader.batches == 2
+
+
+@pytest.mark.asyncio
+async def test_read_mixin_uses_loader(manager):
+    loader = BatchLoader(manager, LoaderDomain, LoaderORM, key="name", window=0.01)
+
+    class Repo(ReadMixin[LoaderDomain, LoaderORM]):
+        pass
+
+    async with manager.session() as session:
+        repo = Repo(session, LoaderDomain, LoaderORM, loader=loader)
+        users = await asyncio.gather(*(repo.read(filters={"name": "bob"}, batch=True) for _ in range(10)))
+        assert {user.name for user in users} == {"bob"}
+        assert loader.batches == 1
+        # фильтры по другим полям идут мимо загрузчика
+        assert (await repo.read(filters={"id": users[0].id}, batch=True)).name == "bob"
+        assert loader.batches == 1
+        # без batch=True чтение идёт в сессии вызывающего и видит его несохранённые изменения
+        await session.execute(update(LoaderORM).where(LoaderORM.name == "bob").values(name="robert"))
+        assert (await repo.read(filters={"name": "robert"})).id == users[0].id
+        assert loader.batches == 1
@@ -0,0 +1,62 @@
+import sys
+from datetime import UTC, datetime
+
+import pytest
+
+from api.v1.schemas.user_schema import UserRead
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
+from domain.domain_user import DomainUser
+from repositories.interfaces import OrderBy
+from repositories.sqlalchemy_repo import CreateMixin, ListMixin
+from domain.exceptions import RepositoryException
+
+
+class UserListRepo(CreateMixin[DomainUser, UserORM], ListMixin[DomainUser, UserORM]):
+    pass
+
+
+def test_compact_record_roundtrip():
+    seen = datetime(2025, 1, 1, tzinfo=UTC)
+    user = DomainUser(id=1, username="alice", hashed_password="h", last_seen_at=seen)
+    record = user.to_compact()
+
+    assert type(record) is DomainUser.compact_type()
+    assert record.username == "alice"
+    assert record.last_login_at is None
+    assert record.to_model() == user
+    # модель ответа читает компактную запись через from_attributes
+    assert UserRead.model_validate(record).username == "alice"
+
+
+def test_compact_record_is_slotted_and_immutable():
+    record = DomainUser.compact_type()._make((1, "alice", "h", None, None, 1))
+    assert not hasattr(record, "__dict__")
+    with pytest.raises(AttributeError):
+        record.username = "bob"  # type: ignore[misc]
+    # необязательные поля в конце получают значения по умолчанию
+    assert DomainUser.compact_type()(1, "alice", "h").last_seen_at is None
+    assert sys.getsizeof(record) < sys.getsizeof(record.to_model().__dict__)
+
+
+@pytest.mark.asyncio
+async def test_list_compact(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/compact.sqlite3")
+    try:
+        async with manager.connect() as connection:
+            await connection.run_sync(UserORM.__table__.create)
+        async with manager.session() as session:
+            repo = UserListRepo(session, DomainUser, UserORM)
+            for name in ("bob", "alice"):
+                await repo.create({"username": name, "hashed_password": "h"})
+
+            records = await repo.list(order_by=[OrderBy("username")], compact=True)
+            assert [record.username for record in records] == ["alice", "bob"]
+            assert all(type(record) is DomainUser.compact_type() for record in records)
+            full = await repo.list(order_by=[OrderBy("username")])
+            assert [record.to_model() for record in records] == list(full)
+
+            with pytest.raises(RepositoryException):
+                await repo.list(fields=["id"], compact=True)
+    finally:
+        await manager.close()
@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+import zlib
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+from middleware.compression import CompressionMiddleware, negotiate_encoding
+
+BIG = "x" * 5000
+
+
+async def big(request):
+    return PlainTextResponse(BIG, headers={"ETag": '"abc"'})
+
+
+async def small(request):
+    return PlainTextResponse("tiny")
+
+
+async def stream(request):
+    async def body():
+        for i in range(5):
+            yield (f"{i}" * 2000).encode()
+
+    return StreamingResponse(body(), media_type="text/plain")
+
+
+def make_client(minimum_size: int = 1024) -> httpx.AsyncClient:
+    app = CompressionMiddleware(
+        Starlette(routes=[Route("/big", big), Route("/small", small), Route("/stream", stream)]),
+        minimum_size=minimum_size,
+        zstd_level=3,
+    )
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.parametrize(
+    "header,zstd,expected",
+    [
+        ("gzip, deflate, br", False, "gzip"),
+        ("gzip, zstd", True, "zstd"),
+        ("gzip, zstd;q=0", True, "gzip"),
+        ("gzip;q=0", False, None),
+        ("*", False, "gzip"),
+        ("", False, None),
+        ("identity", True, None),
+    ],
+)
+def test_negotiate_encoding(header, zstd, expected):
+    assert negotiate_encoding(header, zstd_available=zstd) == expected
+
+
+@pytest.mark.asyncio
+async def test_large_body_is_gzipped():
+    async with make_client() as client:
+        response = await client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.text == BIG
+
+
+@pytest.mark.asyncio
+async def test_small_body_is_not_compressed():
+    async with make_client() as client:
+        response = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "tiny"
+
+
+@pytest.mark.asyncio
+async def test_no_accept_encoding():
+    async with make_client() as client:
+        response = await client.get("/big", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == BIG
+
+
+@pytest.mark.asyncio
+async def test_streaming_is_compressed_per_chunk():
+    app = CompressionMiddleware(Starlette(routes=[Route("/stream", stream)]))
+    scope = {
+        "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream",
+        "query_string": b"", "headers": [(b"accept-encoding", b"gzip")],
+    }
+    messages = []
+    requested = asyncio.Event()
+
+    async def receive():
+        if requested.is_set():
+            # клиент не отключается, ждём пока ответ не будет отправлен
+            await asyncio.Event().wait()
+        requested.set()
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    bodies = [m["body"] for m in messages[1:] if m["body"]]
+    # каждый фрагмент сбрасывается отдельно (плюс завершающий трейлер gzip),
+    # поэтому ответ не буферизуется целиком
+    assert len(bodies) == 6
+    assert zlib.decompressobj(31).decompress(bodies[0]) == b"0" * 2000
+    assert gzip.decompress(b"".join(bodies)) == b"".join((f"{i}" * 2000).encode() for i in range(5))
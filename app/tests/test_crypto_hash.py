@@ -0,0 +1,42 @@
+import pytest
+
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
+from tasks.hash_audit import PasswordHashAudit
+from util.crypto_calibrate import calibrate_bcrypt_rounds
+from util.crypto_hash import build_pwd_context
+
+
+def test_needs_update_on_cost_change():
+    old = build_pwd_context(rounds=4).hash("secret")
+    context = build_pwd_context(rounds=5)
+    assert context.needs_update(old)
+    assert not context.needs_update(context.hash("secret"))
+
+
+def test_calibrate_respects_target():
+    rounds, measured = calibrate_bcrypt_rounds(target_ms=50, samples=1)
+    assert 4 <= rounds <= 16
+    assert measured <= 50
+    rounds, _ = calibrate_bcrypt_rounds(target_ms=0, samples=1)
+    assert rounds == 4
+
+
+class FakeCrypto:
+    def needs_update(self, hash: str) -> bool:
+        return hash.startswith("old")
+
+
+@pytest.mark.asyncio
+async def test_hash_audit_counts_outdated(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/audit.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(UserORM.__table__.create)
+        await connection.execute(
+            UserORM.__table__.insert(),
+            [{"username": f"user{i}", "hashed_password": "old" if i % 3 == 0 else "new"} for i in range(10)],
+        )
+    audit = PasswordHashAudit(manager, FakeCrypto(), batch_size=3, batch_pause=0)  # type: ignore[arg-type]
+    assert await audit.run_once() == 4
+    assert audit.snapshot()["scanned"] == 10
+    await manager.close()
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from db.deadline import current_deadline, remaining_ms
+from middleware.deadline import DeadlineMiddleware, RouteDeadline
+
+
+def make_app(handler) -> DeadlineMiddleware:
+    return DeadlineMiddleware(handler, routes=[RouteDeadline(path="/slow", timeout_ms=50)], default_ms=1000)
+
+
+async def call(middleware, path, receive):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "method": "GET", "path": path}, receive, send)
+    return sent
+
+
+async def request_then_wait(disconnect_after=None):
+    # как сервер: сначала тело запроса, потом http.disconnect, когда клиент уйдет
+    yield {"type": "http.request", "body": b"", "more_body": False}
+    if disconnect_after is None:
+        await asyncio.Event().wait()
+    await asyncio.sleep(disconnect_after)
+    yield {"type": "http.disconnect"}
+
+
+def receiver(disconnect_after=None):
+    messages = request_then_wait(disconnect_after)
+    return messages.__anext__
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_and_answers_504():
+    cancelled = asyncio.Event()
+    seen = {}
+
+    async def handler(scope, receive, send):
+        seen["remaining_ms"] = remaining_ms()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    middleware = make_app(handler)
+    sent = await call(middleware, "/slow", receiver())
+    assert cancelled.is_set()
+    assert sent[0]["status"] == 504
+    assert 0 < seen["remaining_ms"] <= 50
+    assert middleware.snapshot()["timeouts"] == 1
+    # дедлайн виден только внутри запроса
+    assert current_deadline.get() is None
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_request():
+    cancelled = asyncio.Event()
+
+    async def handler(scope, receive, send):
+        assert (await receive())["type"] == "http.request"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    middleware = make_app(handler)
+    sent = await asyncio.wait_for(call(middleware, "/other", receiver(disconnect_after=0.01)), 1)
+    assert cancelled.is_set()
+    assert sent == []
+    assert middleware.snapshot()["disconnects"] == 1
+
+
+def test_fast_requests_pass_through():
+    app = FastAPI()
+
+    @app.post("/echo")
+    async def echo(data: dict) -> dict:
+        return {**data, "has_deadline": remaining_ms() is not None}
+
+    app.add_middleware(DeadlineMiddleware, routes=[], default_ms=1000)
+    with TestClient(app) as client:
+        response = client.post("/echo", json={"a": 1})
+    assert response.status_code == 200
+    assert response.json() == {"a": 1, "has_deadline": True}
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from api import health_router
+from db.db import DatabaseSessionManager
+from monitoring.health import HealthMonitor
+from monitoring.loop_monitor import LoopLagMonitor
+
+
+@pytest.fixture
+async def manager():
+    manager = DatabaseSessionManager("sqlite+aiosqlite:///:memory:")
+    yield manager
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_not_ready_before_first_probe(manager):
+    monitor = HealthMonitor(manager)
+    ready, details = monitor.readiness()
+    assert ready is False
+    assert details["checks"]["db"] is False
+
+
+@pytest.mark.asyncio
+async def test_ready_after_probe(manager):
+    monitor = HealthMonitor(manager)
+    result = await monitor.probe_db()
+    assert result.ok
+    ready, _ = monitor.readiness()
+    assert ready is True
+
+
+@pytest.mark.asyncio
+async def test_not_ready_on_saturation(manager):
+    monitor = HealthMonitor(manager, max_pool_waiters=0, max_loop_lag_ms=10, lag_monitor=LoopLagMonitor())
+    await monitor.probe_db()
+    monitor.lag_monitor.record(50)
+    ready, details = monitor.readiness()
+    assert ready is False
+    assert details["checks"] == {"db": True, "pool": True, "loop_lag": False}
+
+
+@pytest.mark.asyncio
+async def test_run_stops_on_event(manager):
+    monitor = HealthMonitor(manager, interval=0.01)
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(monitor.run(stop_event))
+    await asyncio.sleep(0.05)
+    stop_event.set()
+    await asyncio.wait_for(task, 1)
+    assert monitor.db.ok
+
+
+def test_endpoints(monkeypatch):
+    class FakeMonitor:
+        ready = False
+
+        def readiness(self):
+            return self.ready, {"checks": {"db": self.ready}}
+
+    fake = FakeMonitor()
+    monkeypatch.setattr(health_router, "health_monitor", fake)
+    app = FastAPI()
+    app.include_router(health_router.router)
+    client = TestClient(app)
+
+    assert client.get("/healthz").json() == {"status": "ok"}
+    assert client.get("/readyz").status_code == 503
+    fake.ready = True
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_pool_waiters_count_queued_connections(tmp_path):
+    # пул из одного соединения: второй пользователь ждёт, пока первый его держит
+    manager = DatabaseSessionManager(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        {"poolclass": AsyncAdaptedQueuePool, "pool_size": 1, "max_overflow": 0},
+    )
+    try:
+        async with manager.connect() as connection:
+            await connection.execute(select(1))
+            assert manager.pool_waiters() == 0
+
+            async def probe() -> None:
+                async with manager.connect() as other:
+                    await other.execute(select(1))
+
+            waiter = asyncio.create_task(probe())
+            await asyncio.sleep(0.05)
+            assert manager.pool_waiters() == 1
+        await asyncio.wait_for(waiter, 1)
+        assert manager.pool_waiters() == 0
+    finally:
+        await manager.close()
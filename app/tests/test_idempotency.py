@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from db.db import DatabaseSessionManager
+from db.models.idempotency import IdempotencyKeyORM
+from middleware.idempotency import IdempotencyMiddleware
+from repositories.idempotency_repo import SQLIdempotencyStore
+from services.idempotency import InMemoryIdempotencyStore, StoredResponse
+
+RESPONSE = StoredResponse(201, [(b"content-type", b"application/json")], b'{"id":1}')
+
+
+@pytest.fixture
+async def sql_store(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/idempotency.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(IdempotencyKeyORM.__table__.create)
+    yield SQLIdempotencyStore(manager)
+    await manager.close()
+
+
+@pytest.fixture(params=["memory", "sql"])
+def store(request, sql_store):
+    if request.param == "memory":
+        return InMemoryIdempotencyStore(max_keys=100)
+    return sql_store
+
+
+@pytest.mark.asyncio
+async def test_claim_complete_release(store):
+    now = 1000.0
+    assert await store.claim("k", "f1", now, lock_ttl=30) is None
+    # занят, пока первый запрос выполняется
+    record = await store.claim("k", "f1", now, lock_ttl=30)
+    assert record.fingerprint == "f1" and record.response is None
+
+    await store.complete("k", RESPONSE, expires_at=now + 100)
+    record = await store.claim("k", "f1", now + 50, lock_ttl=30)
+    assert record.response == RESPONSE
+    # после истечения ключ снова свободен
+    assert await store.claim("k", "f2", now + 100, lock_ttl=30) is None
+
+    await store.release("k")
+    assert await store.claim("k", "f3", now + 100, lock_ttl=30) is None
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_is_reclaimed(store):
+    assert await store.claim("k", "f", 1000.0, lock_ttl=30) is None
+    assert await store.claim("k", "f", 1029.0, lock_ttl=30) is not None
+    assert await store.claim("k", "f", 1030.0, lock_ttl=30) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_store_is_bounded():
+    store = InMemoryIdempotencyStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        await store.claim(key, "f", 1000.0, lock_ttl=30)
+        await store.complete(key, StoredResponse(201, [], b"{}"), expires_at=1100.0)
+    assert len(store) == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_store_keeps_claims_in_progress():
+    store = InMemoryIdempotencyStore(max_keys=2)
+    await store.claim("running", "f", 1000.0, lock_ttl=30)
+    for key in ("a", "b"):
+        await store.claim(key, "f", 1000.0, lock_ttl=30)
+        await store.complete(key, StoredResponse(201, [], b"{}"), expires_at=1100.0)
+    # вытесняется завершённый ключ, а не запрос, который ещё выполняется
+    assert len(store) == 2
+    assert await store.claim("running", "f", 1001.0, lock_ttl=30) is not None
+    assert await store.claim("a", "f", 1001.0, lock_ttl=30) is None
+
+
+def make_client(store, **kwargs):
+    calls = []
+    app = FastAPI()
+
+    @app.post("/users/")
+    async def create(data: dict) -> dict:
+        calls.append(data)
+        await asyncio.sleep(0.05)
+        if data.get("fail"):
+            raise HTTPException(503, "try later")
+        return {"id": len(calls), **data}
+
+    middleware = IdempotencyMiddleware(app, store, routes=[("POST", "/users/")], **kwargs)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url="http://test")
+    return client, calls, middleware
+
+
+@pytest.mark.asyncio
+async def test_retry_gets_stored_response(store):
+    client, calls, middleware = make_client(store)
+    async with client:
+        first = await client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+        retry = await client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k1"})
+        other = await client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k2"})
+        no_key = await client.post("/users/", json={"name": "a"})
+    assert first.json() == retry.json() == {"id": 1, "name": "a"}
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert other.json()["id"] == 2 and no_key.json()["id"] == 3
+    assert len(calls) == 3
+    assert middleware.snapshot()["replayed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_wait_for_the_first(store):
+    client, calls, _ = make_client(store)
+    async with client:
+        responses = await asyncio.gather(*(
+            client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k"}) for _ in range(5)
+        ))
+    assert len(calls) == 1
+    assert {response.json()["id"] for response in responses} == {1}
+
+
+@pytest.mark.asyncio
+async def test_key_reused_with_other_body(store):
+    client, calls, _ = make_client(store)
+    async with client:
+        await client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k"})
+        response = await client.post("/users/", json={"name": "b"}, headers={"Idempotency-Key": "k"})
+    assert response.status_code == 422
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_keys_are_scoped_per_caller(store):
+    client, calls, _ = make_client(store)
+    async with client:
+        alice = await client.post("/users/", json={"name": "a"}, headers={"Idempotency-Key": "k", "TOKEN": "alice"})
+        # тот же ключ другого пользователя — другой запрос, а не повтор чужого ответа
+        bob = await client.post("/users/", json={"name": "b"}, headers={"Idempotency-Key": "k", "TOKEN": "bob"})
+        retry = await client.post("/users/", json={"name": "b"}, headers={"Idempotency-Key": "k", "TOKEN": "bob"})
+    assert alice.json() == {"id": 1, "name": "a"}
+    assert bob.status_code == 200 and "idempotent-replayed" not in bob.headers
+    assert bob.json() == retry.json() == {"id": 2, "name": "b"}
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_not_stored(store):
+    client, calls, _ = make_client(store)
+    async with client:
+        for _ in range(2):
+            response = await client.post("/users/", json={"fail": True}, headers={"Idempotency-Key": "k"})
+            assert response.status_code == 503
+    # ключ освобожден, повтор выполняется заново
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_in_progress_in_other_worker_is_a_conflict(store):
+    client, calls, middleware = make_client(store, wait_timeout=0.1, poll_interval=0.01)
+    body = b'{"name":"a"}'
+    # ключ занят запросом другого воркера, который не завершается
+    key = middleware.scoped_key("POST", "/users/", "", "k")
+    await store.claim(key, hashlib.sha256(body).hexdigest(), time.time(), lock_ttl=30)
+    async with client:
+        response = await client.post(
+            "/users/", content=body, headers={"Idempotency-Key": "k", "content-type": "application/json"}
+        )
+    assert response.status_code == 409
+    assert calls == []
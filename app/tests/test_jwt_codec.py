@@ -0,0 +1,84 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from jose import jwt
+
+from util.jwt_codec import HS256Codec, InvalidTokenError, TokenExpiredError, b64url_encode
+
+SECRET = "test-secret"
+
+
+def test_roundtrip_and_jose_compatibility():
+    codec = HS256Codec(SECRET)
+    expire = datetime.now(UTC) + timedelta(hours=1)
+    claims = {"username": "bob", "password": "pw", "exp": expire}
+
+    token = codec.encode(claims)
+    # токены совместимы с python-jose в обе стороны
+    assert jwt.decode(token, SECRET, algorithms=["HS256"])["username"] == "bob"
+    jose_token = jwt.encode(claims, SECRET, algorithm="HS256")
+    assert codec.decode(jose_token) == {"username": "bob", "password": "pw", "exp": int(expire.timestamp())}
+    assert codec.decode(token)["exp"] == int(expire.timestamp())
+
+
+def test_rejects_bad_tokens():
+    codec = HS256Codec(SECRET)
+    token = codec.encode({"username": "bob"})
+    header, payload, signature = token.split(".")
+
+    with pytest.raises(InvalidTokenError):
+        HS256Codec("other-secret").decode(token)
+    with pytest.raises(InvalidTokenError):
+        codec.decode(f"{header}.{b64url_encode(b'{\"username\":\"eve\"}').decode()}.{signature}")
+    none_header = b64url_encode(b'{"alg":"none","typ":"JWT"}').decode()
+    with pytest.raises(InvalidTokenError):
+        codec.decode(f"{none_header}.{payload}.")
+    for garbage in ("", "abc", "a.b.c", "...."):
+        with pytest.raises(InvalidTokenError):
+            codec.decode(garbage)
+
+
+def test_expiry_is_checked_also_for_cached_tokens():
+    codec = HS256Codec(SECRET)
+    now = time.time()
+    token = codec.encode({"username": "bob", "exp": int(now) + 10})
+
+    codec.decode(token, now=now)
+    codec.decode(token, now=now)
+    assert (codec.hits, codec.misses) == (1, 1)
+
+    # запись в кеше живёт не дольше exp самого токена
+    with pytest.raises(TokenExpiredError):
+        codec.decode(token, now=now + 11)
+    assert codec.snapshot()["cached"] == 0
+    with pytest.raises(TokenExpiredError):
+        codec.decode(codec.encode({"username": "bob", "nbf": int(now) + 60}), now=now)
+
+
+def test_cache_is_bounded():
+    codec = HS256Codec(SECRET, cache_size=2)
+    tokens = [codec.encode({"username": f"user{i}"}) for i in range(3)]
+    for token in tokens:
+        codec.decode(token)
+    assert codec.snapshot()["cached"] == 2
+    codec.decode(tokens[0])
+    assert codec.hits == 0
+
+
+def test_verify_jwt_token_errors():
+    from fastapi import HTTPException
+
+    from api.auth import create_jwt_token, verify_jwt_token
+
+    token = create_jwt_token({"username": "bob", "password": "pw"})
+    assert verify_jwt_token(token) == ("bob", "pw")
+
+    expired = create_jwt_token({"username": "bob", "password": "pw"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException) as ex:
+        verify_jwt_token(expired)
+    assert ex.value.detail == "Token is expired"
+    for bad in (None, "garbage", create_jwt_token({"username": "bob"})):
+        with pytest.raises(HTTPException) as ex:
+            verify_jwt_token(bad)  # type: ignore[arg-type]
+        assert ex.value.status_code == 401
@@ -0,0 +1,10 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_app_starts_twice():
+    # задачи и событие остановки создаются заново при каждом запуске
+    for _ in range(2):
+        with TestClient(main.app) as client:
+            assert client.get("/healthz").json() == {"status": "ok"}
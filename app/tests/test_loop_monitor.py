@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from monitoring.loop_monitor import LagHistogram, LoopLagMonitor
+
+
+def blocking_call(seconds: float) -> None:
+    # синхронная работа в цикле событий, как bcrypt в обработчике
+    time.sleep(seconds)
+
+
+def test_histogram_buckets():
+    histogram = LagHistogram()
+    for value in (0.5, 3, 3, 120, 9000):
+        histogram.observe(value)
+    buckets = histogram.snapshot()["buckets"]
+    assert buckets["le_1"] == 1
+    assert buckets["le_5"] == 2
+    assert buckets["le_250"] == 1
+    assert buckets["le_inf"] == 1
+    assert histogram.max_ms == 9000
+
+
+def test_recent_lag_window():
+    monitor = LoopLagMonitor(interval=0.1, window=10)
+    monitor.record(5)
+    monitor.record(80)
+    monitor.record(1)
+    assert monitor.recent_lag_ms() == 80
+    # старые измерения за пределами окна не учитываются
+    monitor._samples[1] = (time.monotonic() - 60, 80)
+    assert monitor.recent_lag_ms() == 5
+
+
+@pytest.mark.asyncio
+async def test_watchdog_captures_blocking_stack():
+    monitor = LoopLagMonitor(interval=0.01, block_threshold_ms=50)
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(monitor.run(stop_event))
+    await asyncio.sleep(0.05)
+
+    blocking_call(0.2)
+    await asyncio.sleep(0.05)
+    stop_event.set()
+    await asyncio.wait_for(task, 2)
+
+    # одна блокировка — один захваченный стек
+    assert monitor.blocks == 1
+    stack = "".join(monitor.recent_blocks[0]["stack"])
+    assert "blocking_call" in stack
+    assert monitor.histogram.max_ms >= 150
+    assert monitor.recent_lag_ms() >= 150
+    assert monitor.snapshot()["recent_blocks"][0]["stalled_ms"] >= 50
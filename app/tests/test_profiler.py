@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from middleware.profiling import ProfilingMiddleware
+from monitoring.profiler import SamplingProfiler
+
+
+def busy_wait(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def slow(request):
+    # блокирует цикл событий, как медленный синхронный код в обработчике
+    busy_wait(0.05)
+    return PlainTextResponse("slow")
+
+
+async def waiting(request):
+    # ждёт ввода-вывода, не занимая цикл событий
+    await asyncio.sleep(0.05)
+    return PlainTextResponse("waiting")
+
+
+async def fast(request):
+    return PlainTextResponse("fast")
+
+
+def make_client(profiler: SamplingProfiler, **kwargs) -> httpx.AsyncClient:
+    app = ProfilingMiddleware(
+        Starlette(routes=[Route("/slow", slow), Route("/waiting", waiting), Route("/fast", fast)]), profiler=profiler, **kwargs
+    )
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_only_requests_with_secret_are_profiled(tmp_path):
+    profiler = SamplingProfiler(interval_ms=1, threshold_ms=20, directory=tmp_path, keep=10)
+    async with make_client(profiler, secret="s3cret") as client:
+        await client.get("/slow")
+        await client.get("/slow", headers={"X-Profile": "wrong"})
+        assert profiler.profiled == 0
+
+        await client.get("/slow", headers={"X-Profile": "s3cret"})
+        # быстрый запрос профилируется, но не сохраняется
+        await client.get("/fast", headers={"X-Profile": "s3cret"})
+
+    assert profiler.profiled == 2
+    files = list(tmp_path.glob("*.collapsed"))
+    assert len(files) == 1
+    assert "-GET-slow-" in files[0].name
+    lines = files[0].read_text().splitlines()
+    assert any("busy_wait" in line for line in lines)
+    # формат collapsed stack: "a;b;c count"
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+@pytest.mark.asyncio
+async def test_awaiting_request_is_profiled(tmp_path):
+    profiler = SamplingProfiler(interval_ms=1, threshold_ms=20, directory=tmp_path, keep=10)
+    async with make_client(profiler, always=True) as client:
+        await client.get("/waiting")
+
+    files = list(tmp_path.glob("*.collapsed"))
+    assert len(files) == 1
+    stacks = [line.rsplit(" ", 1)[0] for line in files[0].read_text().splitlines()]
+    # время ожидания приписано обработчику, на котором запрос остановился
+    assert any("waiting (test_profiler.py" in stack and stack.endswith(";<awaiting>") for stack in stacks)
+
+
+@pytest.mark.asyncio
+async def test_retention_and_sampler_stops(tmp_path):
+    profiler = SamplingProfiler(interval_ms=1, threshold_ms=20, directory=tmp_path, keep=2)
+    async with make_client(profiler, always=True) as client:
+        for _ in range(3):
+            await client.get("/slow")
+
+    assert profiler.saved == 3
+    assert len(list(tmp_path.glob("*.collapsed"))) == 2
+
+    # без профилируемых запросов поток сэмплирования завершается
+    for _ in range(100):
+        if profiler._thread is None:
+            break
+        await asyncio.sleep(0.01)
+    assert profiler._thread is None
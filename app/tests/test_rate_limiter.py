@@ -0,0 +1,79 @@
+import pytest
+
+from db.db import DatabaseSessionManager
+from db.models.rate_limit import RateLimitBucketORM
+from domain.exceptions import RateLimitExceededError
+from repositories.rate_limit_repo import SQLRateLimitBackend
+from services.rate_limiter import InMemoryRateLimitBackend, RateLimiter, RateLimitRule
+
+# 2 запроса подряд, затем 1 запрос в секунду
+RULE = RateLimitRule(burst=2, per_minute=60)
+
+
+@pytest.fixture
+async def sql_backend(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/rate.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(RateLimitBucketORM.__table__.create)
+    yield SQLRateLimitBackend(manager)
+    await manager.close()
+
+
+@pytest.fixture(params=["memory", "sql"])
+def backend(request, sql_backend):
+    if request.param == "memory":
+        return InMemoryRateLimitBackend(max_keys=100)
+    return sql_backend
+
+
+@pytest.mark.asyncio
+async def test_token_bucket(backend):
+    now = 1000.0
+    assert await backend.take("k", RULE, now) == 0
+    assert await backend.take("k", RULE, now) == 0
+    assert await backend.take("k", RULE, now) == pytest.approx(1.0)
+    # другой ключ не затронут
+    assert await backend.take("other", RULE, now) == 0
+    # через секунду появляется один токен
+    assert await backend.take("k", RULE, now + 1) == 0
+    assert await backend.take("k", RULE, now + 1) > 0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        await backend.take(key, RULE, 1000.0)
+    assert len(backend) == 2
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_sweeps_expired():
+    backend = InMemoryRateLimitBackend(max_keys=100)
+    for key in ("a", "b", "c"):
+        await backend.take(key, RULE, 1000.0)
+    # старые корзины уже полные и убираются при следующем take
+    await backend.take("d", RULE, 2000.0)
+    assert len(backend) == 1
+
+
+@pytest.mark.asyncio
+async def test_sql_backend_purge(sql_backend):
+    await sql_backend.take("k", RULE, 1000.0)
+    assert await sql_backend.purge(now=999.0) == 0
+    assert await sql_backend.purge(now=1002.0) == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_by_username():
+    limiter = RateLimiter(
+        InMemoryRateLimitBackend(max_keys=100),
+        ip_rule=RateLimitRule(burst=100, per_minute=60),
+        username_rule=RateLimitRule(burst=1, per_minute=1),
+    )
+    await limiter.check("login", ip="10.0.0.1", username="Bob")
+    with pytest.raises(RateLimitExceededError) as ex:
+        # тот же пользователь с другого адреса
+        await limiter.check("login", ip="10.0.0.2", username="bob")
+    assert ex.value.retry_after > 0
+    await limiter.check("signup", ip="10.0.0.2", username="bob")
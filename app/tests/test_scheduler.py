@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from tasks.scheduler import CronSchedule, Scheduler
+
+
+def test_cron_next_after():
+    every_15 = CronSchedule("*/15 * * * *")
+    assert every_15.next_after(datetime(2025, 1, 1, 10, 7)) == datetime(2025, 1, 1, 10, 15)
+    assert every_15.next_after(datetime(2025, 1, 1, 10, 45)) == datetime(2025, 1, 1, 11, 0)
+
+    nightly = CronSchedule("30 3 * * *")
+    assert nightly.next_after(datetime(2025, 1, 1, 4, 0)) == datetime(2025, 1, 2, 3, 30)
+
+    # 1 марта 2025 — суббота
+    mondays = CronSchedule("0 9 * * 1")
+    assert mondays.next_after(datetime(2025, 3, 1, 12, 0)) == datetime(2025, 3, 3, 9, 0)
+
+    yearly = CronSchedule("0 0 1 1 *")
+    assert yearly.next_after(datetime(2025, 6, 1)) == datetime(2026, 1, 1)
+
+
+@pytest.mark.parametrize("expression", ["* * *", "60 * * * *", "*/0 * * * *", "5-1 * * * *"])
+def test_cron_invalid(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_and_failures_are_isolated():
+    scheduler = Scheduler()
+    calls = []
+
+    async def ok():
+        calls.append("ok")
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    scheduler.add_job("ok", ok, interval=0.01, run_at_start=True)
+    scheduler.add_job("broken", broken, interval=0.01)
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(scheduler.run(stop_event))
+    await asyncio.sleep(0.08)
+    stop_event.set()
+    await asyncio.wait_for(task, 1)
+
+    snapshot = scheduler.snapshot()
+    assert snapshot["ok"]["runs"] >= 2
+    assert snapshot["ok"]["failures"] == 0
+    assert snapshot["broken"]["failures"] == snapshot["broken"]["runs"] >= 1
+    assert "boom" in snapshot["broken"]["last_error"]
+
+
+@pytest.mark.asyncio
+async def test_overlapping_runs_are_skipped_and_shutdown_cancels():
+    scheduler = Scheduler(shutdown_timeout=0.05)
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    scheduler.add_job("slow", slow, interval=0.01, run_at_start=True)
+    stop_event = asyncio.Event()
+    task = asyncio.create_task(scheduler.run(stop_event))
+    await asyncio.sleep(0.05)
+    stop_event.set()
+    await asyncio.wait_for(task, 1)
+
+    stats = scheduler.jobs["slow"].stats
+    assert stats.skipped >= 1
+    assert stats.runs == 1
+    assert stats.last_error == "cancelled"
+    assert stats.running == 0
+
+
+def test_add_job_validation():
+    scheduler = Scheduler()
+
+    async def job():
+        pass
+
+    with pytest.raises(ValueError):
+        scheduler.add_job("both", job, interval=1, cron="* * * * *")
+    scheduler.add_job("job", job, cron="* * * * *")
+    with pytest.raises(ValueError):
+        scheduler.add_job("job", job, interval=1)
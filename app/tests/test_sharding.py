@@ -0,0 +1,157 @@
+from datetime import UTC, datetime
+
+import pytest
+from sqlalchemy import select
+
+from db.db import DatabaseSessionManager
+from db.migrations import current_revisions, upgrade_if_needed
+from db.models.user import UserORM
+from db.sharding import shard_index, to_local_id
+from domain.domain_user import DomainUser
+from repositories.interfaces import Filter, Op, OrderBy
+from repositories.sqlalchemy_repo import CountMixin, ListMixin
+from repositories.user_repo import UserSQLAlchemyRepo
+from repositories.write_behind import WriteBehindBuffer
+
+USERNAMES = [f"user{i}" for i in range(12)]
+
+
+class ShardedUserListRepo(ListMixin[DomainUser, UserORM], CountMixin[DomainUser, UserORM]):
+    shard_key = "username"
+
+
+@pytest.fixture
+async def manager(tmp_path):
+    manager = DatabaseSessionManager([f"sqlite+aiosqlite:///{tmp_path}/shard{i}.sqlite3" for i in range(3)])
+    for shard in range(manager.shard_count):
+        async with manager.connect(shard) as connection:
+            await connection.run_sync(UserORM.__table__.create)
+    yield manager
+    await manager.close()
+
+
+async def create_users(manager):
+    async with manager.sharded_session() as shards:
+        repo = UserSQLAlchemyRepo(shards, DomainUser, UserORM)
+        return [await repo.create({"username": name, "hashed_password": "x"}) for name in USERNAMES]
+
+
+async def usernames_on(manager, shard):
+    async with manager.session(shard) as session:
+        return set((await session.execute(select(UserORM.username))).scalars())
+
+
+def test_shard_index_is_stable():
+    assert shard_index("alice", 1) == 0
+    # blake2b, а не hash(): значение одинаково в любом процессе
+    assert shard_index("alice", 3) == 1
+    assert shard_index("alice", 8) == 1
+    assert len({shard_index(name, 3) for name in USERNAMES}) == 3
+
+
+@pytest.mark.asyncio
+async def test_rows_are_routed_by_username(manager):
+    users = await create_users(manager)
+
+    for shard in range(3):
+        assert await usernames_on(manager, shard) == {name for name in USERNAMES if shard_index(name, 3) == shard}
+    # глобальные id уникальны и указывают на шард строки
+    assert len({user.id for user in users}) == len(users)
+    for user in users:
+        assert to_local_id(user.id, 3)[0] == shard_index(user.username, 3)
+
+
+@pytest.mark.asyncio
+async def test_single_shard_reads_and_fan_out(manager):
+    users = await create_users(manager)
+    by_name = {user.username: user for user in users}
+
+    async with manager.sharded_session() as shards:
+        repo = UserSQLAlchemyRepo(shards, DomainUser, UserORM)
+        user = await repo.read(filters={"username": "user5"})
+        assert user == by_name["user5"]
+        # известен ключ шарда: открыта сессия только одного шарда
+        assert len(shards._sessions) == 1
+
+        assert (await repo.read(filters={"id": by_name["user7"].id})).username == "user7"
+        assert await repo.exists("user3")
+        assert not await repo.exists("nobody")
+
+    async with manager.sharded_session() as shards:
+        repo = UserSQLAlchemyRepo(shards, DomainUser, UserORM)
+        found = await repo.read(filters=[Filter("username", Op.PREFIX, "user11")])
+        assert found.username == "user11"
+        assert len(shards._sessions) == 3
+
+
+@pytest.mark.asyncio
+async def test_list_and_count_merge_shards(manager):
+    users = await create_users(manager)
+    ids = sorted(user.id for user in users)
+
+    async with manager.sharded_session() as shards:
+        repo = ShardedUserListRepo(shards, DomainUser, UserORM)
+        assert await repo.count() == len(USERNAMES)
+        assert await repo.count([Filter("username", Op.IN, ["user1", "user2", "nobody"])]) == 2
+
+        page = await repo.list(order_by=[OrderBy("id", descending=True)], limit=4, offset=2)
+        assert [user.id for user in page] == ids[::-1][2:6]
+
+        after = await repo.list(filters=[Filter("id", Op.GT, ids[5])], order_by=[OrderBy("id")])
+        assert [user.id for user in after] == ids[6:]
+
+        partial = await repo.list(fields=["id", "username"], order_by=[OrderBy("username")])
+        assert [user.username for user in partial] == sorted(USERNAMES)
+        assert {user.id for user in partial} == set(ids)
+
+        records = await repo.list(order_by=[OrderBy("id")], compact=True)
+        assert [record.id for record in records] == ids
+
+
+@pytest.mark.asyncio
+async def test_search_merges_shards(manager):
+    users = await create_users(manager)
+    by_name = {user.username: user for user in users}
+
+    async with manager.sharded_session() as shards:
+        repo = UserSQLAlchemyRepo(shards, DomainUser, UserORM)
+        found = await repo.search("USER1")
+        assert [user.username for user in found] == ["user1", "user10", "user11"]
+        # глобальные id, как у созданных пользователей
+        assert [user.id for user in found] == [by_name[user.username].id for user in found]
+
+        page = await repo.search("user", limit=3, offset=3)
+        assert [user.username for user in page] == sorted(USERNAMES)[3:6]
+
+
+@pytest.mark.asyncio
+async def test_update_and_activity_go_to_the_owning_shard(manager):
+    users = await create_users(manager)
+    target = users[4]
+
+    async with manager.sharded_session() as shards:
+        repo = UserSQLAlchemyRepo(shards, DomainUser, UserORM)
+        updated = await repo.update({"hashed_password": "y"}, filters={"username": target.username})
+        assert [user.id for user in updated] == [target.id]
+
+    buffer = WriteBehindBuffer(manager, UserORM, sharded=True)
+    seen = datetime(2025, 1, 1, tzinfo=UTC)
+    buffer.record(target.id, last_seen_at=seen)
+    assert await buffer.flush() == 1
+
+    async with manager.sharded_session() as shards:
+        user = await UserSQLAlchemyRepo(shards, DomainUser, UserORM).read(filters={"username": target.username})
+        assert user.hashed_password == "y"
+        assert user.last_seen_at is not None
+
+
+@pytest.mark.asyncio
+async def test_migrations_run_on_every_shard(tmp_path):
+    manager = DatabaseSessionManager([f"sqlite+aiosqlite:///{tmp_path}/m{i}.sqlite3" for i in range(2)])
+    try:
+        assert await upgrade_if_needed(manager) is True
+        heads = await current_revisions(manager, 0)
+        assert heads and await current_revisions(manager, 1) == heads
+        assert await upgrade_if_needed(manager) is False
+    finally:
+        await manager.close()
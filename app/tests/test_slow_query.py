@@ -0,0 +1,79 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
+from domain.domain_user import DomainUser
+from monitoring.slow_query import QueryStats, SlowQueryLog, normalize_sql, parameter_shape
+from repositories.user_repo import UserSQLAlchemyRepo
+
+
+def test_normalize_sql():
+    sql = normalize_sql("SELECT users.id\n  FROM users WHERE users.username = 'bob' AND users.id IN (?, ?, ?) LIMIT 10")
+    assert sql == "SELECT users.id FROM users WHERE users.username = ? AND users.id IN (...) LIMIT ?"
+    # имена с цифрами и плейсхолдеры asyncpg не трогаем
+    assert normalize_sql("SELECT users_1.id FROM users AS users_1 WHERE id = $1") == (
+        "SELECT users_1.id FROM users AS users_1 WHERE id = $1"
+    )
+
+
+def test_parameter_shape_hides_values():
+    assert parameter_shape(("bob", 1), False) == "(str, int)"
+    assert parameter_shape({"username": "bob"}, False) == "{username: str}"
+    assert parameter_shape([("a", 1), ("b", 2)], True) == "2 x (str, int)"
+
+
+@pytest.fixture
+async def log(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path}/slow.sqlite3"
+    setup = DatabaseSessionManager(url)
+    async with setup.connect() as connection:
+        await connection.run_sync(UserORM.__table__.create)
+    await setup.close()
+
+    log = SlowQueryLog(threshold_ms=0, log_per_minute=2)
+    log.manager = DatabaseSessionManager(url, slow_query_log=log)  # type: ignore[attr-defined]
+    yield log
+    await log.manager.close()  # type: ignore[attr-defined]
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_are_logged_with_caller(log, caplog):
+    caplog.set_level(logging.WARNING, logger="monitoring.slow_query")
+    async with log.manager.session() as session:
+        repo = UserSQLAlchemyRepo(session, DomainUser, UserORM)
+        await repo.create({"username": "bob", "hashed_password": "secret-hash"})
+        for _ in range(3):
+            await repo.exists("bob")
+
+    # create — это SAVEPOINT, INSERT и RELEASE
+    assert log.slow == 6
+    records = [r.getMessage() for r in caplog.records if r.name == "monitoring.slow_query"]
+    # не больше двух строк в минуту, остальное только считается
+    assert len(records) == 2
+    assert log.suppressed == 4
+    assert "repositories.sqlalchemy_repo.CreateMixin.create: SAVEPOINT" in records[0]
+    assert "repositories.sqlalchemy_repo.CreateMixin.create: INSERT" in records[1]
+    # значения параметров в лог не попадают
+    assert "secret-hash" not in "".join(records) and "(str, str)" in records[1]
+
+    top = log.snapshot()["top"]
+    exists = next(item for item in top if item["caller"].endswith("exists"))
+    assert exists["count"] == 3
+
+
+def test_explain_only_for_repeated_postgres_selects():
+    log = SlowQueryLog(explain=True, explain_after=2, explain_sample_rate=1.0)
+    engine = object()
+    log._engines[engine] = object()  # type: ignore[index]
+    pg = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), engine=engine)
+    sqlite = SimpleNamespace(dialect=SimpleNamespace(name="sqlite"), engine=engine)
+
+    assert not log._should_explain(pg, "SELECT 1", QueryStats("SELECT ?", count=1))
+    assert log._should_explain(pg, "SELECT 1", QueryStats("SELECT ?", count=2))
+    assert not log._should_explain(pg, "UPDATE users SET x = 1", QueryStats("UPDATE", count=5))
+    assert not log._should_explain(sqlite, "SELECT 1", QueryStats("SELECT ?", count=5))
+    # повторный EXPLAIN того же запроса не раньше explain_interval
+    assert not log._should_explain(pg, "SELECT 1", QueryStats("SELECT ?", count=5, explained_at=1e18))
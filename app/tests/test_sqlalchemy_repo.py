@@ -1,12 +1,14 @@
 import pytest
 
-from sqlalchemy import Integer, String, select, delete
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, func, select, delete
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from conftest import Base
-from repositories.sqlalchemy_repo import CreateMixin, ReadMixin, ListMixin, UpdateMixin, DeleteMixin, CountMixin
-from domain.exceptions import NotFoundError, DoubleFoundError
+from repositories.interfaces import Filter, Op, OrderBy
+from repositories.sqlalchemy_repo import indexed_columns, prefix_indexed_columns, IndexPolicy, CreateMixin, ReadMixin, ListMixin, UpdateMixin, DeleteMixin, CountMixin
+from db.models.base_model import VersionedMixin
+from domain.exceptions import ConcurrentUpdateError, NotFoundError, DoubleFoundError, RepositoryException, UnindexedQueryError
 from domain.base_domain_model import BaseDomainModel
 
 # Определяем фиктивную ORM-модель, используя Base из conftest.py,
@@ -16,6 +18,12 @@ class DummyORM(Base):
     id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name:Mapped[str] = mapped_column(String)
 
+
+class DummyUniqueORM(Base):
+    __tablename__ = "dummy_unique"
+    id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name:Mapped[str] = mapped_column(String, unique=True)
+
 # Фиктивная доменная модель с методом model_validate, используемая миксинами.
 class DummyDomain(BaseDomainModel):
     id: int
@@ -101,6 +109,21 @@ async def test_update(async_session: AsyncSession):
     read_obj = await repo.read(filters={"id": domain_obj.id})
     assert read_obj.name == "new_name"
 
+@pytest.mark.asyncio
+async def test_update_savepoint_keeps_transaction(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyRepo(async_session)
+    kept = await repo.create({"name": "kept"})
+    other = await repo.create({"name": "other"})
+
+    # NOT NULL нарушается сразу, но откатывается только до точки сохранения
+    with pytest.raises(RepositoryException):
+        await repo.update({"name": None}, filters={"id": other.id}, savepoint=True)
+    await repo.update({"name": "renamed"}, filters={"id": other.id})
+    await async_session.commit()
+    assert (await repo.read(filters={"id": kept.id})).name == "kept"
+    assert (await repo.read(filters={"id": other.id})).name == "renamed"
+
 @pytest.mark.asyncio
 async def test_delete(async_session: AsyncSession):
     await clear_table(async_session)
@@ -137,3 +160,217 @@ async def test_count(async_session: AsyncSession):
 
     count2 = await repo.count()
     assert count2 == 2
+
+@pytest.mark.asyncio
+async def test_read_and_list_fields(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyRepo(async_session)
+    created = await repo.create({"name": "projected"})
+
+    partial = await repo.read(filters={"id": created.id}, fields=["name"])
+    assert partial.name == "projected"
+    assert partial.model_fields_set == {"name"}
+
+    listed = await repo.list(fields=["id"])
+    assert [d.id for d in listed] == [created.id]
+    assert listed[0].model_fields_set == {"id"}
+
+    with pytest.raises(RepositoryException):
+        await repo.read(filters={"id": created.id}, fields=["nope"])
+
+
+@pytest.mark.asyncio
+async def test_filter_expressions(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyRepo(async_session)
+    for name in ("alpha", "alps", "beta", "a%b"):
+        await repo.create({"name": name})
+
+    async def names(*filters: Filter) -> list[str]:
+        rows = await repo.list(filters=list(filters), order_by=[OrderBy("name")])
+        return [d.name for d in rows]
+
+    assert await names(Filter("name", Op.PREFIX, "alp")) == ["alpha", "alps"]
+    # `%` в префиксе экранируется и не работает как шаблон
+    assert await names(Filter("name", Op.PREFIX, "a%")) == ["a%b"]
+    assert await names(Filter("name", Op.IN, ["beta", "alps"])) == ["alps", "beta"]
+    assert await names(Filter("name", Op.NOT_IN, ["beta", "alps"])) == ["a%b", "alpha"]
+    assert await names(Filter("name", Op.GE, "b")) == ["beta"]
+    assert await names(Filter("name", Op.NE, "beta"), Filter("name", Op.LT, "alps")) == ["a%b", "alpha"]
+    assert await names(Filter("name", Op.IS_NULL, False)) == ["a%b", "alpha", "alps", "beta"]
+    assert await repo.count([Filter("name", Op.PREFIX, "al")]) == 2
+
+
+@pytest.mark.asyncio
+async def test_list_order_limit_offset(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyRepo(async_session)
+    for name in ("a", "b", "c", "d"):
+        await repo.create({"name": name})
+
+    page = await repo.list(order_by=[OrderBy("id", descending=True)], limit=2, offset=1)
+    assert [d.name for d in page] == ["c", "b"]
+
+    with pytest.raises(RepositoryException):
+        await repo.list(filters=[Filter("nope", Op.EQ, 1)])
+
+
+@pytest.mark.asyncio
+async def test_index_policy(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyRepo(async_session)
+    repo.index_policy = IndexPolicy.REJECT
+    await repo.create({"name": "x"})
+
+    # фильтр по первичному ключу поддержан индексом
+    assert await repo.count([Filter("id", Op.GE, 0), Filter("name", Op.EQ, "x")]) == 1
+    assert len(await repo.list(order_by=[OrderBy("id")], limit=10)) == 1
+
+    # `name` не индексирован, а `!=` не использует индекс
+    with pytest.raises(UnindexedQueryError):
+        await repo.list(filters={"name": "x"})
+    with pytest.raises(UnindexedQueryError):
+        await repo.list(filters=[Filter("id", Op.NE, 1)])
+    with pytest.raises(UnindexedQueryError):
+        await repo.list(order_by=[OrderBy("name")])
+
+
+def test_prefix_indexed_columns():
+    table = Table(
+        "prefixes", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("plain", String),
+        Column("collated", String),
+        Column("pattern", String),
+        Column("c_column", String(collation="C"), unique=True),
+        Column("lowered", String),
+    )
+    Index("ix_plain", table.c.plain)
+    Index("ix_collated", table.c.collated.collate("C"))
+    Index("ix_pattern", table.c.pattern, postgresql_ops={"pattern": "varchar_pattern_ops"})
+    Index("ix_lowered", func.lower(table.c.lowered))
+
+    # индекс по выражению не даёт ведущей колонки
+    assert indexed_columns(table) == {"id", "plain", "pattern", "c_column"}
+    # LIKE 'x%' на Postgres обслуживают только индексы с побайтовым сравнением
+    assert prefix_indexed_columns(table) == {"collated", "pattern", "c_column"}
+
+
+class DummyUniqueRepo(CreateMixin[DummyDomain, DummyUniqueORM], ReadMixin[DummyDomain, DummyUniqueORM]):
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, DummyDomain, DummyUniqueORM)
+
+
+@pytest.mark.asyncio
+async def test_create_on_conflict(async_session: AsyncSession):
+    await async_session.execute(delete(DummyUniqueORM))
+    repo = DummyUniqueRepo(async_session)
+
+    created = await repo.create_if_absent({"name": "uniq"}, conflict_columns=["name"])
+    assert created is not None and created.name == "uniq"
+    # повторная вставка не падает, а возвращает None
+    assert await repo.create_if_absent({"name": "uniq"}, conflict_columns=["name"]) is None
+
+    # обычный create превращает нарушение уникальности в DoubleFoundError
+    with pytest.raises(DoubleFoundError):
+        await repo.create({"name": "uniq"})
+    # откатывается только точка сохранения, транзакция продолжается
+    assert (await repo.create({"name": "other"})).name == "other"
+    # NOT NULL — не дубликат
+    with pytest.raises(RepositoryException) as excinfo:
+        await repo.create({"name": None})
+    assert not isinstance(excinfo.value, DoubleFoundError)
+    await async_session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_upsert(async_session: AsyncSession):
+    await async_session.execute(delete(DummyUniqueORM))
+    repo = DummyUniqueRepo(async_session)
+
+    first = await repo.upsert({"id": 1, "name": "v1"}, conflict_columns=["id"])
+    second = await repo.upsert({"id": 1, "name": "v2"}, conflict_columns=["id"])
+    assert second.id == first.id
+    assert second.name == "v2"
+    assert (await repo.read(filters={"id": 1})).name == "v2"
+
+
+class DummyVersionedORM(Base, VersionedMixin):
+    __tablename__ = "dummy_versioned"
+    id:Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name:Mapped[str] = mapped_column(String, unique=True)
+
+
+class DummyVersionedDomain(BaseDomainModel):
+    id: int
+    name: str
+    version: int
+
+
+class DummyVersionedRepo(
+    CreateMixin[DummyVersionedDomain, DummyVersionedORM],
+    ReadMixin[DummyVersionedDomain, DummyVersionedORM],
+    UpdateMixin[DummyVersionedDomain, DummyVersionedORM],
+):
+    def __init__(self, db: AsyncSession):
+        super().__init__(db, DummyVersionedDomain, DummyVersionedORM)
+
+
+@pytest.mark.asyncio
+async def test_update_if_version(async_session: AsyncSession):
+    await async_session.execute(delete(DummyVersionedORM))
+    repo = DummyVersionedRepo(async_session)
+    created = await repo.create({"name": "v1"})
+    assert created.version == 1
+
+    updated = await repo.update_if_version(created.id, created.version, {"name": "v2"})
+    assert (updated.name, updated.version) == ("v2", 2)
+
+    # запись с устаревшей версией не перезаписывает чужое изменение
+    with pytest.raises(ConcurrentUpdateError):
+        await repo.update_if_version(created.id, created.version, {"name": "stale"})
+    read_obj = await repo.read(filters={"id": created.id})
+    assert (read_obj.name, read_obj.version) == ("v2", 2)
+
+    # обычный update тоже увеличивает версию
+    [bumped] = await repo.update({"name": "v3"}, filters={"id": created.id})
+    assert bumped.version == 3
+    with pytest.raises(ConcurrentUpdateError):
+        await repo.update_if_version(created.id, 2, {"name": "stale"})
+
+
+@pytest.mark.asyncio
+async def test_update_if_version_savepoint_keeps_transaction(async_session: AsyncSession):
+    await async_session.execute(delete(DummyVersionedORM))
+    repo = DummyVersionedRepo(async_session)
+    first = await repo.create({"name": "first"})
+    second = await repo.create({"name": "second"})
+
+    # нарушение уникальности откатывается только до точки сохранения
+    with pytest.raises(RepositoryException):
+        await repo.update_if_version(second.id, second.version, {"name": "first"}, savepoint=True)
+    updated = await repo.update_if_version(second.id, second.version, {"name": "third"})
+    await async_session.commit()
+    assert (await repo.read(filters={"id": first.id})).name == "first"
+    assert (updated.name, updated.version) == ("third", 2)
+
+
+@pytest.mark.asyncio
+async def test_update_if_version_returns_fields(async_session: AsyncSession):
+    await async_session.execute(delete(DummyVersionedORM))
+    repo = DummyVersionedRepo(async_session)
+    created = await repo.create({"name": "full"})
+    loaded = (await async_session.execute(select(DummyVersionedORM))).scalar_one()
+
+    # RETURNING только запрошенных колонок, объект частичный
+    partial = await repo.update_if_version(created.id, created.version, {"name": "partial"}, fields=["version"])
+    assert partial.model_dump(exclude_unset=True) == {"version": 2}
+    # загруженный в сессию объект тоже видит новую версию
+    assert (loaded.name, loaded.version) == ("partial", 2)
+
+
+@pytest.mark.asyncio
+async def test_update_if_version_requires_version_column(async_session: AsyncSession):
+    repo = DummyRepo(async_session)
+    with pytest.raises(RepositoryException):
+        await repo.update_if_version(1, 1, {"name": "x"})
@@ -0,0 +1,38 @@
+import pytest
+
+from db.db import DatabaseSessionManager
+from db.migrations import current_revisions, upgrade_if_needed
+from db.wait_for_db import DatabaseUnavailableError, wait_for_db
+
+
+@pytest.mark.asyncio
+async def test_wait_for_db_ready():
+    manager = DatabaseSessionManager("sqlite+aiosqlite:///:memory:")
+    try:
+        assert await wait_for_db(manager, timeout=1) == 1
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_wait_for_db_gives_up(tmp_path):
+    # каталога не существует, поэтому подключение всегда падает
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/missing/db.sqlite3")
+    try:
+        with pytest.raises(DatabaseUnavailableError):
+            await wait_for_db(manager, timeout=0.2, initial_delay=0.01, max_delay=0.05)
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_upgrade_if_needed_skips_at_head(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite3")
+    try:
+        assert await current_revisions(manager) == set()
+        assert await upgrade_if_needed(manager) is True
+        assert await current_revisions(manager) != set()
+        # второй запуск ничего не делает
+        assert await upgrade_if_needed(manager) is False
+    finally:
+        await manager.close()
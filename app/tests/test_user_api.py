@@ -1,4 +1,4 @@
-from typing import cast
+from typing import Any, cast
 
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
@@ -7,6 +7,7 @@ from domain.domain_user import DomainUser
 from domain.exceptions import DoubleFoundError, NotFoundError, RepositoryException
 from api.auth import check_token
 from services.user_service import UserService
+from services.rate_limiter import InMemoryRateLimitBackend, RateLimiter, RateLimitRule
 from api.v1 import user_router
 
 # Фиктивная реализация UserService для тестирования роутера
@@ -18,7 +19,7 @@ class FakeUserService():
         # Иначе возвращаем созданного пользователя
         return DomainUser(id=1, username=data["username"], hashed_password="fake_hashed")
 
-    async def verify_password(self, username: str, password: str) -> DomainUser:
+    async def verify_password(self, username: str, password: str, batch: bool = False) -> DomainUser:
         # Если имя "notfound", симулируем ошибку репозитория
         if username == "notfound":
             raise RepositoryException("User not found")
@@ -27,13 +28,27 @@ class FakeUserService():
             raise NotFoundError("Wrong password")
         return DomainUser(id=1, username=username, hashed_password="fake_hashed")
 
-    async def update_password(self, username: str, old_password: str, new_password: str) -> DomainUser:
+    async def update_password(
+        self, username: str, old_password: str, new_password: str, fields: tuple[str, ...] | None = None
+    ) -> DomainUser:
         # Если старый пароль неверный, генерируем RepositoryException
         if old_password != "oldsecret":
             raise RepositoryException("Wrong old password")
+        # Запрошенные поля доходят до сервиса, а не только до сериализации
+        if fields:
+            values: dict[str, Any] = {"id": 1, "username": username}
+            return DomainUser.model_construct(**{name: values[name] for name in fields})
         # Иначе возвращаем пользователя с обновленным хешем
         return DomainUser(id=1, username=username, hashed_password="new_fake_hashed")
 
+    async def search(self, query: str, mode: str = "prefix", limit: int = 20, offset: int = 0) -> list[DomainUser]:
+        users = [
+            DomainUser.model_construct(id=i, username=f"user{i}")
+            for i in range(5)
+            if f"user{i}".startswith(query) or mode == "contains" and query in f"user{i}"
+        ]
+        return users[offset:offset + limit]
+
 # Создаем приложение FastAPI и подключаем роутер
 app = FastAPI()
 app.include_router(user_router.router)
@@ -87,6 +102,35 @@ def test_read_user_success():
     data = response.json()
     assert data["id"] == 1
 
+def test_read_user_etag():
+    response = client.get("/users/1")
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    not_modified = client.get("/users/1", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    assert client.get("/users/1", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_read_user_fields():
+    response = client.get("/users/1", params={"fields": "username"})
+    assert response.status_code == 200
+    assert response.json() == {"username": "test"}
+    assert "etag" in response.headers
+    # ETag зависит от набора полей
+    assert response.headers["etag"] != client.get("/users/1").headers["etag"]
+
+    response = client.get("/users/1", params={"fields": "username,hashed_password"})
+    assert response.status_code == 422
+
+def test_update_password_fields():
+    payload = {"old_password": "oldsecret", "new_password": "newsecret"}
+    response = client.post("/users/update_password", json=payload, params={"fields": "id"})
+    assert response.status_code == 200
+    assert response.json() == {"id": 1}
+
 def test_read_user_wrong_id():
     # Если запрашиваем id, отличный от id тестового пользователя, роутер должен вернуть ошибку.
     response = client.get("/users/2")
@@ -108,3 +152,39 @@ def test_update_password_wrong_old_password():
     # который роутер обрабатывает и возвращает 422.
     assert response.status_code == 422
     assert "Wrong old password" in response.text
+
+def test_login_rate_limited():
+    strict = RateLimiter(
+        InMemoryRateLimitBackend(max_keys=10),
+        ip_rule=RateLimitRule(burst=1, per_minute=1),
+        username_rule=RateLimitRule(burst=10, per_minute=60),
+    )
+    app.dependency_overrides[user_router.get_rate_limiter] = lambda: strict
+    try:
+        payload = {"username": "test", "password": "secret"}
+        headers = {"X-Real-IP": "10.0.0.1"}
+        assert client.post("/users/login", json=payload, headers=headers).status_code == 200
+        response = client.post("/users/login", json=payload, headers=headers)
+        assert response.status_code == 429
+        assert "retry-after" in response.headers
+        # другой клиент не ограничен
+        assert client.post("/users/login", json=payload, headers={"X-Real-IP": "10.0.0.2"}).status_code == 200
+    finally:
+        del app.dependency_overrides[user_router.get_rate_limiter]
+
+def test_search_users_pages():
+    response = client.get("/users/search", params={"q": "user", "limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data == {"items": [{"username": "user0", "id": 0}, {"username": "user1", "id": 1}], "next_offset": 2}
+
+    response = client.get("/users/search", params={"q": "user", "limit": 2, "offset": 4})
+    assert response.json() == {"items": [{"username": "user4", "id": 4}], "next_offset": None}
+
+def test_search_users_validation():
+    # короткий инфиксный запрос не может использовать триграммный индекс
+    response = client.get("/users/search", params={"q": "er", "mode": "contains"})
+    assert response.status_code == 422
+    assert client.get("/users/search", params={"q": "ser", "mode": "contains"}).json()["items"]
+    assert client.get("/users/search", params={"q": ""}).status_code == 422
+    assert client.get("/users/search", params={"q": "u", "limit": 1000}).status_code == 422
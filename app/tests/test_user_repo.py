@@ -5,7 +5,7 @@ from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from conftest import Base
-from repositories.user_repo import UserSQLAlchemyRepo
+from repositories.user_repo import SearchMode, UserSQLAlchemyRepo
 from domain.exceptions import NotFoundError, DoubleFoundError
 from domain.base_domain_model import BaseDomainModel
 
@@ -46,3 +46,24 @@ async def test_exists(async_session: AsyncSession):
     exists = await repo.exists(username='test')
     assert exists == True
 
+
+
+@pytest.mark.asyncio
+async def test_search(async_session: AsyncSession):
+    await clear_table(async_session)
+    repo = DummyUserRepo(async_session)
+    for name in ["Alice", "alina", "ALEX", "bob", "malice", "al%x"]:
+        await repo.create({"username": name})
+
+    # префикс без учета регистра, сортировка по имени в нижнем регистре
+    found = await repo.search("AL")
+    assert [user.username for user in found] == ["al%x", "ALEX", "Alice", "alina"]
+    # `%` ищется буквально
+    assert [user.username for user in await repo.search("al%")] == ["al%x"]
+
+    page = await repo.search("al", limit=2, offset=1)
+    assert [user.username for user in page] == ["ALEX", "Alice"]
+
+    found = await repo.search("lic", mode=SearchMode.CONTAINS)
+    assert [user.username for user in found] == ["Alice", "malice"]
+    assert await repo.search("zzz") == []
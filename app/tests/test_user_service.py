@@ -1,9 +1,15 @@
 import pytest
 from unittest.mock import AsyncMock, Mock
 
+from sqlalchemy import select
+
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
 from domain.domain_user import DomainUser
-from domain.exceptions import DoubleFoundError, NotFoundError
-from services.user_service import UserService
+from domain.exceptions import ConcurrentUpdateError, DoubleFoundError, NotFoundError, RepositoryException
+from repositories.batch_loader import BatchLoader
+from repositories.user_repo import UserSQLAlchemyRepo
+from services.user_service import UPDATE_PASSWORD_READ_FIELDS, UserService
 from util.crypto_hash import AbstractCrypto
 
 @pytest.mark.asyncio
@@ -12,8 +18,7 @@ async def test_create_success():
     repo = AsyncMock()
     # При создании пользователя репозиторий возвращает объект DomainUser.
     created_user = DomainUser(id=1, username="test", hashed_password="fake_hashed_password")
-    repo.create = AsyncMock(return_value=created_user)
-    repo.exists = AsyncMock(return_value=False)
+    repo.create_if_absent = AsyncMock(return_value=created_user)
 
     # Создаем сервис, передавая в него мокаемый репозиторий.
     service = UserService(repository=repo, crypto_hash=Mock())
@@ -21,10 +26,10 @@ async def test_create_success():
     input_data = {"username": "test", "password": "secret"}
     result = await service.create(data=input_data)
 
-    # Проверяем, что метод read был вызван с нужным аргументом.
-    repo.exists.assert_called_once_with(username=input_data['username'])
-    # Проверяем, что метод create был вызван.
-    repo.create.assert_called_once()
+    # Проверка и вставка выполняются одним запросом, exists не вызывается.
+    repo.exists.assert_not_called()
+    repo.create_if_absent.assert_called_once()
+    assert repo.create_if_absent.call_args.kwargs["conflict_columns"] == ["username"]
     # Результат должен быть объектом DomainUser с корректными данными.
     assert isinstance(result, DomainUser)
     assert result.username == "test"
@@ -36,11 +41,9 @@ async def test_create_success():
 async def test_create_double_found():
     # Мокаем репозиторий:
     repo = AsyncMock()
-    # Симулируем, что пользователь с таким именем уже существует.
-    existing_user = DomainUser(id=1, username="test", hashed_password="existing_hash")
-    repo.read = AsyncMock(return_value=existing_user)
-    # Метод create в этом случае не должен вызываться.
-    repo.create = AsyncMock()
+    # Симулируем, что пользователь с таким именем уже существует:
+    # вставка ничего не вернула из-за конфликта.
+    repo.create_if_absent = AsyncMock(return_value=None)
 
     service = UserService(repository=repo, crypto_hash=Mock())
 
@@ -50,14 +53,14 @@ async def test_create_double_found():
     with pytest.raises(DoubleFoundError):
          await service.create(data=input_data)
 
-    repo.exists.assert_called_once_with(username=input_data['username'])
-    repo.create.assert_not_called()
+    repo.create_if_absent.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_verify_password_success():
     crypto_hash: AbstractCrypto = Mock()
     crypto_hash.hash = Mock(return_value='hashed_password')
     crypto_hash.verify = Mock(return_value=True)
+    crypto_hash.needs_update = Mock(return_value=False)
 
     # Подготавливаем тестового пользователя с корректным хешированным паролем.
     password = "secret"
@@ -72,9 +75,45 @@ async def test_verify_password_success():
     
     result = await service.verify_password(username="test", password=password)
     
-    repo.read.assert_called_once_with(filters={'username': "test"})
+    repo.read.assert_called_once_with(filters={'username': "test"}, batch=False)
+    repo.update_if_version.assert_not_called()
     assert result == user
 
+@pytest.mark.asyncio
+async def test_verify_password_rehashes_outdated_hash():
+    crypto_hash = Mock()
+    crypto_hash.verify = Mock(return_value=True)
+    crypto_hash.needs_update = Mock(return_value=True)
+    crypto_hash.hash = Mock(return_value="new_hash")
+
+    user = DomainUser(id=1, username="test", hashed_password="old_hash")
+    rehashed = DomainUser(id=1, username="test", hashed_password="new_hash")
+    repo = AsyncMock()
+    repo.read = AsyncMock(return_value=user)
+    repo.update_if_version = AsyncMock(return_value=rehashed)
+
+    service = UserService(repository=repo, crypto_hash=crypto_hash)
+    result = await service.verify_password(username="test", password="secret")
+
+    crypto_hash.needs_update.assert_called_once_with("old_hash")
+    repo.update_if_version.assert_called_once_with(1, 1, {'hashed_password': "new_hash"}, savepoint=True)
+    assert result == rehashed
+
+@pytest.mark.asyncio
+async def test_verify_password_rehash_failure_keeps_login():
+    crypto_hash = Mock()
+    crypto_hash.verify = Mock(return_value=True)
+    crypto_hash.needs_update = Mock(return_value=True)
+    crypto_hash.hash = Mock(return_value="new_hash")
+
+    user = DomainUser(id=1, username="test", hashed_password="old_hash")
+    repo = AsyncMock()
+    repo.read = AsyncMock(return_value=user)
+    repo.update_if_version = AsyncMock(side_effect=RepositoryException("db is down"))
+
+    service = UserService(repository=repo, crypto_hash=crypto_hash)
+    assert await service.verify_password(username="test", password="secret") == user
+
 @pytest.mark.asyncio
 async def test_verify_password_wrong_password():
     # Мокаем crypto_hash, чтобы verify возвращал False.
@@ -94,7 +133,7 @@ async def test_verify_password_wrong_password():
     with pytest.raises(NotFoundError):
         await service.verify_password(username="test", password="wrong_password")
     
-    repo.read.assert_called_once_with(filters={'username': "test"})
+    repo.read.assert_called_once_with(filters={'username': "test"}, batch=False)
 
 @pytest.mark.asyncio
 async def test_update_password_success():
@@ -105,20 +144,20 @@ async def test_update_password_success():
 
     old_password = "oldsecret"
     new_password = "newsecret"
-    user = DomainUser(id=1, username="test", hashed_password="old_hashed_password")
+    user = DomainUser(id=1, username="test", hashed_password="old_hashed_password", version=3)
     
     repo = AsyncMock()
     repo.read = AsyncMock(return_value=user)
-    # Метод update возвращает список с одним обновлённым пользователем.
-    updated_user = DomainUser(id=1, username="test", hashed_password="new_hashed_password")
-    repo.update = AsyncMock(return_value=[updated_user])
+    # Обновление проходит только для прочитанной версии пользователя.
+    updated_user = DomainUser(id=1, username="test", hashed_password="new_hashed_password", version=4)
+    repo.update_if_version = AsyncMock(return_value=updated_user)
     
     service = UserService(repository=repo, crypto_hash=crypto_hash)
     
     result = await service.update_password("test", old_password, new_password)
     
-    repo.read.assert_called_once_with(filters={'username': "test"})
-    repo.update.assert_called_once_with(filters={'username': "test"}, data={'hashed_password': "new_hashed_password"})
+    repo.read.assert_called_once_with(filters={'username': "test"}, fields=UPDATE_PASSWORD_READ_FIELDS)
+    repo.update_if_version.assert_called_once_with(1, 3, {'hashed_password': "new_hashed_password"}, fields=None)
     assert result == updated_user
 
 @pytest.mark.asyncio
@@ -140,10 +179,10 @@ async def test_update_password_wrong_old_password():
     with pytest.raises(NotFoundError):
         await service.update_password("test", old_password, new_password)
     
-    repo.read.assert_called_once_with(filters={'username': "test"})
+    repo.read.assert_called_once_with(filters={'username': "test"}, fields=UPDATE_PASSWORD_READ_FIELDS)
 
 @pytest.mark.asyncio
-async def test_update_password_double_found():
+async def test_update_password_retries_on_conflict():
     # Мокаем crypto_hash, чтобы verify возвращал True.
     crypto_hash = Mock()
     crypto_hash.verify = Mock(return_value=True)
@@ -151,19 +190,73 @@ async def test_update_password_double_found():
 
     old_password = "oldsecret"
     new_password = "newsecret"
+    stale = DomainUser(id=1, username="test", hashed_password="old_hashed_password", version=1)
+    fresh = DomainUser(id=1, username="test", hashed_password="old_hashed_password", version=2)
+    updated_user = DomainUser(id=1, username="test", hashed_password="new_hashed_password", version=3)
+    
+    repo = AsyncMock()
+    repo.read = AsyncMock(side_effect=[stale, fresh])
+    # Первая попытка проигрывает параллельному изменению, вторая читает свежую версию.
+    repo.update_if_version = AsyncMock(side_effect=[ConcurrentUpdateError(), updated_user])
+    
+    service = UserService(repository=repo, crypto_hash=crypto_hash)
+    
+    assert await service.update_password("test", old_password, new_password) == updated_user
+    assert repo.read.call_count == 2
+    assert repo.update_if_version.call_args_list[1].args == (1, 2, {'hashed_password': "new_hashed_password"})
+    # новый пароль хешируется один раз на все попытки
+    crypto_hash.hash.assert_called_once_with(new_password)
+
+@pytest.mark.asyncio
+async def test_update_password_gives_up_on_conflicts():
+    crypto_hash = Mock()
+    crypto_hash.verify = Mock(return_value=True)
+    crypto_hash.hash = Mock(return_value="new_hashed_password")
     user = DomainUser(id=1, username="test", hashed_password="old_hashed_password")
     
     repo = AsyncMock()
     repo.read = AsyncMock(return_value=user)
-    # Симулируем ситуацию, когда update возвращает более одного пользователя.
-    updated_user1 = DomainUser(id=1, username="test", hashed_password="new_hashed_password")
-    updated_user2 = DomainUser(id=2, username="test", hashed_password="new_hashed_password")
-    repo.update = AsyncMock(return_value=[updated_user1, updated_user2])
+    repo.update_if_version = AsyncMock(side_effect=ConcurrentUpdateError())
     
     service = UserService(repository=repo, crypto_hash=crypto_hash)
     
-    with pytest.raises(DoubleFoundError):
-        await service.update_password("test", old_password, new_password)
-    
-    repo.read.assert_called_once_with(filters={'username': "test"})
-    repo.update.assert_called_once_with(filters={'username': "test"}, data={'hashed_password': "new_hashed_password"})
+    # после исчерпания попыток конфликт отдаётся вызывающему
+    with pytest.raises(ConcurrentUpdateError):
+        await service.update_password("test", "oldsecret", "newsecret")
+    assert repo.update_if_version.call_count == 3
+
+
+class VersionedCrypto(AbstractCrypto):
+    # хеш с префиксом "v2:" сделан с актуальными параметрами
+    def hash(self, value: str) -> str:
+        return f"v2:{value}"
+
+    def verify(self, value: str, hash: str) -> bool:
+        return hash.split(":", 1)[1] == value
+
+    def needs_update(self, hash: str) -> bool:
+        return not hash.startswith("v2:")
+
+
+@pytest.mark.asyncio
+async def test_update_password_after_rehash_in_one_transaction(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/users.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(UserORM.__table__.create)
+        await connection.execute(UserORM.__table__.insert(), [{"username": "alice", "hashed_password": "v1:secret"}])
+    loader = BatchLoader(manager, DomainUser, UserORM, key="username", window=0)
+    try:
+        async with manager.session() as session:
+            service = UserService(UserSQLAlchemyRepo(session, DomainUser, UserORM, loader=loader), VersionedCrypto())
+            # check_token: поиск через загрузчик, перехеширование в транзакции запроса
+            user = await service.verify_password("alice", "secret", batch=True)
+            assert (user.hashed_password, user.version) == ("v2:secret", 2)
+            # чтение для записи видит незафиксированную версию, конфликта нет
+            updated = await service.update_password("alice", "secret", "newer")
+            assert updated.version == 3
+        assert loader.batches == 1
+        async with manager.session() as session:
+            stored = (await session.execute(select(UserORM))).scalar_one()
+            assert (stored.hashed_password, stored.version) == ("v2:newer", 3)
+    finally:
+        await manager.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from db.db import Base, DatabaseSessionManager
+from monitoring.health import HealthMonitor
+from monitoring.loop_monitor import LoopLagMonitor
+from tasks.warmup import Warmup
+
+
+@pytest.fixture
+async def manager(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/db.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    yield manager
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_warmup_opens_pool_connections(manager):
+    warmup = Warmup(manager, connections=3, timeout=10, enabled=True)
+    await warmup.run()
+    snapshot = warmup.snapshot()
+    assert snapshot["finished"] and snapshot["error"] is None
+    assert set(snapshot["steps_ms"]) == {"mappers", "password hashing", "connections"}
+    # соединения открыты одновременно и вернулись в пул
+    assert manager.engine.pool.checkedin() == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_warmup_still_finishes(tmp_path):
+    # каталога нет, подключиться нельзя
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/missing/db.sqlite3")
+    try:
+        warmup = Warmup(manager, connections=2, timeout=10, enabled=True)
+        await warmup.run()
+        assert warmup.finished
+        assert warmup.error is not None
+    finally:
+        await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_not_ready_until_warmed_up(manager):
+    warmup = Warmup(manager, connections=1, timeout=10, enabled=True)
+    monitor = HealthMonitor(manager, lag_monitor=LoopLagMonitor(), warmup=warmup)
+    await monitor.probe_db()
+    ready, details = monitor.readiness()
+    assert ready is False
+    assert details["checks"]["warmup"] is False
+
+    await warmup.run()
+    ready, details = monitor.readiness()
+    assert ready is True
+    assert details["warmup_ms"] is not None
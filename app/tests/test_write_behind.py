@@ -0,0 +1,95 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import asyncpg
+
+from db.db import DatabaseSessionManager
+from db.models.user import UserORM
+from repositories.write_behind import WriteBehindBuffer
+
+
+@pytest.fixture
+async def manager(tmp_path):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/activity.sqlite3")
+    async with manager.connect() as connection:
+        await connection.run_sync(UserORM.__table__.create)
+        await connection.execute(
+            UserORM.__table__.insert(),
+            [{"id": i, "username": f"user{i}", "hashed_password": "x"} for i in (1, 2, 3)],
+        )
+    yield manager
+    await manager.close()
+
+
+async def read_users(manager):
+    async with manager.session() as session:
+        rows = (await session.execute(select(UserORM.__table__))).all()
+        return {row.id: row for row in rows}
+
+
+@pytest.mark.asyncio
+async def test_latest_value_per_key_is_flushed(manager):
+    buffer = WriteBehindBuffer(manager, UserORM)
+    t0 = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(5):
+        buffer.record(1, last_seen_at=t0 + timedelta(minutes=i))
+    buffer.record(1, last_login_at=t0)
+    buffer.record(2, last_seen_at=t0)
+    assert len(buffer) == 2
+
+    assert await buffer.flush() == 2
+    assert len(buffer) == 0
+    users = await read_users(manager)
+    assert users[1].last_seen_at.replace(tzinfo=UTC) == t0 + timedelta(minutes=4)
+    assert users[1].last_login_at.replace(tzinfo=UTC) == t0
+    assert users[2].last_seen_at is not None
+    assert users[3].last_seen_at is None
+    assert await buffer.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_bound(manager):
+    buffer = WriteBehindBuffer(manager, UserORM, max_keys=2)
+    now = datetime.now(UTC)
+    buffer.record(1, last_seen_at=now)
+    buffer.record(2, last_seen_at=now)
+    buffer.record(3, last_seen_at=now)
+    # существующие ключи по-прежнему обновляются
+    buffer.record(1, last_login_at=now)
+    assert len(buffer) == 2
+    assert buffer.snapshot()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_flush_on_size_threshold(manager):
+    buffer = WriteBehindBuffer(manager, UserORM, flush_size=2)
+    now = datetime.now(UTC)
+    buffer.record(1, last_seen_at=now)
+    buffer.record(2, last_seen_at=now)
+    assert buffer._flush_task is not None
+    await buffer._flush_task
+    assert buffer.snapshot()["written"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_updates(manager):
+    buffer = WriteBehindBuffer(manager, UserORM)
+    now = datetime.now(UTC)
+    buffer.record(1, last_seen_at=now)
+    await manager.close()
+    with pytest.raises(Exception):
+        await buffer.flush()
+    assert len(buffer) == 1
+    assert buffer.snapshot()["failures"] == 1
+
+
+def test_set_based_update_is_one_statement(manager):
+    buffer = WriteBehindBuffer(manager, UserORM)
+    now = datetime.now(UTC)
+    rows = [{"id": i, "last_seen_at": now} for i in (1, 2, 3)]
+    sql = str(buffer.set_based_update(["id", "last_seen_at"], rows).compile(dialect=asyncpg.dialect()))
+    # все строки в одном UPDATE ... FROM (VALUES ...), а не executemany по строке
+    assert sql.count("UPDATE") == 1
+    assert "FROM (VALUES ($1::INTEGER, $2::TIMESTAMP WITH TIME ZONE)" in sql
+    assert "AS pending (id, last_seen_at) WHERE users.id = pending.id" in sql
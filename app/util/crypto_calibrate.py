@@ -0,0 +1,63 @@
+"""
+Picks the bcrypt cost that meets a target verify time on this machine.
+
+    python -m util.crypto_calibrate --target-ms 250
+
+Prints the `BCRYPT_ROUNDS` value to put into the environment. Existing hashes with a
+different cost are rehashed on the next successful login.
+"""
+import argparse
+import time
+
+from util.crypto_hash import build_pwd_context
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 16
+
+
+def measure_verify_ms(rounds: int, samples: int = 3) -> float:
+    """Best-of-`samples` verify time, in ms, for a hash of the given cost."""
+    context = build_pwd_context(rounds)
+    hashed = context.hash("calibration-password")
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.verify("calibration-password", hashed)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def calibrate_bcrypt_rounds(target_ms: float, samples: int = 3) -> tuple[int, float]:
+    """
+    Returns the highest cost whose verify time stays within `target_ms`, and that time.
+
+    Each extra round doubles the work, so the cost is extrapolated from a cheap
+    measurement and then checked (and stepped down if needed) on the real one.
+    """
+    base_rounds = 8
+    base_ms = measure_verify_ms(base_rounds, samples)
+    rounds = base_rounds
+    while rounds < MAX_ROUNDS and base_ms * 2 ** (rounds + 1 - base_rounds) <= target_ms:
+        rounds += 1
+    rounds = max(rounds, MIN_ROUNDS)
+
+    measured = measure_verify_ms(rounds, samples)
+    while measured > target_ms and rounds > MIN_ROUNDS:
+        rounds -= 1
+        measured = measure_verify_ms(rounds, samples)
+    return rounds, measured
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="target verify time per login")
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    rounds, measured = calibrate_bcrypt_rounds(args.target_ms, args.samples)
+    print(f"bcrypt verify with {rounds} rounds takes {measured:.1f} ms (target {args.target_ms:.0f} ms)")
+    print(f"BCRYPT_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,37 @@
 from abc import ABC, abstractmethod
+from functools import cache
+from typing import TYPE_CHECKING, Any
 
-from passlib.context import CryptContext
+from config.config import BCRYPT_ROUNDS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+def build_pwd_context(rounds: int = BCRYPT_ROUNDS) -> "CryptContext":
+    from passlib.context import CryptContext
+
+    # min == max makes needs_update() flag hashes made with any other cost
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+@cache
+def get_pwd_context() -> "CryptContext":
+    # passlib and bcrypt are imported on first use to keep them off the cold start path
+    return build_pwd_context()
+
+
+def __getattr__(name: str) -> Any:
+    # keeps `from util.crypto_hash import pwd_context` working without an eager import
+    if name == "pwd_context":
+        return get_pwd_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class AbstractCrypto(ABC):
@@ -14,12 +43,19 @@ class AbstractCrypto(ABC):
     @abstractmethod
     def verify(self, value: str, hash: str) -> bool: ...
 
+    def needs_update(self, hash: str) -> bool:
+        """return True if the hash was made with outdated parameters"""
+        return False
+
 
 class CryptoHash(AbstractCrypto):
 
     def hash(self, value: str) -> str:
         """return hashed value"""
-        return pwd_context.hash(value)
+        return get_pwd_context().hash(value)
 
     def verify(self, value: str, hash: str) -> bool:
-        return pwd_context.verify(value, hash)
+        return get_pwd_context().verify(value, hash)
+
+    def needs_update(self, hash: str) -> bool:
+        return get_pwd_context().needs_update(hash)
@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class TokenExpiredError(InvalidTokenError):
+    pass
+
+
+def b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class HS256Codec:
+    """
+    JWT encoding and verification for HS256 only.
+
+    The HMAC key schedule is computed once and copied per token, the header segment
+    is encoded once, and `exp`/`nbf` are checked in a single pass over the claims.
+    Verified tokens are cached (up to `cache_size`, least recently used first out)
+    and a cached token is only valid until its own `exp`. Tokens are compatible with
+    python-jose (`jwt.encode(..., algorithm="HS256")`) both ways.
+    """
+
+    def __init__(self, secret: str, cache_size: int = 4096) -> None:
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self._header = b64url_encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+        self._header_str = self._header.decode()
+        self.cache_size = cache_size
+        # signature -> (token, claims, exp)
+        self._cache: OrderedDict[str, tuple[str, dict[str, Any], float | None]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, claims: dict[str, Any]) -> str:
+        claims = {
+            key: int(value.timestamp()) if isinstance(value, datetime) else value for key, value in claims.items()
+        }
+        payload = b64url_encode(json.dumps(claims, separators=(",", ":")).encode())
+        signing_input = self._header + b"." + payload
+        return (signing_input + b"." + b64url_encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str, now: float | None = None) -> dict[str, Any]:
+        """
+        Verifies `token` and returns its claims. The returned dict may be shared
+        with the cache and must not be modified.
+
+        Raises:
+            TokenExpiredError: If `exp` has passed or `nbf` is still ahead.
+            InvalidTokenError: If the token is malformed, not HS256 or its signature is wrong.
+        """
+        if now is None:
+            now = time.time()
+        signing_input, _, signature = token.rpartition(".")
+        cached = self._cache.get(signature)
+        if cached is not None and cached[0] == token:
+            _, claims, exp = cached
+            if exp is not None and exp <= now:
+                del self._cache[signature]
+                raise TokenExpiredError("Token is expired")
+            self._cache.move_to_end(signature)
+            self.hits += 1
+            return claims
+
+        self.misses += 1
+        header, _, payload = signing_input.partition(".")
+        if not header or not payload:
+            raise InvalidTokenError("Malformed token")
+        try:
+            if header != self._header_str and json.loads(b64url_decode(header)).get("alg") != "HS256":
+                raise InvalidTokenError("Unsupported algorithm")
+            valid = hmac.compare_digest(self._sign(signing_input.encode()), b64url_decode(signature))
+            if not valid:
+                raise InvalidTokenError("Signature verification failed")
+            claims = json.loads(b64url_decode(payload))
+        except (ValueError, AttributeError, UnicodeEncodeError) as ex:
+            raise InvalidTokenError(f"Malformed token: {ex}")
+        if not isinstance(claims, dict):
+            raise InvalidTokenError("Malformed token claims")
+
+        exp = claims.get("exp")
+        nbf = claims.get("nbf")
+        if exp is not None and not isinstance(exp, (int, float)) or nbf is not None and not isinstance(nbf, (int, float)):
+            raise InvalidTokenError("Invalid exp or nbf claim")
+        if exp is not None and exp <= now:
+            raise TokenExpiredError("Token is expired")
+        if nbf is not None and nbf > now:
+            raise TokenExpiredError("Token is not valid yet")
+
+        # a not-yet-valid token is not cached, so `nbf` never needs a second check
+        if nbf is None and self.cache_size > 0:
+            self._cache[signature] = (token, claims, exp)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return claims
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,16 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed_phase(name: str, log: logging.Logger = logger) -> Iterator[None]:
+    """Log how long the wrapped block took, e.g. a startup phase."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        log.info(f"{name} took {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -1,11 +1,9 @@
 import os
 
 
-def get_env_value(name: str) -> str:
-    value = os.getenv(name)
+def get_env_value(name: str, default: str | None = None) -> str:
+    value = os.getenv(name, default)
     if value is None:
         raise ValueError(
             f'{name} environment variable should be filled in the OS.')
     return value
-
-
@@ -3,8 +3,5 @@
 set -e
 cd /app
 
-python -m db.wait_for_db
-
-alembic upgrade head
-
+# main.py waits for the DB and applies pending migrations itself
 exec python main.py